@@ -163,3 +163,14 @@ class Test(unittest.TestCase):
         self.assertEqual(
             io_data.discard, BaseData(latency=13.0, io_dump=14.0, io_length=15.0, iops=16.0)
         )
+
+    def test_convert_io_table(self):
+        from sentryCollector.collect_plugin import CollectTable
+        from sentryPlugins.ai_block_io.io_data import BaseData
+        from sentryPlugins.ai_block_io.data_access import _convert_io_table
+
+        table = CollectTable.from_dict({"sda": {"bio": {"read": [1.5, 2, 0, 30]}}})
+        read = _convert_io_table(table)["sda"].bio.read
+        self.assertEqual(read, BaseData(latency=1.5, io_dump=2, io_length=0, iops=30))
+        self.assertIsInstance(read.io_dump, int)
+        self.assertIsInstance(read.iops, int)
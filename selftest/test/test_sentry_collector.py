@@ -0,0 +1,1066 @@
+# coding: utf-8
+# Copyright (c) 2025 Huawei Technologies Co., Ltd.
+# sysSentry is licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+
+import unittest
+import tempfile
+import struct
+import os
+import json
+import socket
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from sentryCollector.collect_config import CollectConfig
+from sentryCollector.collect_io import CollectIo, IO_DUMP_DATA_LIMIT, EBPF_RECORD, EBPF_STAGE_LIST, Io_Category, \
+    PERIOD_DISK, PERIOD_DISK_HIST
+from sentryCollector.collect_buffer import RingBuffer, NumericRingBuffer
+from sentryCollector.collect_file import FdCache, FD_CACHE_READ_SIZE
+from sentryCollector.collect_shm import ShmExporter
+from sentryCollector.collect_topk import build_top_index, select_top
+from sentryCollector.collect_group import build_stage_groups, get_stage_groups
+from sentryCollector.collect_rollup import Rollup, select_resolution
+from sentryCollector.collect_quantile import LAT_HIST_SLOTS, LAT_HIST_UPPER_US, hist_quantiles, merge_hist
+from sentryCollector.collect_hotplug import parse_uevent
+from sentryCollector.collect_timer import PeriodTimer
+from sentryCollector import collect_io, collect_server, collect_plugin, collect_disk
+from sentryCollector.collect_server import CollectServer
+from sentryCollector.collect_disk import CollectDisk, NVME_LOG_LEN, NVME_HIST_BUCKETS
+
+COLLECTOR_CONF = """[common]
+modules=io
+
+[io]
+period_time=1
+max_save=10
+disk=default
+"""
+
+
+def _io_dump_line(op, pid, ptr, start_time_ns):
+    return ("kworker/u8:1-{} R stage rq_driver {} .op={}, .cmd_flags=0x0, .rq_flags=0x0, "
+            "started {} ns ago\n".format(pid, ptr, op, start_time_ns))
+
+
+class TestCollectorBase(unittest.TestCase):
+    """create a collector instance from a temporary collector.conf"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        conf_file = os.path.join(self.tmp_dir.name, "collector.conf")
+        with open(conf_file, "w") as f:
+            f.write(COLLECTOR_CONF)
+        self.collect_io = CollectIo(CollectConfig(conf_file))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_tmp_file(self, name, content):
+        file_path = os.path.join(self.tmp_dir.name, name)
+        with open(file_path, "w") as f:
+            f.write(content)
+        return file_path
+
+
+class TestParseIoDump(TestCollectorBase):
+    """Test cases for single pass io_dump parsing"""
+
+    def test_bucket_by_category(self):
+        lines = [
+            _io_dump_line("READ", 100, "ffff000000000001", 5000000),
+            _io_dump_line("WRITE", 101, "ffff000000000002", 6000000),
+            _io_dump_line("WRITE", 102, "ffff000000000003", 7000000),
+            _io_dump_line("DISCARD", 103, "ffff000000000004", 8000000),
+            "a line without op\n",
+        ]
+        io_dump_file = self.write_tmp_file("io_dump", "".join(lines))
+        count, msg = self.collect_io.parse_io_dump_file(io_dump_file)
+        self.assertEqual(count, [1, 2, 0, 1])
+        self.assertEqual(msg[0], ["kworker/u8:1,100,rq_driver,ffff000000000001,5"])
+        self.assertEqual(len(msg[1]), 2)
+        self.assertEqual(msg[2], [])
+        self.assertEqual(msg[3], ["kworker/u8:1,103,rq_driver,ffff000000000004,8"])
+
+    def test_limit_and_overflow_count(self):
+        total = IO_DUMP_DATA_LIMIT + 5
+        lines = [_io_dump_line("FLUSH", i, "ffff00000000%04x" % i, 1000000) for i in range(total)]
+        io_dump_file = self.write_tmp_file("io_dump", "".join(lines))
+        count, msg = self.collect_io.parse_io_dump_file(io_dump_file)
+        self.assertEqual(count[2], total)
+        self.assertEqual(len(msg[2]), IO_DUMP_DATA_LIMIT)
+
+    def test_parse_error_line_is_counted(self):
+        io_dump_file = self.write_tmp_file("io_dump", "garbage .op=READ\n")
+        count, msg = self.collect_io.parse_io_dump_file(io_dump_file)
+        self.assertEqual(count, [1, 0, 0, 0])
+        self.assertEqual(msg[0], [])
+
+    def test_file_not_exist(self):
+        count, msg = self.collect_io.parse_io_dump_file(os.path.join(self.tmp_dir.name, "none"))
+        self.assertEqual(count, [0, 0, 0, 0])
+        self.assertEqual(msg, [[], [], [], []])
+
+
+class TestEbpfRecord(TestCollectorBase):
+    """Test cases for ebpf_collector output decoding"""
+
+    def setUp(self):
+        super().setUp()
+        self.reset_window()
+
+    def reset_window(self):
+        self.collect_io.window_value = {"sda": {}}
+        for stage in EBPF_STAGE_LIST:
+            self.collect_io.window_value["sda"][stage] = {}
+            for io_type in Io_Category:
+                self.collect_io.window_value["sda"][stage][io_type] = [[0, 0, 0, None], [0, 0, 0, None]]
+
+    def test_split_text_chunk(self):
+        self.collect_io.ebpf_binary = False
+        batch, count, remain = self.collect_io.split_ebpf_chunk(b"bio 1 2 0 R sda\nwbt 3 4 0 W s")
+        self.assertEqual(batch, ["bio 1 2 0 R sda"])
+        self.assertEqual(count, 1)
+        self.assertEqual(remain, b"wbt 3 4 0 W s")
+
+    def test_split_text_stream(self):
+        self.collect_io.ebpf_binary = False
+        stream = b"bio 1 2 0 R sda\nwbt 3 4 0 W sda\ngettag 5 6 0 F sda\n"
+        lines = []
+        remain = b''
+        for start in range(0, len(stream), 7):
+            batch, count, remain = self.collect_io.split_ebpf_chunk(remain + stream[start:start + 7])
+            if count:
+                lines.extend(batch)
+        self.assertEqual(lines, stream.decode().splitlines())
+        self.assertEqual(remain, b'')
+
+    def test_batch_as_lines(self):
+        lines = ["bio 10 2000 1 R sda", "wbt 3 30 0 W sda", "bad line", "bio 12 2400 1 R sda"]
+        self.collect_io.update_ebpf_text_batch(lines, 1.0)
+        batch_value = json.dumps(self.collect_io.window_value)
+        self.reset_window()
+        for line in lines:
+            self.collect_io.update_ebpf_text_batch([line], 1.0)
+        self.assertEqual(json.dumps(self.collect_io.window_value), batch_value)
+
+    def test_queue_full_dropped(self):
+        self.collect_io.ebpf_binary = False
+        self.collect_io.ebpf_queue = queue.Queue(maxsize=1)
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, b"bio 1 2 0 R sda\n" * 3)
+        os.close(write_fd)
+        process = mock.Mock(stdout=os.fdopen(read_fd, 'rb', buffering=0))
+        # one record a read, the queue takes the first batch only
+        with mock.patch.object(collect_io, "EBPF_PROCESS", process), mock.patch.object(collect_io, "EBPF_READ_SIZE", 16):
+            self.collect_io.get_ebpf_raw_data()
+        process.stdout.close()
+        self.assertEqual(self.collect_io.ebpf_stat[collect_io.EBPF_STAT_READ], 3)
+        self.assertEqual(self.collect_io.ebpf_stat[collect_io.EBPF_STAT_DROPPED], 2)
+        self.assertEqual(self.collect_io.ebpf_queue.qsize(), 1)
+
+    def test_queue_lagging(self):
+        self.collect_io.ebpf_binary = False
+        ebpf_queue = self.collect_io.ebpf_queue
+        ebpf_queue.put((1.0, ["bio 1 2 0 R sda", "bio 2 4 0 R sda"]))
+        ebpf_queue.put((2.0, ["bio 3 6 0 R sda"]))
+        queue_get = ebpf_queue.get
+
+        def get_last(timeout):
+            batch = queue_get(timeout=timeout)
+            if ebpf_queue.empty():
+                self.collect_io.stop_event.set()
+            return batch
+        with mock.patch.object(ebpf_queue, "get", side_effect=get_last):
+            self.collect_io.update_ebpf_collector_data()
+        self.assertEqual(self.collect_io.ebpf_stat[collect_io.EBPF_STAT_LAGGING], 2)
+        self.assertEqual(self.collect_io.window_value["sda"]["bio"]["read"][-1], [3, 6, 0, 2.0])
+
+    def test_restart_reset(self):
+        self.collect_io.ebpf_binary = False
+        old_fd, old_write_fd = os.pipe()
+        new_fd, new_write_fd = os.pipe()
+        os.write(old_write_fd, b"bio 100 200 0 R sda\n")
+        os.write(new_write_fd, b"bio 5 6 0 R sda\n")
+        os.close(old_write_fd)
+        os.close(new_write_fd)
+        new_process = mock.Mock(stdout=os.fdopen(new_fd, 'rb', buffering=0))
+        old_pipe = os.fdopen(old_fd, 'rb', buffering=0)
+
+        def read_old(buffer):
+            # the restart replaces the process before the old one is stopped
+            read_len = old_pipe.readinto(buffer)
+            if not read_len:
+                collect_io.EBPF_PROCESS = new_process
+            return read_len
+        old_process = mock.Mock(stdout=mock.Mock(fileno=old_pipe.fileno, readinto=read_old,
+                                                 close=old_pipe.close))
+        with mock.patch.object(collect_io, "EBPF_PROCESS", old_process):
+            self.collect_io.get_ebpf_raw_data()
+        new_process.stdout.close()
+        self.assertEqual(self.collect_io.ebpf_queue.qsize(), 3)
+
+        self.collect_io.sample_time["sda"] = 1.0
+        ebpf_queue = self.collect_io.ebpf_queue
+        queue_get = ebpf_queue.get
+
+        def get_last(timeout):
+            batch = queue_get(timeout=timeout)
+            if ebpf_queue.empty():
+                self.collect_io.stop_event.set()
+            return batch
+        with mock.patch.object(ebpf_queue, "get", side_effect=get_last):
+            self.collect_io.update_ebpf_collector_data()
+        bio_window = self.collect_io.window_value["sda"]["bio"]["read"]
+        self.assertEqual(bio_window[0], [0, 0, 0, None])
+        self.assertEqual(bio_window[1][:3], [5, 6, 0])
+        self.assertEqual(self.collect_io.window_value["sda"]["wbt"]["write"], [[0, 0, 0, None], [0, 0, 0, None]])
+        self.assertNotIn("sda", self.collect_io.sample_time)
+
+    def test_report_interval(self):
+        self.collect_io.update_ebpf_text_batch(["bio 10 2000 0 R sda"], 10.0)
+        period_data = self.collect_io.collect_ebpf_disk("sda", ["bio"])
+        self.assertEqual(period_data[collect_io.PERIOD_INTERVAL], 1)
+        self.assertEqual(self.collect_io.sample_time["sda"], 10.0)
+        # the rates are over the two reports, not over the collect calls
+        self.collect_io.update_ebpf_text_batch(["bio 30 6000 0 R sda"], 12.0)
+        period_data = self.collect_io.collect_ebpf_disk("sda", ["bio"])
+        self.assertEqual(period_data[collect_io.PERIOD_INTERVAL], 2)
+        self.assertEqual(period_data[collect_io.PERIOD_IO]["bio"]["read"][3], 10)
+        # a failed period keeps the last sample time
+        self.collect_io.update_ebpf_text_batch(["bio 40 8000 0 R sda"], 13.0)
+        self.collect_io.window_value["sda"]["bio"]["write"] = []
+        self.assertIsNone(self.collect_io.collect_ebpf_disk("sda", ["bio"]))
+        self.assertEqual(self.collect_io.sample_time["sda"], 12.0)
+
+    def test_text_batch(self):
+        self.collect_io.update_ebpf_text_batch(["bio 10 2000 1 R sda", "bad line", "bio 1 1 0 R sdb"], 1.0)
+        self.assertEqual(self.collect_io.window_value["sda"]["bio"]["read"][-1], [10, 2000, 1, 1.0])
+        lat_hist = ",".join(["3"] + ["0"] * (LAT_HIST_SLOTS - 1))
+        self.collect_io.update_ebpf_text_batch(["wbt 3 30 0 W sda " + lat_hist], 2.0)
+        self.assertEqual(self.collect_io.window_value["sda"]["wbt"]["write"][-1],
+                         [3, 30, 0, 2.0, [3] + [0] * (LAT_HIST_SLOTS - 1)])
+
+    def test_binary_batch(self):
+        self.collect_io.ebpf_binary = True
+        self.collect_io.ebpf_disk_name[(8, 0)] = "sda"
+        lat_hist = [0, 100] + [0] * (LAT_HIST_SLOTS - 2)
+        # rq_driver has the histogram of its io type, gettag none
+        raw = EBPF_RECORD.pack(1, ord('W'), collect_io.EBPF_RECORD_LAT_HIST, 8, 0, 2, 100, 5000, *lat_hist) + \
+            EBPF_RECORD.pack(4, ord('R'), 0, 8, 0, 0, 7, 8, *([0] * LAT_HIST_SLOTS))
+        batch, count, remain = self.collect_io.split_ebpf_chunk(raw + raw[:5])
+        self.assertEqual(count, 2)
+        self.assertEqual(remain, raw[:5])
+        self.collect_io.update_ebpf_binary_batch(batch, 1.0)
+        self.assertEqual(self.collect_io.window_value["sda"]["rq_driver"]["write"][-1][:3], [100, 5000, 2])
+        self.assertEqual(list(self.collect_io.window_value["sda"]["rq_driver"]["write"][-1][4]), lat_hist)
+        self.assertEqual(self.collect_io.window_value["sda"]["gettag"]["read"][-1], [7, 8, 0, 1.0])
+
+    def test_lat_hist_period(self):
+        window = [[1, 10, 0, 1.0, [1, 2] + [0] * (LAT_HIST_SLOTS - 2)],
+                  [4, 40, 0, 2.0, [1, 5] + [1] * (LAT_HIST_SLOTS - 2)]]
+        self.assertEqual(self.collect_io.get_ebpf_lat_hist(window), [0, 3] + [1] * (LAT_HIST_SLOTS - 2))
+        self.assertIsNone(self.collect_io.get_ebpf_lat_hist([[0, 0, 0, None], window[1]]))
+
+
+class TestRingBuffer(unittest.TestCase):
+    """Test cases for collect history ring buffer"""
+
+    def test_index_by_age(self):
+        ring = RingBuffer(3)
+        self.assertEqual(len(ring), 0)
+        self.assertIsNone(ring.get(0))
+        for value in ["a", "b", "c", "d"]:
+            ring.append([value])
+        self.assertEqual(len(ring), 3)
+        self.assertEqual(ring[0], ["d"])
+        self.assertEqual(ring[2], ["b"])
+        self.assertEqual(ring[-1], ["b"])
+        self.assertEqual(list(ring), [["d"], ["c"], ["b"]])
+        self.assertIsNone(ring.get(3))
+        with self.assertRaises(IndexError):
+            ring[3]
+        self.assertEqual(ring.window(0, 2), [["c"], ["d"]])
+        self.assertEqual(ring.window(1, 5), [["b"], ["c"]])
+        self.assertEqual(ring.window(3, 1), [])
+        ring.clear()
+        self.assertEqual(len(ring), 0)
+        self.assertEqual(ring.slots, [None] * 3)
+
+    def test_numeric_record(self):
+        ring = NumericRingBuffer(2, 4)
+        ring.append((1, 0, 0.5, 12))
+        ring.append((2.5, 3, 1, 0))
+        ring.append((10, 1, 2, 3.7))
+        self.assertEqual(len(ring), 2)
+        self.assertEqual(ring[0], [10, 1, 2, 3.7])
+        self.assertIsInstance(ring[0][0], int)
+        self.assertEqual(ring.get(1), [2.5, 3, 1, 0])
+
+    def test_unsigned_record(self):
+        ring = NumericRingBuffer(5, 6, 'Q')
+        ring.append([1, 2, 3, 4, 5, 6])
+        self.assertEqual(ring[0], [1, 2, 3, 4, 5, 6])
+        ring.clear()
+        self.assertEqual(len(ring), 0)
+
+
+class TestFdCache(unittest.TestCase):
+    """Test cases for the cached file reader"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp_dir.name, "stats")
+        self.fd_cache = FdCache(max_open=1)
+
+    def tearDown(self):
+        self.fd_cache.close_all()
+        self.tmp_dir.cleanup()
+
+    def test_reread_updated_content(self):
+        with open(self.file_path, "w") as f:
+            f.write("first")
+        self.assertEqual(self.fd_cache.read(self.file_path), "first")
+        self.assertEqual(len(self.fd_cache), 1)
+        with open(self.file_path, "r+") as f:
+            f.write("again")
+        self.assertEqual(self.fd_cache.read(self.file_path), "again")
+        self.assertEqual(len(self.fd_cache), 1)
+
+    def test_large_file(self):
+        content = "x" * (FD_CACHE_READ_SIZE * 3 + 7)
+        with open(self.file_path, "w") as f:
+            f.write(content)
+        self.assertEqual(self.fd_cache.read(self.file_path), content)
+
+    def test_not_exist_and_max_open(self):
+        with self.assertRaises(FileNotFoundError):
+            self.fd_cache.read(os.path.join(self.tmp_dir.name, "none"))
+        other_file = os.path.join(self.tmp_dir.name, "other")
+        for file_path in (self.file_path, other_file):
+            with open(file_path, "w") as f:
+                f.write(file_path)
+        self.assertEqual(self.fd_cache.read(self.file_path), self.file_path)
+        self.assertEqual(self.fd_cache.read(other_file), other_file)
+        self.assertEqual(len(self.fd_cache), 1)
+
+
+def _nvme_log_data():
+    """latency log with version 1.0, read bucket i = i + 1, write bucket i = 1000 + i"""
+    data = bytearray(NVME_LOG_LEN)
+    struct.pack_into('<II', data, 0, 1, 0)
+    for i in range(97):
+        struct.pack_into('<I', data, 8 + i * 4, i + 1)
+        struct.pack_into('<I', data, 396 + i * 4, 1000 + i)
+    return bytes(data)
+
+
+def _nvme_cli_output(data):
+    lines = ["Device:nvme0n1 log-id:194 namespace-id:0xffffffff",
+             "      0  1  2  3  4  5  6  7  8  9  a  b  c  d  e  f"]
+    for offset in range(0, len(data), 16):
+        lines.append("%04x " % offset + " ".join("%02x" % byte for byte in data[offset:offset + 16]))
+    return "\n".join(lines)
+
+
+def _expected_buckets(base):
+    bucket = [base + i for i in range(97)]
+    return [sum(bucket[0:32]), sum(bucket[32:41]), sum(bucket[41:66]), sum(bucket[66:93]),
+            sum(bucket[93:95]), sum(bucket[95:97])]
+
+
+class TestCollectDisk(unittest.TestCase):
+    """Test cases for NVMe latency distribution log decoding"""
+
+    def setUp(self):
+        self.collect_disk = CollectDisk("nvme_not_exist")
+
+    def test_parse_log_data(self):
+        data = _nvme_log_data()
+        expected = _expected_buckets(1) + _expected_buckets(1000)
+        self.assertEqual(self.collect_disk._parse_log_data(memoryview(data)), expected)
+        self.assertEqual(self.collect_disk._parse_nvme_output(_nvme_cli_output(data)), expected)
+
+    def test_passthru_cmd_layout(self):
+        # sizeof(struct nvme_passthru_cmd) in native byte order
+        self.assertEqual(collect_disk.NVME_PASSTHRU_CMD.size, 72)
+        cmd = collect_disk.NVME_PASSTHRU_CMD.pack(2, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+        self.assertEqual(cmd[4:8], struct.pack('=I', 1))
+
+    def test_decode_histogram(self):
+        histogram = self.collect_disk._decode_histogram(_nvme_log_data())
+        self.assertEqual(len(histogram), NVME_HIST_BUCKETS * 2)
+        self.assertEqual(histogram[0], 1)
+        self.assertEqual(histogram[NVME_HIST_BUCKETS - 1], 97)
+        self.assertEqual(histogram[NVME_HIST_BUCKETS], 1000)
+
+    def test_incomplete_log(self):
+        self.assertEqual(self.collect_disk._parse_log_data(bytes(100)), [])
+        self.assertIsNone(self.collect_disk._decode_histogram(bytes(100)))
+
+
+class TestDiskPeriodData(TestCollectorBase):
+    """Test cases for NVMe latency distribution deltas of one period"""
+
+    def setUp(self):
+        super().setUp()
+        self.collect_disk = CollectDisk("nvme_not_exist")
+        self.collect_io.disk_collectors["nvme0n1"] = self.collect_disk
+        self.collect_io.disk_data_window_value["nvme0n1"] = None
+
+    def collect(self, data):
+        self.collect_disk.collect_histogram = lambda: self.collect_disk._decode_histogram(data)
+        period_data = {}
+        self.collect_io.get_disk_period_data("nvme0n1", period_data)
+        return period_data
+
+    def test_delta(self):
+        first = bytearray(_nvme_log_data())
+        self.assertEqual(self.collect(first), {})
+        second = bytearray(first)
+        # 5 more reads in the first bucket, 2 more writes in the last bucket
+        struct.pack_into('<I', second, 8, 6)
+        struct.pack_into('<I', second, 780, 1098)
+        period_data = self.collect(second)
+        self.assertEqual(period_data[PERIOD_DISK], [[5, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 2]])
+        read_hist, write_hist = period_data[PERIOD_DISK_HIST]
+        self.assertEqual(read_hist, [5] + [0] * (NVME_HIST_BUCKETS - 1))
+        self.assertEqual(write_hist, [0] * (NVME_HIST_BUCKETS - 1) + [2])
+
+
+
+class TestCollectPeriod(TestCollectorBase):
+    """Test cases for collecting the disks of one period"""
+
+    def setUp(self):
+        super().setUp()
+        self.reads = {}
+        self.collect_io.fd_cache.read = self.read_stats
+        self.collect_io.get_sample_interval = lambda disk_name, sample_time: 1
+        for disk_name in ("sda", "sdb", "sdc"):
+            self.collect_io.window_value[disk_name] = {"bio": [], "rq_driver": []}
+            self.collect_io.disk_map_stage[disk_name] = ["bio", "rq_driver"]
+
+    def read_stats(self, path):
+        if not path.endswith("stats"):
+            return ""
+        self.reads[path] = self.reads.get(path, 0) + 1
+        count = self.reads[path] * len(path)
+        return "".join("{} {} 0\n".format(stage, " ".join([str(count), str(count * 2), str(count * 1000)] * 4))
+                       for stage in ("bio", "rq_driver"))
+
+    def collect_twice(self):
+        self.collect_io.collect_period(self.collect_io.collect_kernel_disk)
+        return self.collect_io.collect_period(self.collect_io.collect_kernel_disk)
+
+    def test_workers_match_serial(self):
+        serial = self.collect_twice()
+        self.assertEqual(serial["sda"][collect_io.PERIOD_IO]["bio"]["read"], (0.5, 0, 0, 100))
+        for window in self.collect_io.window_value.values():
+            for stage_window in window.values():
+                stage_window.clear()
+        self.reads.clear()
+        self.collect_io.executor = ThreadPoolExecutor(max_workers=2)
+        try:
+            self.assertEqual(self.collect_twice(), serial)
+        finally:
+            self.collect_io.executor.shutdown()
+
+    def test_sample_time_after_success(self):
+        del self.collect_io.get_sample_interval
+        self.assertIsNone(self.collect_io.collect_kernel_disk("sda", ["bio", "rq_driver"]))
+        self.assertNotIn("sda", self.collect_io.sample_time)
+        self.assertIsNotNone(self.collect_io.collect_kernel_disk("sda", ["bio", "rq_driver"]))
+        self.assertIn("sda", self.collect_io.sample_time)
+
+    def test_failed_disk(self):
+        collect_kernel_disk = self.collect_io.collect_kernel_disk
+
+        def collect_disk(disk_name, stage_list):
+            if disk_name == "sdb":
+                raise KeyError(disk_name)
+            return collect_kernel_disk(disk_name, stage_list)
+        self.collect_io.collect_period(collect_disk)
+        with self.assertLogs(level="ERROR"):
+            results = self.collect_io.collect_period(collect_disk)
+        self.assertIsNone(results["sdb"])
+        self.assertEqual(results["sda"][collect_io.PERIOD_IO]["bio"]["read"][3], 100)
+        self.assertEqual(results["sdc"][collect_io.PERIOD_IO]["bio"]["read"][3], 100)
+
+    def test_collect_cost(self):
+        # the slowest disk is reported when it takes longer than the period
+        self.collect_io.disk_collect_cost = {"sda": 0.2, "sdb": 1.5}
+        with self.assertLogs(level="WARNING") as logs:
+            self.collect_io.report_collect_cost()
+        self.assertIn("sdb", logs.output[0])
+        self.collect_io.disk_collect_cost = {"sda": 0.2, "sdb": 0.5}
+        with self.assertNoLogs(level="WARNING"):
+            self.collect_io.report_collect_cost()
+
+
+class TestTopIndex(unittest.TestCase):
+    """Test cases for the top k index of a period"""
+
+    def test_build_and_select(self):
+        period_io = {"sda": {"bio": {"read": (10, 0, 4096, 5), "write": (30, 1, 8192, 2)}},
+                     "sdb": {"bio": {"read": (20, 0, 0, 9)}, "rq_driver": {"read": (40, 2, 0, 1)}}}
+        top_index = build_top_index(period_io)
+        self.assertEqual([entry[3] for entry in top_index["latency"]], [40, 30, 20, 10])
+        self.assertEqual(top_index["iops"][0], ["sdb", "bio", "read", 9])
+        self.assertEqual(select_top(top_index["latency"], 2, [], []),
+                         [["sdb", "rq_driver", "read", 40], ["sda", "bio", "write", 30]])
+        self.assertEqual(select_top(top_index["latency"], 2, ["bio"], ["read"]),
+                         [["sdb", "bio", "read", 20], ["sda", "bio", "read", 10]])
+
+
+class TestStageGroup(unittest.TestCase):
+    """Test cases for the virtual stages of the stage groups"""
+
+    def test_build_stage_groups(self):
+        period_io = {"throtl": {"read": (10, 0, 2, 4)}, "wbt": {"read": (20, 1, 4, 6)},
+                     "rq_driver": {"read": (30, 2, 6, 5), "write": (7, 0, 1, 3)}, "bio": {"read": (90, 0, 9, 9)}}
+        self.assertEqual(get_stage_groups(list(period_io)), ["B-Q", "D-C", "B-C"])
+        self.assertEqual(get_stage_groups(["bio"]), [])
+        groups = build_stage_groups(period_io)
+        self.assertEqual(groups["B-Q"], {"read": (15, 1, 3, 6, 33.33)})
+        self.assertEqual(groups["D-C"], {"read": (30, 2, 6, 5, 66.67), "write": (7, 0, 1, 3, 100)})
+        self.assertEqual(groups["B-C"], {"read": (45, 3, 9, 6, 100), "write": (7, 0, 1, 3, 100)})
+        self.assertNotIn("Q-G", groups)
+
+
+class TestRollup(unittest.TestCase):
+    """Test cases for the rollups of the io records"""
+
+    def test_rollup_window(self):
+        rollup = Rollup(3, 3, 2)
+        for value in (4, 1, 7, 2):
+            rollup.add_period({"sda": {"bio": {"read": (value, 0, 1, value * 10)}}})
+            rollup.end_period()
+        ring = rollup.data["sda"]["bio"]["read"]
+        self.assertEqual(len(ring), 1)
+        self.assertEqual(ring.get(0), [12, 0, 3, 120, 1, 0, 1, 10, 7, 0, 1, 70, 3])
+        self.assertEqual(rollup.pending[("sda", "bio", "read")][-1], 1)
+
+    def test_rollup_cascade(self):
+        rollup = Rollup(4, 4, 2)
+        finer = Rollup(2, 2, 2)
+        coarser = Rollup(4, 2, 2)
+        finer.add_coarser(coarser)
+        for value in (4, 1, 7, 2):
+            for target in (rollup, finer):
+                target.add_period({"sda": {"bio": {"read": (value, 0, 1, value * 10)}}})
+                target.end_period()
+        self.assertEqual(coarser.data["sda"]["bio"]["read"].get(0), rollup.data["sda"]["bio"]["read"].get(0))
+
+    def test_select_resolution(self):
+        resolutions = [(1, 300), (10, 60), (60, 60)]
+        self.assertEqual(select_resolution(resolutions, 60, 0), 1)
+        self.assertEqual(select_resolution(resolutions, 600, 0), 10)
+        self.assertEqual(select_resolution(resolutions, 600, 30), 10)
+        self.assertEqual(select_resolution(resolutions, 600, 60), 60)
+        self.assertEqual(select_resolution(resolutions, 3600, 1), 60)
+        self.assertEqual(select_resolution(resolutions, 7200, 10), 60)
+
+
+class TestQuantile(unittest.TestCase):
+    """Test cases for the latency quantiles of histograms"""
+
+    def test_hist_quantiles(self):
+        counts = merge_hist([[0, 50, 0, 0], [0, 40, 9, 1]])
+        self.assertEqual(counts, [0, 90, 9, 1])
+        # buckets [0, 1), [1, 2), [2, 4), >= 4 us
+        self.assertEqual(hist_quantiles(counts, [1, 2, 4, float('inf')]), [1.6, 2, 4, 4])
+        self.assertIsNone(hist_quantiles([0] * LAT_HIST_SLOTS, LAT_HIST_UPPER_US))
+
+
+class TestDiskHotplug(TestCollectorBase):
+    """Test cases for the disks added and removed while collecting"""
+
+    def test_parse_uevent(self):
+        add_disk = b"add@/devices/virtual/block/sdb\0ACTION=add\0SUBSYSTEM=block\0DEVTYPE=disk\0DEVNAME=sdb\0"
+        self.assertEqual(parse_uevent(add_disk)["DEVNAME"], "sdb")
+        add_part = add_disk.replace(b"DEVTYPE=disk", b"DEVTYPE=partition")
+        self.assertIsNone(parse_uevent(add_part))
+        change_disk = add_disk.replace(b"ACTION=add", b"ACTION=change")
+        self.assertIsNone(parse_uevent(change_disk))
+
+    def test_sync_disks(self):
+        stores = [collect_io.IO_GLOBAL_DATA, collect_io.IO_DUMP_DATA, collect_io.LAT_HIST_DATA,
+                  collect_io.PERIOD_STAMP_DATA, collect_io.ROLLUP_DATA]
+        patchers = [mock.patch.dict(store, clear=True) for store in stores]
+        patchers.append(mock.patch.object(collect_io, "DISK_LISTENERS", []))
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        events = []
+        collect_io.register_disk_listener(lambda added, removed: events.append((added, removed)))
+        self.collect_io.disk_watcher.poll = lambda: True
+        disks = {"sda": EBPF_STAGE_LIST}
+
+        self.collect_io.sync_disks(lambda: disks, self.collect_io.add_ebpf_disk)
+        self.assertEqual(events, [(["sda"], [])])
+        self.assertIn("B-C", collect_io.IO_GLOBAL_DATA["sda"])
+        self.assertIn("sda", collect_io.LAT_HIST_DATA)
+
+        # a removed and added again disk is collected from scratch
+        self.collect_io.disk_watcher.removed_disks.add("sda")
+        disks["sdb"] = EBPF_STAGE_LIST
+        self.collect_io.sync_disks(lambda: disks, self.collect_io.add_ebpf_disk)
+        self.assertEqual(events[1], (["sda", "sdb"], ["sda"]))
+
+        del disks["sda"]
+        self.collect_io.sync_disks(lambda: disks, self.collect_io.add_ebpf_disk)
+        self.assertEqual(events[2], ([], ["sda"]))
+        self.assertEqual(list(collect_io.IO_GLOBAL_DATA), ["sdb"])
+        self.assertEqual(list(self.collect_io.window_value), ["sdb"])
+        self.collect_io.sync_disks(lambda: disks, self.collect_io.add_ebpf_disk)
+        self.assertEqual(len(events), 3)
+
+
+class TestPeriodTimer(TestCollectorBase):
+    """Test cases for the period deadlines and the rates over the sampled interval"""
+
+    def test_deadline(self):
+        clock = [100.0]
+        stop_event = mock.Mock()
+        stop_event.wait.side_effect = lambda timeout: clock.__setitem__(0, clock[0] + timeout)
+        timer = PeriodTimer(1, clock=lambda: clock[0])
+        # the collect time does not shift the next deadline
+        clock[0] += 0.3
+        self.assertEqual(timer.wait(stop_event), 0)
+        self.assertEqual(clock[0], 101.0)
+        # a collect of 2.5 periods passes the deadlines 102 and 103, 103 fires at once, 102 is missed
+        clock[0] += 2.5
+        self.assertEqual(timer.wait(stop_event), 1)
+        self.assertEqual(clock[0], 103.5)
+        self.assertEqual(timer.wait(stop_event), 0)
+        self.assertEqual(clock[0], 104.0)
+        self.assertEqual(timer.missed, 1)
+        stop_event.wait.side_effect = None
+        stop_event.wait.return_value = True
+        self.assertIsNone(timer.wait(stop_event))
+
+    def test_rate_interval(self):
+        last_value = ["0", "0", "0"] * 4
+        curr_value = ["0", "10", "4000000000"] + ["0", "0", "0"] * 3
+        self.assertEqual(self.collect_io.get_iops(curr_value, last_value, 0, 0.5), 20)
+        self.assertEqual(self.collect_io.get_io_length(curr_value, last_value, 0, 2), 2)
+        self.assertEqual(self.collect_io.get_ebpf_iops(30, 10, interval=4), 5)
+
+
+class TestSubSecondPeriod(unittest.TestCase):
+    """Test cases for the collect periods shorter than a second"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.conf_file = os.path.join(self.tmp_dir.name, "collector.conf")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def get_io_config(self, period_time):
+        with open(self.conf_file, "w") as f:
+            f.write(COLLECTOR_CONF.replace("period_time=1", "period_time=" + period_time))
+        return CollectConfig(self.conf_file)
+
+    def test_period_config(self):
+        self.assertEqual(self.get_io_config("0.1").get_io_config()["period_time"], 0.1)
+        self.assertEqual(self.get_io_config("2.000").get_io_config()["period_time"], 2)
+        for period_time in ("0.05", "0.1005", "abc", "301"):
+            self.assertEqual(self.get_io_config(period_time).get_io_config()["period_time"], 1)
+
+    def test_rollup_steps(self):
+        with mock.patch.dict(collect_io.ROLLUP_DATA, clear=True):
+            io = CollectIo(self.get_io_config("0.1"))
+            self.assertEqual(io.period_rollups, [collect_io.ROLLUP_DATA[10]])
+            self.assertEqual(collect_io.ROLLUP_DATA[10].steps, 100)
+            self.assertEqual(collect_io.ROLLUP_DATA[60].steps, 6)
+
+    def test_parse_stats_once(self):
+        io = CollectIo(self.get_io_config("0.1"))
+        io.window_value["sda"] = {"bio": []}
+        stats = "bio 1 2 3 4 5 6 7 8 9 10 11 12 0\nunknown 1 2 0\n"
+        with mock.patch.object(io.fd_cache, "read", return_value=stats):
+            self.assertEqual(io.get_blk_io_hierarchy("sda", ["bio"]), 0)
+        self.assertEqual(io.window_value["sda"], {"bio": [list(range(1, 13))]})
+
+
+class TestShmExport(unittest.TestCase):
+    """Test cases for the shared memory export and its reader"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "collector.shm")
+        self.exporter = ShmExporter(self.path)
+        self.reader = collect_plugin.CollectShmReader(self.path)
+
+    def tearDown(self):
+        self.reader.close()
+        self.exporter.close()
+        self.tmp_dir.cleanup()
+
+    def test_read_export(self):
+        data = {"sda": {"bio": {"read": NumericRingBuffer(3, 4), "write": NumericRingBuffer(3, 4)}}}
+        for value in range(1, 5):
+            data["sda"]["bio"]["read"].append([value, 0, 0.5, value])
+        self.exporter.export(data, 4, 12.5)
+        result = self.reader.read(["sda"], ["bio"], ["read", "write"])
+        self.assertEqual(result["ret"], 0)
+        self.assertEqual(result["message"], {"seq": 4, "time": 12.5, "data": {"sda": {"bio": {"read": [4, 0, 0.5, 4]}}}})
+        self.assertEqual(self.reader.read(["sda"], ["bio"], ["read"], age=2)["message"]["data"],
+                         {"sda": {"bio": {"read": [2, 0, 0.5, 2]}}})
+
+        # a new disk changes the layout, the reader maps the new file
+        data["sdb"] = {"bio": {"read": NumericRingBuffer(3, 4)}}
+        data["sdb"]["bio"]["read"].append([7, 0, 0, 7])
+        self.exporter.export(data, 5, 13.5)
+        result = self.reader.read(["sda", "sdb"], ["bio"], ["read"])
+        self.assertEqual(result["message"]["seq"], 5)
+        self.assertEqual(result["message"]["data"]["sdb"], {"bio": {"read": [7, 0, 0, 7]}})
+
+        self.exporter.close()
+        self.reader.close()
+        self.assertNotEqual(self.reader.read(["sda"], ["bio"], ["read"])["ret"], 0)
+
+    def test_torn_entry(self):
+        # the export directory is created if it does not exist
+        path = os.path.join(self.tmp_dir.name, "run", "collector.shm")
+        exporter = ShmExporter(path)
+        reader = collect_plugin.CollectShmReader(path)
+        data = {"sda": {"bio": {"read": NumericRingBuffer(3, 4)}}}
+        data["sda"]["bio"]["read"].append([1, 0, 0, 1])
+        exporter.export(data, 1, 1.0)
+        self.assertEqual(reader.read(["sda"], ["bio"], ["read"])["ret"], 0)
+        # the data of the next export seen before its stores are visible
+        exporter.mm[exporter.data_offset:exporter.data_offset + 8] = struct.pack('=d', 2)
+        with mock.patch.object(collect_plugin, "SHM_READ_RETRY_WAIT", 0):
+            self.assertNotEqual(reader.read(["sda"], ["bio"], ["read"])["ret"], 0)
+        reader.close()
+        exporter.close()
+
+
+class TestCollectServer(unittest.TestCase):
+    """Test cases for the collector socket server"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        socket_path = os.path.join(self.tmp_dir.name, "collector.sock")
+        self.patches = [mock.patch.object(collect_server, "SENTRY_RUN_DIR", self.tmp_dir.name),
+                        mock.patch.object(collect_server, "COLLECT_SOCKET_PATH", socket_path),
+                        mock.patch.object(collect_plugin, "COLLECT_SOCKET_PATH", socket_path),
+                        mock.patch.object(collect_io, "PERIOD_LISTENERS", []),
+                        mock.patch.object(collect_io, "DISK_LISTENERS", [])]
+        for patch in self.patches:
+            patch.start()
+        collect_io.IO_CONFIG_DATA[:] = [1, 10]
+        collect_io.IO_GLOBAL_DATA["sda"] = {"bio": {"read": NumericRingBuffer(10, 4)}}
+        collect_io.IO_DUMP_DATA["sda"] = {"bio": {"read": RingBuffer(10)}}
+        collect_io.PERIOD_STAMP_DATA["sda"] = NumericRingBuffer(10, collect_io.PERIOD_STAMP_WIDTH)
+        self.publish(1)
+
+        self.server = CollectServer()
+        self.thread = threading.Thread(target=self.server.server_loop)
+        self.thread.start()
+        for _ in range(100):
+            if os.path.exists(socket_path):
+                break
+            threading.Event().wait(0.01)
+
+    def tearDown(self):
+        self.server.stop_thread()
+        self.thread.join()
+        collect_io.IO_CONFIG_DATA.clear()
+        collect_io.IO_GLOBAL_DATA.clear()
+        collect_io.IO_DUMP_DATA.clear()
+        collect_io.PERIOD_STAMP_DATA.clear()
+        collect_io.TOP_INDEX_DATA.clear()
+        for patch in self.patches:
+            patch.stop()
+        self.tmp_dir.cleanup()
+
+    @staticmethod
+    def publish(value):
+        with collect_io.IO_DATA_LOCK:
+            collect_io.PERIOD_SEQ[0] += 1
+            collect_io.PERIOD_STAMP_DATA["sda"].append((collect_io.PERIOD_SEQ[0], value, 1, 0))
+            collect_io.IO_GLOBAL_DATA["sda"]["bio"]["read"].append([value, 0, 0, value])
+            collect_io.IO_DUMP_DATA["sda"]["bio"]["read"].append([])
+        for listener in collect_io.PERIOD_LISTENERS:
+            listener()
+
+    def test_get_io_data(self):
+        result = collect_plugin.get_io_data(1, ["sda"], ["bio"], ["read"])
+        self.assertEqual(result["ret"], 0)
+        self.assertEqual(json.loads(result["message"]), {"sda": {"bio": {"read": [1, 0, 0, 1]}}})
+
+    def test_sub_second_period(self):
+        collect_io.IO_CONFIG_DATA[:] = [0.1, 10]
+        self.publish(2)
+        self.publish(3)
+        result = collect_plugin.get_io_data(0.3, ["sda"], ["bio"], ["read"])
+        self.assertEqual(json.loads(result["message"]), {"sda": {"bio": {"read": [1, 0, 0, 1]}}})
+        result = collect_plugin.is_iocollect_valid(0.2, ["sda"])
+        self.assertEqual(json.loads(result["message"]), {"sda": ["bio"]})
+        result = collect_plugin.get_io_data(0.25, ["sda"], ["bio"], ["read"])
+        self.assertEqual(json.loads(result["message"]), {})
+        result = collect_plugin.get_io_data(0.0001, ["sda"], ["bio"], ["read"])
+        self.assertEqual(result["ret"], collect_plugin.ResultMessage.RESULT_NOT_PARAM)
+        result = collect_plugin.get_io_data(0.05, ["sda"], ["bio"], ["read"])
+        self.assertEqual(result["ret"], collect_plugin.ResultMessage.RESULT_INVALID_LENGTH)
+
+    def test_kept_connection(self):
+        client = collect_plugin.CollectClient()
+        request = json.dumps({"disk_list": json.dumps(["sda"]), "period": 1,
+                              "stage": json.dumps(["bio"]), "iotype": json.dumps(["read"])})
+        responses = client.request_many([(collect_plugin.ClientProtocol.GET_IO_DATA, request),
+                                         (collect_plugin.ClientProtocol.GET_IODUMP_DATA, request)])
+        self.assertEqual(json.loads(responses[0]), {"sda": {"bio": {"read": [1, 0, 0, 1]}}})
+        self.assertEqual(json.loads(responses[1]), {"sda": {"bio": {"read": []}}})
+        first_socket = client.client_socket
+        self.assertIsNotNone(client.request(collect_plugin.ClientProtocol.GET_IO_DATA, request))
+        self.assertIs(client.client_socket, first_socket)
+
+        # the connection is broken, the client connects again
+        first_socket.shutdown(socket.SHUT_RDWR)
+        self.assertIsNotNone(client.request(collect_plugin.ClientProtocol.GET_IO_DATA, request))
+        self.assertIsNot(client.client_socket, first_socket)
+        client.close()
+
+    def test_concurrent_clients(self):
+        # a client that sends half a request must not block the others
+        stalled = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stalled.connect(collect_server.COLLECT_SOCKET_PATH)
+        stalled.sendall(b"CLT01")
+        clients = [collect_plugin.CollectClient() for _ in range(5)]
+        request = json.dumps({"disk_list": json.dumps(["sda"]), "period": 1,
+                              "stage": json.dumps(["bio"]), "iotype": json.dumps(["read"])})
+        for client in clients:
+            self.assertEqual(json.loads(client.request(collect_plugin.ClientProtocol.GET_IO_DATA, request)),
+                             {"sda": {"bio": {"read": [1, 0, 0, 1]}}})
+
+        result = collect_plugin.get_server_stat()
+        self.assertEqual(result["ret"], 0)
+        stat = json.loads(result["message"])
+        self.assertGreaterEqual(stat["clients"], 7)
+        self.assertGreaterEqual(stat["requests"], 5)
+        for client in clients:
+            client.close()
+        stalled.close()
+
+    def test_get_period_bundle(self):
+        self.publish(2)
+        result = collect_plugin.get_period_bundle(2, ["sda"], ["bio"], ["read"])
+        self.assertEqual(result["ret"], 0)
+        message = json.loads(result["message"])
+        self.assertEqual(message[collect_plugin.DATASET_IO], {"sda": {"bio": {"read": [1, 0, 0, 1]}}})
+        self.assertEqual(message[collect_plugin.DATASET_IODUMP], {"sda": {"bio": {"read": []}}})
+        self.assertEqual(message[collect_plugin.DATASET_DISK], {})
+
+    def test_binary_encoding(self):
+        collect_io.IO_GLOBAL_DATA["sda"]["bio"]["write"] = NumericRingBuffer(10, 4)
+        collect_io.IO_GLOBAL_DATA["sda"]["bio"]["write"].append([2.5, 1, 4096, 3])
+        result = collect_plugin.get_io_data(1, ["sda"], ["bio"], ["read", "write"],
+                                            encoding=collect_plugin.ENCODING_BINARY)
+        self.assertEqual(result["ret"], 0)
+        table = result["message"]
+        self.assertIsInstance(table, collect_plugin.CollectTable)
+        self.assertEqual(len(table), 2)
+        self.assertEqual(list(table.get("sda", "bio", "write")), [2.5, 1, 4096, 3])
+        self.assertIsNone(table.get("sda", "bio", "flush"))
+        json_result = collect_plugin.get_io_data(1, ["sda"], ["bio"], ["read", "write"])
+        self.assertEqual(table.to_dict(), json.loads(json_result["message"]))
+
+        result = collect_plugin.get_period_bundle(1, ["sda"], ["bio"], ["read"],
+                                                  encoding=collect_plugin.ENCODING_BINARY)
+        self.assertEqual(result["ret"], 0)
+        bundle = result["message"]
+        self.assertEqual(bundle[collect_plugin.DATASET_IO].to_dict(), {"sda": {"bio": {"read": [1, 0, 0, 1]}}})
+        self.assertEqual(bundle[collect_plugin.DATASET_IODUMP], {"sda": {"bio": {"read": []}}})
+        self.assertEqual(len(bundle[collect_plugin.DATASET_DISK]), 0)
+
+        # a stage group keeps its share alone, only the io fields with raw stages
+        collect_io.IO_GLOBAL_DATA["sda"]["B-C"] = {"read": NumericRingBuffer(10, 5)}
+        collect_io.IO_GLOBAL_DATA["sda"]["B-C"]["read"].append([6, 0, 0, 1, 100])
+        table = collect_plugin.get_io_data(1, ["sda"], ["B-C"], ["read"], encoding=collect_plugin.ENCODING_BINARY)
+        self.assertEqual(list(table["message"].get("sda", "B-C", "read")), [6, 0, 0, 1, 100])
+        table = collect_plugin.get_io_data(1, ["sda"], ["bio", "B-C"], ["read"],
+                                           encoding=collect_plugin.ENCODING_BINARY)
+        self.assertEqual(table["message"].to_dict(), {"sda": {"bio": {"read": [1, 0, 0, 1]},
+                                                              "B-C": {"read": [6, 0, 0, 1]}}})
+
+    def test_get_io_window(self):
+        self.publish(2)
+        self.publish(3)
+        result = collect_plugin.get_io_window(1, 2, ["sda"], ["bio"], ["read"])
+        self.assertEqual(result["ret"], 0)
+        self.assertEqual(json.loads(result["message"]), {"sda": {"bio": {"read": [[2, 0, 0, 2], [3, 0, 0, 3]]}}})
+        # the window is cut to the saved periods
+        result = collect_plugin.get_io_window(2, 10, ["sda"], ["bio"], ["read"])
+        self.assertEqual(json.loads(result["message"]), {"sda": {"bio": {"read": [[1, 0, 0, 1], [2, 0, 0, 2]]}}})
+        self.assertNotEqual(collect_plugin.get_io_window(1, 0, ["sda"], ["bio"], ["read"])["ret"], 0)
+
+    def test_get_stage_group_stats(self):
+        with collect_io.IO_DATA_LOCK:
+            collect_io.IO_GLOBAL_DATA["sda"]["B-Q"] = {"read": NumericRingBuffer(10, 5)}
+            collect_io.IO_GLOBAL_DATA["sda"]["B-C"] = {"read": NumericRingBuffer(10, 5)}
+            for latency, share in ((1000, 25), (3000, 75)):
+                collect_io.IO_GLOBAL_DATA["sda"]["B-Q"]["read"].append([latency, 0, 1, 5, share])
+                collect_io.IO_GLOBAL_DATA["sda"]["B-C"]["read"].append([4000, 0, 1, 5, 100])
+        stats = collect_plugin.get_stage_group_stats(1, 2, "sda", "read")
+        self.assertEqual(stats["B-Q"], {"min": 1000, "max": 3000, "avg": 2000, "pct": 50})
+        self.assertEqual(stats["B-C"], {"min": 4000, "max": 4000, "avg": 4000, "pct": 100})
+        self.assertEqual(stats["D-C"], {"min": 0, "max": 0, "avg": 0, "pct": 0})
+
+    def test_invalid_field(self):
+        io_request = {"period": 1, "disk_list": json.dumps(["sda"]), "stage": json.dumps(["bio"]),
+                      "iotype": json.dumps(["read"])}
+        requests = [(collect_plugin.ClientProtocol.GET_IO_WINDOW, dict(io_request, window="x")),
+                    (collect_plugin.ClientProtocol.GET_IO_SINCE, io_request),
+                    (collect_plugin.ClientProtocol.GET_IO_DATA, [1])]
+        client = collect_plugin.CollectClient()
+        responses = client.request_many([(protocol, json.dumps(data)) for protocol, data in requests])
+        client.close()
+        # each bad request is answered, the connection is kept
+        self.assertEqual(responses, [b"{}"] * len(requests))
+        result = collect_plugin.get_io_data(1, ["sda"], ["bio"], ["read"])
+        self.assertEqual(result["ret"], 0)
+
+    def test_get_io_since(self):
+        result = collect_plugin.get_io_since(0, ["sda"], ["bio"], ["read"])
+        self.assertEqual(result["ret"], 0)
+        message = json.loads(result["message"])
+        seq = message["seq"]
+        self.assertEqual(message["stamps"], {"sda": [[seq, 1, 1, 0]]})
+        self.assertEqual(message["data"], {"sda": {"bio": {"read": [[1, 0, 0, 1]]}}})
+
+        result = collect_plugin.get_io_since(seq, ["sda"], ["bio"], ["read"])
+        self.assertEqual(result["ret"], collect_plugin.ResultMessage.RESULT_NOT_MODIFIED)
+        self.assertEqual(json.loads(result["message"])["seq"], seq)
+
+        self.publish(2)
+        self.publish(3)
+        message = json.loads(collect_plugin.get_io_since(seq, ["sda"], ["bio"], ["read"])["message"])
+        self.assertEqual(message["seq"], seq + 2)
+        self.assertEqual(message["stamps"], {"sda": [[seq + 1, 2, 1, 0], [seq + 2, 3, 1, 0]]})
+        self.assertEqual(message["data"], {"sda": {"bio": {"read": [[2, 0, 0, 2], [3, 0, 0, 3]]}}})
+
+    def test_get_io_data_all(self):
+        for index in range(30):
+            ring = NumericRingBuffer(10, 4)
+            ring.append([index, 0, 0, index])
+            collect_io.IO_GLOBAL_DATA["nvme%dn1" % index] = {"bio": {"read": ring}}
+        # a few disks a page
+        with mock.patch.object(collect_server, "IO_PAGE_MAX_LEN", 200):
+            result = collect_plugin.get_io_data_all(1, [], ["read"])
+            self.assertEqual(result["ret"], 0)
+            message = json.loads(result["message"])
+            self.assertEqual(len(message), 31)
+            self.assertEqual(message["nvme17n1"], {"bio": {"read": [17, 0, 0, 17]}})
+
+            result = collect_plugin.get_io_data_all(1, ["bio"], ["read"], disk_pattern=r"nvme1\d*n1")
+            self.assertEqual(sorted(json.loads(result["message"])), sorted("nvme%dn1" % i for i in [1] + list(range(10, 20))))
+            result = collect_plugin.get_io_data_all(1, ["bio"], ["read"], disk_pattern="nvme.*",
+                                                    disk_list=["sda", "nvme3n1"])
+            self.assertEqual(list(json.loads(result["message"])), ["nvme3n1"])
+        self.assertNotEqual(collect_plugin.get_io_data_all(1, ["bio"], ["read"], disk_pattern="nvme(")["ret"], 0)
+
+    def test_is_iocollect_valid_stage_group(self):
+        collect_io.IO_GLOBAL_DATA["sda"]["B-C"] = {"read": NumericRingBuffer(10, 4)}
+        res = collect_plugin.is_iocollect_valid(1, ["sda"])
+        self.assertEqual(json.loads(res["message"]), {"sda": ["bio"]})
+        res = collect_plugin.is_iocollect_valid(1, ["sda"], ["bio", "B-C"])
+        self.assertEqual(json.loads(res["message"]), {"sda": ["bio", "B-C"]})
+
+    def test_get_io_rollup(self):
+        rollup = Rollup(2, 2, 10)
+        for value in (3, 5):
+            rollup.add_period({"sda": {"bio": {"read": (value, 0, 0, value)}}})
+            rollup.end_period()
+        with mock.patch.dict(collect_io.ROLLUP_DATA, {2: rollup}, clear=True):
+            res = collect_plugin.get_io_rollup(1, ["sda"], ["bio"], ["read"])
+            self.assertEqual(json.loads(res["message"]),
+                             {"resolution": 1, "data": {"sda": {"bio": {"read": [[1, 0, 0, 1] * 3 + [1]]}}}})
+            res = collect_plugin.get_io_rollup(20, ["sda"], ["bio"], ["read"])
+            self.assertEqual(json.loads(res["message"]),
+                             {"resolution": 2, "data": {"sda": {"bio": {"read": [[8, 0, 0, 8, 3, 0, 0, 3,
+                                                                                  5, 0, 0, 5, 2]]}}}})
+
+    def test_get_io_quantile(self):
+        ring = NumericRingBuffer(10, LAT_HIST_SLOTS, 'Q')
+        ring.append([0, 10] + [0] * (LAT_HIST_SLOTS - 2))
+        ring.append([0, 0, 10] + [0] * (LAT_HIST_SLOTS - 3))
+        with mock.patch.dict(collect_io.LAT_HIST_DATA, {"sda": {"bio": {"read": ring}}}, clear=True):
+            res = collect_plugin.get_io_quantile(1, ["sda"], ["bio"], ["read"])
+            self.assertEqual(json.loads(res["message"]), {"sda": {"bio": {"read": [3, 3.8, 4, 4, 10]}}})
+            res = collect_plugin.get_io_quantile(1, ["sda"], ["bio"], ["read"], window=2)
+            self.assertEqual(json.loads(res["message"]), {"sda": {"bio": {"read": [2, 3.6, 4, 4, 20]}}})
+
+    def test_get_top_k(self):
+        collect_io.TOP_INDEX_DATA["latency"] = RingBuffer(10)
+        collect_io.TOP_INDEX_DATA["latency"].append(build_top_index({"sda": {"bio": {"read": (5, 0, 0, 1)}}})["latency"])
+        collect_io.TOP_INDEX_DATA["latency"].append(build_top_index(
+            {"sda": {"bio": {"read": (7, 0, 0, 1)}},
+             "sdb": {"bio": {"read": (9, 0, 0, 1), "write": (8, 0, 0, 1)}}})["latency"])
+        result = collect_plugin.get_top_k(1, "latency", 2)
+        self.assertEqual(result["ret"], 0)
+        self.assertEqual(json.loads(result["message"]), [["sdb", "bio", "read", 9], ["sdb", "bio", "write", 8]])
+        result = collect_plugin.get_top_k(2, "latency", 2, iotype=["read"])
+        self.assertEqual(json.loads(result["message"]), [["sda", "bio", "read", 5]])
+        self.assertNotEqual(collect_plugin.get_top_k(1, "unknown", 2)["ret"], 0)
+
+    def test_response_cache(self):
+        for _ in range(3):
+            result = collect_plugin.get_io_data(1, ["sda"], ["bio"], ["read"])
+            self.assertEqual(json.loads(result["message"]), {"sda": {"bio": {"read": [1, 0, 0, 1]}}})
+        stat = json.loads(collect_plugin.get_server_stat()["message"])
+        self.assertEqual(stat["cache_misses"], 1)
+        self.assertEqual(stat["cache_hits"], 2)
+
+        # a new period invalidates the cached responses
+        self.publish(2)
+        result = collect_plugin.get_io_data(1, ["sda"], ["bio"], ["read"])
+        self.assertEqual(json.loads(result["message"]), {"sda": {"bio": {"read": [2, 0, 0, 2]}}})
+        stat = json.loads(collect_plugin.get_server_stat()["message"])
+        self.assertEqual(stat["cache_misses"], 2)
+
+    def test_subscribe(self):
+        subscriber = collect_plugin.CollectSubscriber(["sda"], ["bio"], ["read"])
+        result = subscriber.subscribe()
+        self.assertEqual(result["ret"], 0)
+        self.assertEqual(json.loads(result["message"])["io"], {"sda": {"bio": {"read": [1, 0, 0, 1]}}})
+        self.assertEqual(subscriber.recv(timeout=0.05)["ret"], 1)
+
+        self.publish(2)
+        result = subscriber.recv(timeout=5)
+        self.assertEqual(result["ret"], 0)
+        message = json.loads(result["message"])
+        self.assertEqual(message["io"], {"sda": {"bio": {"read": [2, 0, 0, 2]}}})
+        self.assertEqual(message["iodump"], {"sda": {"bio": {"read": []}}})
+        subscriber.close()
+
+    def test_subscribe_disk_event(self):
+        subscriber = collect_plugin.CollectSubscriber(["sda"], ["bio"], ["read"], disk_event=True)
+        self.assertEqual(subscriber.subscribe()["ret"], 0)
+        for listener in collect_io.DISK_LISTENERS:
+            listener(["sdb"], [])
+        result = subscriber.recv(timeout=5)
+        self.assertEqual(result["ret"], collect_plugin.ResultMessage.RESULT_DISK_CHANGED)
+        self.assertEqual(json.loads(result["message"]), {"added": ["sdb"], "removed": [], "disks": ["sda"]})
+        # no period is pushed again without a new one
+        self.assertEqual(subscriber.recv(timeout=0.05)["ret"], 1)
+        subscriber.close()
+
+        result = collect_plugin.get_disk_list()
+        self.assertEqual(json.loads(result["message"]), {"disks": ["sda"]})
+
+
+if __name__ == '__main__':
+    unittest.main()
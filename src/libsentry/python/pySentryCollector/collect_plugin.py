@@ -16,7 +16,15 @@ import json
 import socket
 import logging
 import re
+import math
 import os
+import select
+import struct
+import threading
+import time
+import mmap
+import zlib
+from array import array
 
 from syssentry.utils import MAX_MSG_LEN
 
@@ -27,36 +35,128 @@ CLT_MSG_HEAD_LEN = 9    #3+2+4
 CLT_MSG_PRO_LEN = 2
 CLT_MSG_MAGIC_LEN = 3
 CLT_MSG_LEN_LEN = 4
+# head of a request with id and its response: magic, protocol, req id, data len, 3+2+8+8
+CLM_MSG_HEAD_LEN = 21
+CLM_MSG_REQ_ID_LEN = 8
+CLM_MSG_LEN_LEN = 8
+CLM_MSG_REQ_ID_MAX = 10 ** CLM_MSG_REQ_ID_LEN
+CLIENT_RECV_TIMEOUT = 5
+# pushed messages carry the req id of the subscribe request
+SUBSCRIBE_REQ_ID = 0
+CLIENT_CONNECT_RETRY = 1
 
 CLT_MAGIC = "CLT"
 RES_MAGIC = "RES"
+# requests with id on a kept connection and their responses
+CLM_MAGIC = "CLM"
+RSM_MAGIC = "RSM"
 
 # disk limit
 LIMIT_DISK_CHAR_LEN = 32
-LIMIT_DISK_LIST_LEN = 10
+LIMIT_DISK_LIST_LEN = 1024
+LIMIT_DISK_PATTERN_LEN = 128
 
 # stage limit
 LIMIT_STAGE_CHAR_LEN = 20
-LIMIT_STAGE_LIST_LEN = 15
+# raw stages and the virtual stages below
+LIMIT_STAGE_LIST_LEN = 21
+# virtual stages of the stage groups derived by the collector, listed by
+# is_iocollect_valid only when asked for by name. their records are the io fields,
+# then the share in percent of the group latency in the latency of "B-C"
+STAGE_GROUP_LIST = ["B-Q", "Q-G", "G-I", "I-D", "D-C", "B-C"]
 
 #iotype limit
 LIMIT_IOTYPE_CHAR_LEN = 7
 LIMIT_IOTYPE_LIST_LEN = 4
 
-#period limit
-LIMIT_PERIOD_MIN_LEN = 1
+# bulk query limit, a storage node has hundreds of disks at most
+LIMIT_IO_PAGE_NUM = 1024
+# pages of other periods are read again
+IO_PAGE_RETRY = 3
+
+# top k query, metrics are fields of the io data
+TOP_K_METRICS = ["latency", "io_dump", "io_length", "iops"]
+LIMIT_TOP_K = 256
+
+# rollup query, the look-back period is up to the longest rollup history
+LIMIT_ROLLUP_PERIOD_MAX_LEN = 3600 * 1440
+
+#period limit, seconds in an int or a float of whole milliseconds
+LIMIT_PERIOD_MIN_LEN = 0.1
 LIMIT_PERIOD_MAX_LEN = 300
+LIMIT_PERIOD_MS_TOLERANCE = 1e-6
 
 # max_save
 LIMIT_MAX_SAVE_LEN = 300
 
+# upper bound in us of each bucket returned by get_disk_hist_data,
+# 32 * 32us, 31 * 1ms, 30 * 32ms, 1-2s, 2-3s, 3-4s, >4s
+DISK_HIST_BUCKET_UPPER_US = ([32 * (i + 1) for i in range(32)] +
+                             [1000 * (i + 2) for i in range(31)] +
+                             [32000 * (i + 2) for i in range(29)] + [1000000] +
+                             [2000000, 3000000, 4000000, float('inf')])
+
+# dataset names of get_period_bundle, CollectSubscriber and binary messages
+DATASET_IO = "io"
+DATASET_IODUMP = "iodump"
+DATASET_DISK = "disk"
+DATASET_DISK_HIST = "disk_hist"
+# (dataset, is CollectTable) of a binary period bundle
+BUNDLE_DATASETS = [(DATASET_IO, True), (DATASET_IODUMP, False), (DATASET_DISK, True)]
+# latency histograms of get_io_quantile and its quantiles, the io num follows them
+QUANTILE_DATASETS = [DATASET_IO, DATASET_DISK_HIST]
+QUANTILE_NAMES = ["p50", "p90", "p99", "p999"]
+
+# response encoding, the numeric data can be sent as binary tables
+ENCODING_JSON = "json"
+ENCODING_BINARY = "binary"
+
+# binary response layout, keep in sync with sentryCollector/collect_encode.py
+BIN_MSG_MARKER = 0
+BIN_MSG_VERSION = 1
+BIN_SECTION_TABLE = 1
+BIN_SECTION_JSON = 2
+BIN_MSG_HEAD = struct.Struct('<BBH')
+BIN_SECTION_HEAD = struct.Struct('<BBI')
+BIN_TABLE_HEAD = struct.Struct('<HIH')
+
+# shared memory export layout, keep in sync with sentryCollector/collect_shm.py
+COLLECT_SHM_PATH = "/var/run/sysSentry/collector.shm"
+SHM_MAGIC = b'SSCM'
+SHM_VERSION = 2
+SHM_HEAD = struct.Struct('=4sIQQdIIIIII')
+SHM_LOCK_SEQ = struct.Struct('=Q')
+SHM_LOCK_SEQ_OFFSET = 8
+SHM_PERIOD = struct.Struct('=Qd')
+SHM_PERIOD_OFFSET = 16
+SHM_VALID = struct.Struct('=I')
+SHM_VALID_OFFSET = 32
+SHM_ENTRY = struct.Struct('=32s20s8sIII')
+SHM_ENTRY_STATE = struct.Struct('=III')
+SHM_RING_STATE = struct.Struct('=II')
+SHM_ENTRY_STATE_OFFSET = 60
+# the collector writes the file for some microseconds once a period
+SHM_READ_RETRY = 100
+SHM_READ_RETRY_WAIT = 0.001
+
 # interface protocol
 class ClientProtocol():
     IS_IOCOLLECT_VALID = 0
     GET_IO_DATA = 1
     GET_IODUMP_DATA = 2
     GET_DISK_DATA = 3
-    PRO_END = 4
+    GET_DISK_HIST_DATA = 4
+    SUBSCRIBE = 5
+    GET_PERIOD_BUNDLE = 6
+    GET_SERVER_STAT = 7
+    GET_IO_WINDOW = 8
+    GET_IO_SINCE = 9
+    GET_IO_PAGE = 10
+    GET_TOP_K = 11
+    GET_IO_ROLLUP = 12
+    GET_IO_QUANTILE = 13
+    GET_DISK_LIST = 14
+    PRO_END = 15
 
 class ResultMessage():
     RESULT_SUCCEED = 0
@@ -68,6 +168,8 @@ class ResultMessage():
     RESULT_INVALID_CHAR = 6 # invalid char
     RESULT_DISK_NOEXIST = 7 # disk is not exist
     RESULT_DISK_TYPE_MISMATCH= 8 # disk type mismatch
+    RESULT_NOT_MODIFIED = 9 # no period is published after the given sequence
+    RESULT_DISK_CHANGED = 10 # disks are added or removed, pushed to a subscriber
 
 Result_Messages = {
     ResultMessage.RESULT_SUCCEED: "Succeed",
@@ -78,7 +180,9 @@ Result_Messages = {
     ResultMessage.RESULT_PARSE_FAILED: "Parse failed",
     ResultMessage.RESULT_INVALID_CHAR: "Invalid char",
     ResultMessage.RESULT_DISK_NOEXIST: "Disk is not exist",
-    ResultMessage.RESULT_DISK_TYPE_MISMATCH: "Disk type mismatch"
+    ResultMessage.RESULT_DISK_TYPE_MISMATCH: "Disk type mismatch",
+    ResultMessage.RESULT_NOT_MODIFIED: "Not modified",
+    ResultMessage.RESULT_DISK_CHANGED: "Disk changed"
 }
 
 class DiskType():
@@ -92,68 +196,264 @@ Disk_Type = {
     DiskType.TYPE_SATA_HDD: "sata_hdd"
 }
 
-def client_send_and_recv(request_data, data_str_len, protocol):
-    """client socket send and recv message"""
-    try:
+def client_recv_exact(client_socket, length):
+    """recv exactly length bytes, None if the connection is closed"""
+    data = bytearray()
+    while len(data) < length:
+        chunk = client_socket.recv(length - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+class CollectClient():
+    """
+    long-lived connection to the collector. every request carries an id and
+    the response with the same id is returned, so several requests can be
+    sent on one connection before reading their responses. a broken
+    connection is reconnected and the request is sent once more.
+    """
+
+    def __init__(self):
+        self.client_socket = None
+        self.pid = None
+        self.req_id = 0
+        self.lock = threading.Lock()
+
+    def connect(self):
         client_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-    except socket.error:
-        logging.error("collect_plugin: client create socket error")
-        return None
+        try:
+            client_socket.settimeout(CLIENT_RECV_TIMEOUT)
+            client_socket.connect(COLLECT_SOCKET_PATH)
+        except OSError:
+            client_socket.close()
+            raise
+        self.client_socket = client_socket
+        self.pid = os.getpid()
 
-    try:
-        client_socket.connect(COLLECT_SOCKET_PATH)
-    except OSError:
-        client_socket.close()
-        logging.error("collect_plugin: client connect error")
-        return None
+    def close(self):
+        with self.lock:
+            self._close()
 
-    req_data_len = len(request_data)
-    request_msg = CLT_MAGIC + str(protocol).zfill(CLT_MSG_PRO_LEN) + str(req_data_len).zfill(CLT_MSG_LEN_LEN) + request_data
+    def request(self, protocol, request_data):
+        """send one request, return the response data bytes or None"""
+        result = self.request_many([(protocol, request_data)])
+        return result[0]
 
-    try:
-        client_socket.send(request_msg.encode())
-        res_data = client_socket.recv(len(RES_MAGIC) + CLT_MSG_PRO_LEN + data_str_len)
-        res_data = res_data.decode()
-    except (OSError, UnicodeError):
-        client_socket.close()
-        logging.error("collect_plugin: client communicate error")
-        return None
+    def request_many(self, requests):
+        """send all (protocol, request_data) requests at once, return the response data bytes or None of each"""
+        with self.lock:
+            for retry in range(CLIENT_CONNECT_RETRY + 1):
+                try:
+                    if self.pid != os.getpid():
+                        # inherited by fork, the connection belongs to the parent
+                        self._close()
+                    if self.client_socket is None:
+                        self.connect()
+                    return self._request_many(requests)
+                except (OSError, ValueError, UnicodeError) as e:
+                    self._close()
+                    if retry < CLIENT_CONNECT_RETRY:
+                        logging.debug("collect_plugin: request failed, %s, reconnect", e)
+                    else:
+                        logging.error("collect_plugin: client communicate error, %s", e)
+        return [None] * len(requests)
 
-    res_magic = res_data[:CLT_MSG_MAGIC_LEN]
-    if res_magic != "RES":
-        client_socket.close()
-        logging.error("res msg format error")
-        return None
+    def _close(self):
+        if self.client_socket is not None:
+            self.client_socket.close()
+            self.client_socket = None
 
-    protocol_str = res_data[CLT_MSG_MAGIC_LEN:CLT_MSG_MAGIC_LEN+CLT_MSG_PRO_LEN]
-    try:
-        protocol_id = int(protocol_str)
-    except ValueError:
-        client_socket.close()
-        logging.error("recv msg protocol id is invalid %s", protocol_str)
-        return None
+    def _request_many(self, requests):
+        req_ids = []
+        request_msg = ''
+        for protocol, request_data in requests:
+            self.req_id = (self.req_id + 1) % CLM_MSG_REQ_ID_MAX
+            req_ids.append(self.req_id)
+            request_msg += CLM_MAGIC + str(protocol).zfill(CLT_MSG_PRO_LEN) + \
+                str(self.req_id).zfill(CLM_MSG_REQ_ID_LEN) + str(len(request_data)).zfill(CLM_MSG_LEN_LEN) + \
+                request_data
+        self.client_socket.sendall(request_msg.encode())
 
-    if protocol_id >= ClientProtocol.PRO_END:
-        client_socket.close()
-        logging.error("protocol id is invalid")
-        return None
+        responses = {}
+        while len(responses) < len(req_ids):
+            req_id, res_data = self._recv_response()
+            if req_id in req_ids:
+                responses[req_id] = res_data
+            else:
+                logging.debug("collect_plugin: drop response of req id %d", req_id)
+        return [responses[req_id] for req_id in req_ids]
 
-    try:
-        res_data_len = int(res_data[CLT_MSG_MAGIC_LEN+CLT_MSG_PRO_LEN:])
+    def _recv_response(self):
+        res_head = client_recv_exact(self.client_socket, CLM_MSG_HEAD_LEN)
+        if res_head is None:
+            raise ConnectionError("connection closed by collector")
+        res_head = res_head.decode()
+        if res_head[:CLT_MSG_MAGIC_LEN] != RSM_MAGIC:
+            raise ValueError("res msg format error")
+
+        protocol_id = int(res_head[CLT_MSG_MAGIC_LEN:CLT_MSG_MAGIC_LEN+CLT_MSG_PRO_LEN])
+        if protocol_id >= ClientProtocol.PRO_END:
+            raise ValueError("protocol id is invalid")
+        req_id = int(res_head[CLT_MSG_MAGIC_LEN+CLT_MSG_PRO_LEN:CLM_MSG_HEAD_LEN-CLM_MSG_LEN_LEN])
+        res_data_len = int(res_head[CLM_MSG_HEAD_LEN-CLM_MSG_LEN_LEN:])
         if res_data_len < 0 or res_data_len > MAX_MSG_LEN:
-            client_socket.close()
-            logging.error("socket recv data is illegal:%d", res_data_len)
-            return None
-        res_msg_data = client_socket.recv(res_data_len)
-        res_msg_data = res_msg_data.decode()
-        return res_msg_data
-    except (OSError, ValueError, UnicodeError):
-        logging.error("collect_plugin: client recv res msg error")
-    finally:
-        client_socket.close()
+            raise ValueError("socket recv data is illegal:%d" % res_data_len)
+        res_data = client_recv_exact(self.client_socket, res_data_len)
+        if res_data is None:
+            raise ConnectionError("connection closed by collector")
+        return req_id, res_data
+
+
+# connection shared by the module level functions
+COLLECT_CLIENT = CollectClient()
 
+
+def client_send_and_recv(request_data, data_str_len, protocol):
+    """client socket send and recv message, data_str_len is kept for compatibility"""
+    res_data = COLLECT_CLIENT.request(protocol, request_data)
+    if res_data is None:
+        return None
+    try:
+        return res_data.decode()
+    except UnicodeError:
+        logging.error("collect_plugin: client recv res msg error")
     return None
 
+
+class CollectTable():
+    """
+    numeric records decoded from a binary response, one record of width values
+    for each disk, stage and iotype. values of record i are
+    values[i * width:(i + 1) * width].
+    """
+
+    def __init__(self, width=0, names=None, disk_index=None, stage_index=None, iotype_index=None, values=None):
+        self.width = width
+        self.names = names or []
+        self.disk_index = disk_index if disk_index is not None else array('H')
+        self.stage_index = stage_index if stage_index is not None else array('H')
+        self.iotype_index = iotype_index if iotype_index is not None else array('H')
+        self.values = values if values is not None else array('d')
+        self.record_index = None
+
+    @classmethod
+    def from_bytes(cls, payload):
+        width, record_num, name_num = BIN_TABLE_HEAD.unpack_from(payload, 0)
+        offset = BIN_TABLE_HEAD.size
+        names = []
+        for _ in range(name_num):
+            name_len = payload[offset]
+            offset += 1
+            names.append(bytes(payload[offset:offset + name_len]).decode())
+            offset += name_len
+        columns = []
+        for typecode, num in (('H', record_num), ('H', record_num), ('H', record_num), ('d', record_num * width)):
+            column = array(typecode)
+            end = offset + num * column.itemsize
+            if end > len(payload):
+                raise ValueError("binary table is truncated")
+            column.frombytes(payload[offset:end])
+            columns.append(column)
+            offset = end
+        return cls(width, names, *columns)
+
+    @classmethod
+    def from_dict(cls, data):
+        """build the table from the json form {disk: {stage: {iotype: values}}}"""
+        table = cls()
+        name_index = {}
+        for disk_name, stage_info in data.items():
+            for stage_name, iotype_info in stage_info.items():
+                for iotype_name, values in iotype_info.items():
+                    for name, column in ((disk_name, table.disk_index), (stage_name, table.stage_index),
+                                         (iotype_name, table.iotype_index)):
+                        if name not in name_index:
+                            name_index[name] = len(table.names)
+                            table.names.append(name)
+                        column.append(name_index[name])
+                    table.width = len(values)
+                    table.values.extend(values)
+        return table
+
+    def __len__(self):
+        return len(self.disk_index)
+
+    def get(self, disk, stage, iotype):
+        """values of one record, None if there is none"""
+        if self.record_index is None:
+            self.record_index = {}
+            for i in range(len(self)):
+                key = (self.names[self.disk_index[i]], self.names[self.stage_index[i]],
+                       self.names[self.iotype_index[i]])
+                self.record_index[key] = i
+        i = self.record_index.get((disk, stage, iotype))
+        if i is None:
+            return None
+        return self.values[i * self.width:(i + 1) * self.width]
+
+    def records(self):
+        """yield disk, stage, iotype and the values of each record"""
+        names = self.names
+        width = self.width
+        for i in range(len(self)):
+            yield (names[self.disk_index[i]], names[self.stage_index[i]], names[self.iotype_index[i]],
+                   self.values[i * width:(i + 1) * width])
+
+    def to_dict(self):
+        """the json form {disk: {stage: {iotype: values}}}"""
+        result = {}
+        for disk_name, stage_name, iotype_name, values in self.records():
+            result.setdefault(disk_name, {}).setdefault(stage_name, {})[iotype_name] = \
+                [int(value) if value.is_integer() else value for value in values]
+        return result
+
+
+def decode_binary_msg(res_data):
+    """decode a binary message into {section name: CollectTable or json object}"""
+    marker, version, section_num = BIN_MSG_HEAD.unpack_from(res_data, 0)
+    if marker != BIN_MSG_MARKER or version != BIN_MSG_VERSION:
+        raise ValueError("binary msg version %d is not supported" % version)
+    view = memoryview(res_data)
+    offset = BIN_MSG_HEAD.size
+    sections = {}
+    for _ in range(section_num):
+        section_type, name_len, payload_len = BIN_SECTION_HEAD.unpack_from(res_data, offset)
+        offset += BIN_SECTION_HEAD.size
+        name = bytes(view[offset:offset + name_len]).decode()
+        offset += name_len
+        payload = view[offset:offset + payload_len]
+        offset += payload_len
+        if section_type == BIN_SECTION_TABLE:
+            sections[name] = CollectTable.from_bytes(payload)
+        elif section_type == BIN_SECTION_JSON:
+            sections[name] = json.loads(bytes(payload))
+    return sections
+
+
+def decode_binary_response(res_data, datasets):
+    """
+    decode a response of a binary request. datasets are the expected
+    (name, is_table) sections, a json response of an old collector or an
+    error is converted to the same form. return {name: CollectTable or json object}.
+    """
+    if res_data[:1] == b'{':
+        data = json.loads(res_data)
+        if len(datasets) == 1:
+            data = {datasets[0][0]: data}
+        sections = {}
+        for name, is_table in datasets:
+            value = data.get(name, {})
+            sections[name] = CollectTable.from_dict(value) if is_table else value
+        return sections
+
+    sections = decode_binary_msg(res_data)
+    for name, is_table in datasets:
+        if name not in sections:
+            sections[name] = CollectTable() if is_table else {}
+    return sections
+
 def validate_parameters(param, len_limit, char_limit):
     ret = ResultMessage.RESULT_SUCCEED
     if not param:
@@ -188,6 +488,24 @@ def validate_parameters(param, len_limit, char_limit):
 
     return [True, ret]
 
+def is_period_type(period):
+    """period is seconds in an int, or in a float of whole milliseconds"""
+    if isinstance(period, bool):
+        return False
+    if isinstance(period, int):
+        return True
+    return isinstance(period, float) and math.isfinite(period) and \
+        abs(period * 1000 - round(period * 1000)) <= LIMIT_PERIOD_MS_TOLERANCE
+
+def validate_io_parameters(disk_list, stage, iotype):
+    for param, len_limit, char_limit in ((disk_list, LIMIT_DISK_LIST_LEN, LIMIT_DISK_CHAR_LEN),
+                                         (stage, LIMIT_STAGE_LIST_LEN, LIMIT_STAGE_CHAR_LEN),
+                                         (iotype, LIMIT_IOTYPE_LIST_LEN, LIMIT_IOTYPE_CHAR_LEN)):
+        res = validate_parameters(param, len_limit, char_limit)
+        if not res[0]:
+            return res[1]
+    return ResultMessage.RESULT_SUCCEED
+
 def is_iocollect_valid(period, disk_list=None, stage=None):
     result = inter_is_iocollect_valid(period, disk_list, stage)
     error_code = result['ret']
@@ -200,7 +518,7 @@ def inter_is_iocollect_valid(period, disk_list=None, stage=None):
     result['ret'] = ResultMessage.RESULT_UNKNOWN
     result['message'] = ""
 
-    if not period or not isinstance(period, int):
+    if not period or not is_period_type(period):
         result['ret'] = ResultMessage.RESULT_NOT_PARAM
         return result
     if period < LIMIT_PERIOD_MIN_LEN or period > LIMIT_PERIOD_MAX_LEN * LIMIT_MAX_SAVE_LEN:
@@ -246,31 +564,29 @@ def inter_is_iocollect_valid(period, disk_list=None, stage=None):
     return result
 
 
-def inter_get_io_common(period, disk_list, stage, iotype, protocol):
+def inter_get_io_common(period, disk_list, stage, iotype, protocol, datasets=None, window=None):
     result = {}
     result['ret'] = ResultMessage.RESULT_UNKNOWN
     result['message'] = ""
 
-    if not isinstance(period, int):
+    if not is_period_type(period):
         result['ret'] = ResultMessage.RESULT_NOT_PARAM
         return result
     if period < LIMIT_PERIOD_MIN_LEN or period > LIMIT_PERIOD_MAX_LEN * LIMIT_MAX_SAVE_LEN:
         result['ret'] = ResultMessage.RESULT_INVALID_LENGTH
         return result
 
-    res = validate_parameters(disk_list, LIMIT_DISK_LIST_LEN, LIMIT_DISK_CHAR_LEN)
-    if not res[0]:
-        result['ret'] = res[1]
-        return result
-
-    res = validate_parameters(stage, LIMIT_STAGE_LIST_LEN, LIMIT_STAGE_CHAR_LEN)
-    if not res[0]:
-        result['ret'] = res[1]
-        return result
+    if window is not None:
+        if not isinstance(window, int):
+            result['ret'] = ResultMessage.RESULT_NOT_PARAM
+            return result
+        if window < 1 or window > LIMIT_MAX_SAVE_LEN:
+            result['ret'] = ResultMessage.RESULT_INVALID_LENGTH
+            return result
 
-    res = validate_parameters(iotype, LIMIT_IOTYPE_LIST_LEN, LIMIT_IOTYPE_CHAR_LEN)
-    if not res[0]:
-        result['ret'] = res[1]
+    ret = validate_io_parameters(disk_list, stage, iotype)
+    if ret != ResultMessage.RESULT_SUCCEED:
+        result['ret'] = ret
         return result
 
     req_msg_struct = {
@@ -279,6 +595,11 @@ def inter_get_io_common(period, disk_list, stage, iotype, protocol):
         'stage': json.dumps(stage),
         'iotype': json.dumps(iotype)
     }
+    if window is not None:
+        req_msg_struct['window'] = window
+    if datasets:
+        req_msg_struct['encoding'] = ENCODING_BINARY
+        return inter_get_binary(json.dumps(req_msg_struct), protocol, datasets)
 
     request_message = json.dumps(req_msg_struct)
     result_message = client_send_and_recv(request_message, CLT_MSG_LEN_LEN, protocol)
@@ -297,8 +618,33 @@ def inter_get_io_common(period, disk_list, stage, iotype, protocol):
     return result
 
 
-def get_io_data(period, disk_list, stage, iotype):
-    result = inter_get_io_common(period, disk_list, stage, iotype, ClientProtocol.GET_IO_DATA)
+def inter_get_binary(request_message, protocol, datasets):
+    """the message of the result is {name: CollectTable or json object} of datasets"""
+    result = {}
+    result['ret'] = ResultMessage.RESULT_UNKNOWN
+    result['message'] = ""
+
+    res_data = COLLECT_CLIENT.request(protocol, request_message)
+    if not res_data:
+        logging.error("collect_plugin: client_send_and_recv failed")
+        return result
+    try:
+        result['message'] = decode_binary_response(res_data, datasets)
+    except (ValueError, IndexError, struct.error) as e:
+        logging.error("get_io_common: binary decode error, %s", e)
+        result['ret'] = ResultMessage.RESULT_PARSE_FAILED
+        return result
+
+    result['ret'] = ResultMessage.RESULT_SUCCEED
+    return result
+
+
+def get_io_data(period, disk_list, stage, iotype, encoding=ENCODING_JSON):
+    """with ENCODING_BINARY the message is a CollectTable instead of a json str"""
+    datasets = [(DATASET_IO, True)] if encoding == ENCODING_BINARY else None
+    result = inter_get_io_common(period, disk_list, stage, iotype, ClientProtocol.GET_IO_DATA, datasets)
+    if datasets and result['ret'] == ResultMessage.RESULT_SUCCEED:
+        result['message'] = result['message'][DATASET_IO]
     error_code = result['ret']
     if error_code != ResultMessage.RESULT_SUCCEED:
         result['message'] = Result_Messages[error_code]
@@ -313,14 +659,490 @@ def get_iodump_data(period, disk_list, stage, iotype):
     return result
 
 
-def get_disk_data(period, disk_list, stage, iotype):
-    result = inter_get_io_common(period, disk_list, stage, iotype, ClientProtocol.GET_DISK_DATA)
+def get_disk_data(period, disk_list, stage, iotype, encoding=ENCODING_JSON):
+    """with ENCODING_BINARY the message is a CollectTable instead of a json str"""
+    datasets = [(DATASET_DISK, True)] if encoding == ENCODING_BINARY else None
+    result = inter_get_io_common(period, disk_list, stage, iotype, ClientProtocol.GET_DISK_DATA, datasets)
+    if datasets and result['ret'] == ResultMessage.RESULT_SUCCEED:
+        result['message'] = result['message'][DATASET_DISK]
+    error_code = result['ret']
+    if error_code != ResultMessage.RESULT_SUCCEED:
+        result['message'] = Result_Messages[error_code]
+    return result
+
+
+def get_disk_hist_data(period, disk_list, stage, iotype, encoding=ENCODING_JSON):
+    """
+    per bucket read/write latency counts of the nvme latency log, see
+    DISK_HIST_BUCKET_UPPER_US for the bucket bounds.
+    """
+    datasets = [(DATASET_DISK_HIST, True)] if encoding == ENCODING_BINARY else None
+    result = inter_get_io_common(period, disk_list, stage, iotype, ClientProtocol.GET_DISK_HIST_DATA, datasets)
+    if datasets and result['ret'] == ResultMessage.RESULT_SUCCEED:
+        result['message'] = result['message'][DATASET_DISK_HIST]
+    error_code = result['ret']
+    if error_code != ResultMessage.RESULT_SUCCEED:
+        result['message'] = Result_Messages[error_code]
+    return result
+
+
+def get_period_bundle(period, disk_list, stage, iotype, encoding=ENCODING_JSON):
+    """
+    io, iodump and disk data of the same collect period in one request,
+    the message is {DATASET_IO: ..., DATASET_IODUMP: ..., DATASET_DISK: ...}.
+    with ENCODING_BINARY it is a dict instead of a json str, io and disk data
+    are CollectTable.
+    """
+    datasets = BUNDLE_DATASETS if encoding == ENCODING_BINARY else None
+    result = inter_get_io_common(period, disk_list, stage, iotype, ClientProtocol.GET_PERIOD_BUNDLE, datasets)
+    error_code = result['ret']
+    if error_code != ResultMessage.RESULT_SUCCEED:
+        result['message'] = Result_Messages[error_code]
+    return result
+
+
+def get_io_window(period, window, disk_list, stage, iotype):
+    """
+    io data of up to window periods, the newest one is the period given like
+    get_io_data, in one request. the message is a json str of
+    {disk: {stage: {iotype: [value of each period, the oldest first]}}},
+    a window longer than the saved history gets the saved periods only.
+    """
+    result = inter_get_io_common(period, disk_list, stage, iotype, ClientProtocol.GET_IO_WINDOW, window=window)
+    error_code = result['ret']
+    if error_code != ResultMessage.RESULT_SUCCEED:
+        result['message'] = Result_Messages[error_code]
+    return result
+
+
+def get_stage_group_stats(period, window, disk, iotype):
+    """
+    min, max and avg latency in us and the avg share in percent of each stage group
+    of STAGE_GROUP_LIST over up to window periods of one disk and iotype, one
+    get_io_window request. the latency of a group in a period is the average of its
+    raw stages, so min and max are over these period values, and those of "B-C" are
+    over the period totals. return {stage group: {"min", "max", "avg", "pct"}},
+    all 0 for a group without data or if the request failed.
+    """
+    stats = {group: {'min': 0, 'max': 0, 'avg': 0, 'pct': 0} for group in STAGE_GROUP_LIST}
+    window = min(max(window, 1), LIMIT_MAX_SAVE_LEN)
+    result = get_io_window(period, window, [disk], STAGE_GROUP_LIST, [iotype])
+    if result['ret'] != ResultMessage.RESULT_SUCCEED:
+        logging.error("collect_plugin: get stage groups of %s failed, %s", disk, result['message'])
+        return stats
+    try:
+        data = json.loads(result['message']).get(disk, {})
+    except (ValueError, AttributeError) as e:
+        logging.error("collect_plugin: stage groups of %s decode failed, %s", disk, e)
+        return stats
+
+    for group in STAGE_GROUP_LIST:
+        records = data.get(group, {}).get(iotype)
+        if not records:
+            continue
+        latencies = [record[0] for record in records]
+        shares = [record[4] for record in records if len(record) > 4]
+        stats[group] = {
+            'min': min(latencies),
+            'max': max(latencies),
+            'avg': sum(latencies) / len(latencies),
+            'pct': sum(shares) / len(shares) if shares else 0
+        }
+    return stats
+
+
+def get_io_since(seq, disk_list, stage, iotype):
+    """
+    io data of the periods published after sequence seq, pass 0 to get all saved periods.
+    the message is a json str of {"seq": latest sequence, "time": its monotonic time,
+    "stamps": {disk: [[sequence, time, interval, missed] of each period]},
+    "data": {disk: {stage: {iotype: [value of each period]}}}}, the oldest period first.
+    interval is the seconds the rates of the period are computed over, missed is the
+    periods the collector skipped before it. a hole in the sequences means periods were
+    missed by the caller.
+    ret is RESULT_NOT_MODIFIED with {"seq", "time"} in the message if no period is published after seq.
+    """
+    result = {}
+    result['ret'] = ResultMessage.RESULT_UNKNOWN
+    result['message'] = ""
+
+    if not isinstance(seq, int) or seq < 0:
+        result['ret'] = ResultMessage.RESULT_NOT_PARAM
+        result['message'] = Result_Messages[result['ret']]
+        return result
+    ret = validate_io_parameters(disk_list, stage, iotype)
+    if ret != ResultMessage.RESULT_SUCCEED:
+        result['ret'] = ret
+        result['message'] = Result_Messages[result['ret']]
+        return result
+
+    req_msg_struct = {
+        'disk_list': json.dumps(disk_list),
+        'since': seq,
+        'stage': json.dumps(stage),
+        'iotype': json.dumps(iotype)
+    }
+    result_message = client_send_and_recv(json.dumps(req_msg_struct), CLT_MSG_LEN_LEN, ClientProtocol.GET_IO_SINCE)
+    if not result_message:
+        logging.error("collect_plugin: client_send_and_recv failed")
+        result['message'] = Result_Messages[result['ret']]
+        return result
+    try:
+        message = json.loads(result_message)
+    except json.JSONDecodeError:
+        logging.error("get_io_since: json decode error")
+        result['ret'] = ResultMessage.RESULT_PARSE_FAILED
+        result['message'] = Result_Messages[result['ret']]
+        return result
+
+    if 'data' in message:
+        result['ret'] = ResultMessage.RESULT_SUCCEED
+    elif 'seq' in message:
+        result['ret'] = ResultMessage.RESULT_NOT_MODIFIED
+    else:
+        result['message'] = Result_Messages[result['ret']]
+        return result
+    result['message'] = result_message
+    return result
+
+
+def inter_get_io_pages(period, disk_list, stage, iotype, disk_pattern, datasets):
+    """read all pages of a bulk query, the message is {dataset: {disk: ...}} of one period"""
+    result = {}
+    result['ret'] = ResultMessage.RESULT_UNKNOWN
+    result['message'] = ""
+
+    if not is_period_type(period):
+        result['ret'] = ResultMessage.RESULT_NOT_PARAM
+        return result
+    if period < LIMIT_PERIOD_MIN_LEN or period > LIMIT_PERIOD_MAX_LEN * LIMIT_MAX_SAVE_LEN:
+        result['ret'] = ResultMessage.RESULT_INVALID_LENGTH
+        return result
+
+    for param, len_limit, char_limit in ((disk_list, LIMIT_DISK_LIST_LEN, LIMIT_DISK_CHAR_LEN),
+                                         (stage, LIMIT_STAGE_LIST_LEN, LIMIT_STAGE_CHAR_LEN)):
+        if not param:
+            continue
+        res = validate_parameters(param, len_limit, char_limit)
+        if not res[0]:
+            result['ret'] = res[1]
+            return result
+    res = validate_parameters(iotype, LIMIT_IOTYPE_LIST_LEN, LIMIT_IOTYPE_CHAR_LEN)
+    if not res[0]:
+        result['ret'] = res[1]
+        return result
+
+    if disk_pattern:
+        if not isinstance(disk_pattern, str):
+            result['ret'] = ResultMessage.RESULT_NOT_PARAM
+            return result
+        if len(disk_pattern) > LIMIT_DISK_PATTERN_LEN:
+            result['ret'] = ResultMessage.RESULT_EXCEED_LIMIT
+            return result
+        try:
+            re.compile(disk_pattern)
+        except re.error:
+            logging.error("%s is invalid disk pattern", disk_pattern)
+            result['ret'] = ResultMessage.RESULT_INVALID_CHAR
+            return result
+
+    req_msg_struct = {
+        'disk_list': json.dumps(disk_list or []),
+        'period': period,
+        'stage': json.dumps(stage or []),
+        'iotype': json.dumps(iotype),
+        'disk_pattern': disk_pattern or "",
+        'datasets': json.dumps(datasets)
+    }
+    for _ in range(IO_PAGE_RETRY):
+        data = {dataset: {} for dataset in datasets}
+        seq = None
+        cursor = ""
+        for _ in range(LIMIT_IO_PAGE_NUM):
+            req_msg_struct['cursor'] = cursor
+            result_message = client_send_and_recv(json.dumps(req_msg_struct), CLT_MSG_LEN_LEN,
+                                                  ClientProtocol.GET_IO_PAGE)
+            if not result_message:
+                logging.error("collect_plugin: client_send_and_recv failed")
+                return result
+            try:
+                page = json.loads(result_message)
+                page_seq, cursor, page_data = page['seq'], page['next'], page['data']
+            except (json.JSONDecodeError, KeyError, TypeError):
+                logging.error("get_io_pages: json decode error")
+                result['ret'] = ResultMessage.RESULT_PARSE_FAILED
+                return result
+            if seq is None:
+                seq = page_seq
+            elif page_seq != seq:
+                logging.debug("get_io_pages: a new period is published, read the pages again")
+                break
+            for dataset in datasets:
+                data[dataset].update(page_data.get(dataset, {}))
+            if not cursor:
+                result['ret'] = ResultMessage.RESULT_SUCCEED
+                result['message'] = data
+                return result
+        else:
+            logging.error("get_io_pages: pages exceed %d", LIMIT_IO_PAGE_NUM)
+            return result
+
+    logging.error("get_io_pages: the period changes while reading the pages")
+    return result
+
+
+def get_io_data_all(period, stage, iotype, disk_pattern=None, disk_list=None):
+    """
+    io data of all disks, or the disks matching the regular expression disk_pattern
+    and in disk_list, read page by page so there is no limit of the disk num.
+    an empty stage means all stages. the message is a json str like get_io_data.
+    """
+    result = inter_get_io_pages(period, disk_list, stage, iotype, disk_pattern, [DATASET_IO])
+    if result['ret'] == ResultMessage.RESULT_SUCCEED:
+        result['message'] = json.dumps(result['message'][DATASET_IO])
+    error_code = result['ret']
+    if error_code != ResultMessage.RESULT_SUCCEED:
+        result['message'] = Result_Messages[error_code]
+    return result
+
+
+def get_period_bundle_all(period, stage, iotype, disk_pattern=None, disk_list=None):
+    """io, iodump and disk data like get_period_bundle, of the disks selected like get_io_data_all"""
+    result = inter_get_io_pages(period, disk_list, stage, iotype, disk_pattern,
+                                [dataset for dataset, _ in BUNDLE_DATASETS])
+    if result['ret'] == ResultMessage.RESULT_SUCCEED:
+        result['message'] = json.dumps(result['message'])
     error_code = result['ret']
     if error_code != ResultMessage.RESULT_SUCCEED:
         result['message'] = Result_Messages[error_code]
     return result
 
 
+def get_top_k(period, metric, k, stage=None, iotype=None):
+    """
+    the k (disk, stage, iotype) with the greatest metric value in the period given
+    like get_io_data, an empty stage or iotype matches all. the message is a json str
+    of [[disk, stage, iotype, value], ...], the greatest value first.
+    """
+    result = {}
+    result['ret'] = ResultMessage.RESULT_UNKNOWN
+    result['message'] = ""
+
+    if not is_period_type(period) or not isinstance(k, int) or metric not in TOP_K_METRICS:
+        result['ret'] = ResultMessage.RESULT_NOT_PARAM
+        result['message'] = Result_Messages[result['ret']]
+        return result
+    if period < LIMIT_PERIOD_MIN_LEN or period > LIMIT_PERIOD_MAX_LEN * LIMIT_MAX_SAVE_LEN or \
+            k < 1 or k > LIMIT_TOP_K:
+        result['ret'] = ResultMessage.RESULT_INVALID_LENGTH
+        result['message'] = Result_Messages[result['ret']]
+        return result
+    for param, len_limit, char_limit in ((stage, LIMIT_STAGE_LIST_LEN, LIMIT_STAGE_CHAR_LEN),
+                                         (iotype, LIMIT_IOTYPE_LIST_LEN, LIMIT_IOTYPE_CHAR_LEN)):
+        if not param:
+            continue
+        res = validate_parameters(param, len_limit, char_limit)
+        if not res[0]:
+            result['ret'] = res[1]
+            result['message'] = Result_Messages[result['ret']]
+            return result
+
+    req_msg_struct = {
+        'period': period,
+        'metric': metric,
+        'k': k,
+        'stage': json.dumps(stage or []),
+        'iotype': json.dumps(iotype or [])
+    }
+    result_message = client_send_and_recv(json.dumps(req_msg_struct), CLT_MSG_LEN_LEN, ClientProtocol.GET_TOP_K)
+    if not result_message:
+        logging.error("collect_plugin: client_send_and_recv failed")
+        result['message'] = Result_Messages[result['ret']]
+        return result
+    try:
+        json.loads(result_message)
+    except json.JSONDecodeError:
+        logging.error("get_top_k: json decode error")
+        result['ret'] = ResultMessage.RESULT_PARSE_FAILED
+        result['message'] = Result_Messages[result['ret']]
+        return result
+
+    result['ret'] = ResultMessage.RESULT_SUCCEED
+    result['message'] = result_message
+    return result
+
+
+def get_io_rollup(period, disk_list, stage, iotype, step=None):
+    """
+    io data of the last period seconds from the cheapest resolution with windows not
+    longer than step seconds, or from the finest resolution keeping period seconds
+    if step is None. the message is a json str of
+    {"resolution": seconds, "data": {disk: {stage: {iotype: [window, ...]}}}}, the oldest
+    window first. a window is the sum, min and max of latency, io_dump, io_length and
+    iops over its periods, then the period count:
+    [sum * 4, min * 4, max * 4, count].
+    """
+    result = {}
+    result['ret'] = ResultMessage.RESULT_UNKNOWN
+    result['message'] = ""
+
+    if not is_period_type(period) or (step is not None and not is_period_type(step)):
+        result['ret'] = ResultMessage.RESULT_NOT_PARAM
+        result['message'] = Result_Messages[result['ret']]
+        return result
+    if period < LIMIT_PERIOD_MIN_LEN or period > LIMIT_ROLLUP_PERIOD_MAX_LEN or \
+            (step is not None and (step < LIMIT_PERIOD_MIN_LEN or step > LIMIT_ROLLUP_PERIOD_MAX_LEN)):
+        result['ret'] = ResultMessage.RESULT_INVALID_LENGTH
+        result['message'] = Result_Messages[result['ret']]
+        return result
+    ret = validate_io_parameters(disk_list, stage, iotype)
+    if ret != ResultMessage.RESULT_SUCCEED:
+        result['ret'] = ret
+        result['message'] = Result_Messages[result['ret']]
+        return result
+
+    req_msg_struct = {
+        'disk_list': json.dumps(disk_list),
+        'period': period,
+        'step': step or 0,
+        'stage': json.dumps(stage),
+        'iotype': json.dumps(iotype)
+    }
+    result_message = client_send_and_recv(json.dumps(req_msg_struct), CLT_MSG_LEN_LEN, ClientProtocol.GET_IO_ROLLUP)
+    if not result_message:
+        logging.error("collect_plugin: client_send_and_recv failed")
+        result['message'] = Result_Messages[result['ret']]
+        return result
+    try:
+        message = json.loads(result_message)
+    except json.JSONDecodeError:
+        logging.error("get_io_rollup: json decode error")
+        result['ret'] = ResultMessage.RESULT_PARSE_FAILED
+        result['message'] = Result_Messages[result['ret']]
+        return result
+    if 'resolution' not in message:
+        result['message'] = Result_Messages[result['ret']]
+        return result
+
+    result['ret'] = ResultMessage.RESULT_SUCCEED
+    result['message'] = result_message
+    return result
+
+
+def get_io_quantile(period, disk_list, stage, iotype, window=1, dataset=DATASET_IO):
+    """
+    latency quantiles in us of up to window periods, the newest one is the period given
+    like get_io_data. DATASET_IO is the latency histogram of the ebpf stages, DATASET_DISK_HIST
+    the nvme latency log of rq_driver. the message is a json str of
+    {disk: {stage: {iotype: [p50, p90, p99, p999, io num]}}}, see QUANTILE_NAMES.
+    """
+    result = {}
+    result['ret'] = ResultMessage.RESULT_UNKNOWN
+    result['message'] = ""
+
+    if not isinstance(window, int) or dataset not in QUANTILE_DATASETS:
+        result['ret'] = ResultMessage.RESULT_NOT_PARAM
+        result['message'] = Result_Messages[result['ret']]
+        return result
+    if window < 1 or window > LIMIT_MAX_SAVE_LEN:
+        result['ret'] = ResultMessage.RESULT_INVALID_LENGTH
+        result['message'] = Result_Messages[result['ret']]
+        return result
+    if not is_period_type(period):
+        result['ret'] = ResultMessage.RESULT_NOT_PARAM
+        result['message'] = Result_Messages[result['ret']]
+        return result
+    if period < LIMIT_PERIOD_MIN_LEN or period > LIMIT_PERIOD_MAX_LEN * LIMIT_MAX_SAVE_LEN:
+        result['ret'] = ResultMessage.RESULT_INVALID_LENGTH
+        result['message'] = Result_Messages[result['ret']]
+        return result
+    ret = validate_io_parameters(disk_list, stage, iotype)
+    if ret != ResultMessage.RESULT_SUCCEED:
+        result['ret'] = ret
+        result['message'] = Result_Messages[result['ret']]
+        return result
+
+    req_msg_struct = {
+        'disk_list': json.dumps(disk_list),
+        'period': period,
+        'window': window,
+        'dataset': dataset,
+        'stage': json.dumps(stage),
+        'iotype': json.dumps(iotype)
+    }
+    result_message = client_send_and_recv(json.dumps(req_msg_struct), CLT_MSG_LEN_LEN, ClientProtocol.GET_IO_QUANTILE)
+    if not result_message:
+        logging.error("collect_plugin: client_send_and_recv failed")
+        result['message'] = Result_Messages[result['ret']]
+        return result
+    try:
+        json.loads(result_message)
+    except json.JSONDecodeError:
+        logging.error("get_io_quantile: json decode error")
+        result['ret'] = ResultMessage.RESULT_PARSE_FAILED
+        result['message'] = Result_Messages[result['ret']]
+        return result
+
+    result['ret'] = ResultMessage.RESULT_SUCCEED
+    result['message'] = result_message
+    return result
+
+
+def get_server_stat():
+    """
+    clients and subscribers the collector serves, requests it served and their
+    average and max latency in ms, response cache hits and misses, periods the
+    collector missed and its cpu usage in a share of one cpu, the message is a json str.
+    """
+    result = {}
+    result['ret'] = ResultMessage.RESULT_UNKNOWN
+    result['message'] = ""
+
+    result_message = client_send_and_recv(json.dumps({}), CLT_MSG_LEN_LEN, ClientProtocol.GET_SERVER_STAT)
+    if not result_message:
+        logging.error("collect_plugin: client_send_and_recv failed")
+        result['message'] = Result_Messages[result['ret']]
+        return result
+    try:
+        json.loads(result_message)
+    except json.JSONDecodeError:
+        logging.error("get_server_stat: json decode error")
+        result['ret'] = ResultMessage.RESULT_PARSE_FAILED
+        result['message'] = Result_Messages[result['ret']]
+        return result
+
+    result['ret'] = ResultMessage.RESULT_SUCCEED
+    result['message'] = result_message
+    return result
+
+
+def get_disk_list():
+    """
+    the disks being collected, the collector follows added and removed disks,
+    the message is a json str of {"disks": [disk, ...]}.
+    """
+    result = {}
+    result['ret'] = ResultMessage.RESULT_UNKNOWN
+    result['message'] = ""
+
+    result_message = client_send_and_recv(json.dumps({}), CLT_MSG_LEN_LEN, ClientProtocol.GET_DISK_LIST)
+    if not result_message:
+        logging.error("collect_plugin: client_send_and_recv failed")
+        result['message'] = Result_Messages[result['ret']]
+        return result
+    try:
+        json.loads(result_message)
+    except json.JSONDecodeError:
+        logging.error("get_disk_list: json decode error")
+        result['ret'] = ResultMessage.RESULT_PARSE_FAILED
+        result['message'] = Result_Messages[result['ret']]
+        return result
+
+    result['ret'] = ResultMessage.RESULT_SUCCEED
+    result['message'] = result_message
+    return result
+
+
 def get_disk_type(disk):
     result = {}
     result['ret'] = ResultMessage.RESULT_UNKNOWN
@@ -378,3 +1200,245 @@ def get_disk_type(disk):
 
     result['ret'] = ResultMessage.RESULT_SUCCEED
     return result
+
+
+class CollectSubscriber():
+    """
+    subscribe the collected data, after each collect period the collector
+    pushes the io, iodump and disk data of that period, so the caller
+    needs not poll with its own timer.
+    """
+
+    def __init__(self, disk_list, stage, iotype, encoding=ENCODING_JSON, disk_event=False):
+        self.disk_list = disk_list
+        self.stage = stage
+        self.iotype = iotype
+        # with ENCODING_BINARY the message is decoded like get_period_bundle does
+        self.encoding = encoding
+        # with disk_event, recv also returns RESULT_DISK_CHANGED with a json str of
+        # {"added": [...], "removed": [...], "disks": [...]} when the disks change
+        self.disk_event = disk_event
+        self.client_socket = None
+
+    def subscribe(self):
+        """connect and subscribe, the result message is the latest period"""
+        result = {}
+        result['ret'] = ResultMessage.RESULT_UNKNOWN
+        result['message'] = ""
+        self.close()
+
+        ret = validate_io_parameters(self.disk_list, self.stage, self.iotype)
+        if ret != ResultMessage.RESULT_SUCCEED:
+            result['ret'] = ret
+            result['message'] = Result_Messages[ret]
+            return result
+
+        req_msg_struct = {
+            'disk_list': json.dumps(self.disk_list),
+            'stage': json.dumps(self.stage),
+            'iotype': json.dumps(self.iotype)
+        }
+        if self.encoding == ENCODING_BINARY:
+            req_msg_struct['encoding'] = ENCODING_BINARY
+        if self.disk_event:
+            req_msg_struct['disk_event'] = True
+        request_data = json.dumps(req_msg_struct)
+        request_msg = CLM_MAGIC + str(ClientProtocol.SUBSCRIBE).zfill(CLT_MSG_PRO_LEN) + \
+            str(SUBSCRIBE_REQ_ID).zfill(CLM_MSG_REQ_ID_LEN) + str(len(request_data)).zfill(CLM_MSG_LEN_LEN) + \
+            request_data
+        try:
+            self.client_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.client_socket.connect(COLLECT_SOCKET_PATH)
+            self.client_socket.sendall(request_msg.encode())
+        except OSError:
+            logging.error("collect_plugin: subscribe failed")
+            self.close()
+            result['message'] = Result_Messages[result['ret']]
+            return result
+        return self.recv()
+
+    def recv(self, timeout=None):
+        """wait for the next pushed period or disk change, timeout is in seconds, None waits forever"""
+        result = {}
+        result['ret'] = ResultMessage.RESULT_UNKNOWN
+        result['message'] = ""
+        if self.client_socket is None:
+            result['message'] = Result_Messages[result['ret']]
+            return result
+
+        try:
+            readable, _, _ = select.select([self.client_socket], [], [], timeout)
+            if not readable:
+                logging.debug("collect_plugin: subscriber recv timeout")
+                result['message'] = Result_Messages[result['ret']]
+                return result
+            # the rest of a pushed message follows at once
+            self.client_socket.settimeout(CLIENT_RECV_TIMEOUT)
+            res_head = client_recv_exact(self.client_socket, CLM_MSG_HEAD_LEN)
+            if res_head is None or res_head[:CLT_MSG_MAGIC_LEN].decode() != RSM_MAGIC:
+                raise ValueError("res msg head is invalid")
+            protocol = int(res_head[CLT_MSG_MAGIC_LEN:CLT_MSG_MAGIC_LEN + CLT_MSG_PRO_LEN])
+            res_data_len = int(res_head[CLM_MSG_HEAD_LEN - CLM_MSG_LEN_LEN:])
+            if res_data_len > MAX_MSG_LEN:
+                raise ValueError("res msg len is invalid")
+            res_data = client_recv_exact(self.client_socket, res_data_len)
+            if res_data is None:
+                raise ValueError("connection closed")
+            if protocol == ClientProtocol.GET_DISK_LIST:
+                message = res_data.decode()
+                json.loads(message)
+                result['ret'] = ResultMessage.RESULT_DISK_CHANGED
+                result['message'] = message
+                return result
+            if self.encoding == ENCODING_BINARY:
+                message = decode_binary_response(res_data, BUNDLE_DATASETS)
+            else:
+                message = res_data.decode()
+                json.loads(message)
+        except (OSError, ValueError, UnicodeError, IndexError, struct.error):
+            logging.error("collect_plugin: subscriber recv failed, subscribe again")
+            self.close()
+            result['message'] = Result_Messages[result['ret']]
+            return result
+
+        result['ret'] = ResultMessage.RESULT_SUCCEED
+        result['message'] = message
+        return result
+
+    def close(self):
+        if self.client_socket is not None:
+            self.client_socket.close()
+            self.client_socket = None
+
+
+class CollectShmReader():
+    """
+    read the io data the collector exports to a mmap file when shm_export is
+    on in collector.conf. the file is mapped read-only, a read takes no syscall
+    and retries while the collector is writing the file or the copy of an
+    entry does not match its checksum.
+    """
+
+    def __init__(self, path=COLLECT_SHM_PATH):
+        self.path = path
+        self.mm = None
+        # disk -> stage -> iotype -> entry index
+        self.entries = {}
+        self.capacity = 0
+        self.width = 0
+        self.entry_offset = 0
+        self.data_offset = 0
+
+    def open(self):
+        self.close()
+        try:
+            fd = os.open(self.path, os.O_RDONLY | os.O_CLOEXEC)
+            try:
+                mm = mmap.mmap(fd, 0, prot=mmap.PROT_READ)
+            finally:
+                os.close(fd)
+        except (OSError, ValueError) as e:
+            logging.error("collect_plugin: map %s failed, %s", self.path, e)
+            return False
+
+        try:
+            magic, version, _, _, _, valid, entry_num, capacity, width, entry_offset, data_offset = \
+                SHM_HEAD.unpack_from(mm, 0)
+            if magic != SHM_MAGIC or version != SHM_VERSION or not valid:
+                raise ValueError("shm head is invalid")
+            if data_offset + entry_num * capacity * width * 8 > len(mm):
+                raise ValueError("shm file is truncated")
+            entries = {}
+            for index in range(entry_num):
+                names = SHM_ENTRY.unpack_from(mm, entry_offset + index * SHM_ENTRY.size)[:3]
+                disk_name, stage_name, iotype_name = [name.rstrip(b'\0').decode() for name in names]
+                entries.setdefault(disk_name, {}).setdefault(stage_name, {})[iotype_name] = index
+        except (ValueError, UnicodeError, struct.error) as e:
+            logging.error("collect_plugin: %s is invalid, %s", self.path, e)
+            mm.close()
+            return False
+
+        self.mm = mm
+        self.entries = entries
+        self.capacity = capacity
+        self.width = width
+        self.entry_offset = entry_offset
+        self.data_offset = data_offset
+        return True
+
+    def read(self, disk_list, stage, iotype, age=0):
+        """
+        the records age periods before the latest one, like get_io_data with
+        period (age + 1) * period_time. the message is
+        {"seq": period sequence, "time": its monotonic time, "data": {disk: {stage: {iotype: record}}}}.
+        """
+        result = {}
+        result['ret'] = ResultMessage.RESULT_UNKNOWN
+        result['message'] = ""
+
+        ret = validate_io_parameters(disk_list, stage, iotype)
+        if ret != ResultMessage.RESULT_SUCCEED:
+            result['ret'] = ret
+            result['message'] = Result_Messages[ret]
+            return result
+        if not isinstance(age, int) or age < 0:
+            result['ret'] = ResultMessage.RESULT_NOT_PARAM
+            result['message'] = Result_Messages[result['ret']]
+            return result
+
+        for _ in range(SHM_READ_RETRY):
+            if (self.mm is None or not SHM_VALID.unpack_from(self.mm, SHM_VALID_OFFSET)[0]) and not self.open():
+                break
+            lock_seq = SHM_LOCK_SEQ.unpack_from(self.mm, SHM_LOCK_SEQ_OFFSET)[0]
+            if lock_seq % 2 == 0:
+                message = self.read_snapshot(disk_list, stage, iotype, age)
+                if message is not None and SHM_LOCK_SEQ.unpack_from(self.mm, SHM_LOCK_SEQ_OFFSET)[0] == lock_seq:
+                    result['ret'] = ResultMessage.RESULT_SUCCEED
+                    result['message'] = message
+                    return result
+            time.sleep(SHM_READ_RETRY_WAIT)
+
+        result['message'] = Result_Messages[result['ret']]
+        return result
+
+    def read_snapshot(self, disk_list, stage, iotype, age):
+        """the records of a copy of each entry, None if a copy does not match its checksum"""
+        mm = self.mm
+        record = struct.Struct('={}d'.format(self.width))
+        slot_bytes = self.capacity * record.size
+        period = mm[SHM_PERIOD_OFFSET:SHM_PERIOD_OFFSET + SHM_PERIOD.size]
+        period_seq, period_time = SHM_PERIOD.unpack(period)
+        period_crc = zlib.crc32(period)
+        data = {}
+        for disk_name in disk_list:
+            stage_info = self.entries.get(disk_name)
+            if stage_info is None:
+                continue
+            data[disk_name] = {}
+            for stage_name in stage:
+                iotype_info = stage_info.get(stage_name)
+                if iotype_info is None:
+                    continue
+                data[disk_name][stage_name] = {}
+                for iotype_name in iotype:
+                    index = iotype_info.get(iotype_name)
+                    if index is None:
+                        continue
+                    head, count, checksum = SHM_ENTRY_STATE.unpack_from(
+                        mm, self.entry_offset + index * SHM_ENTRY.size + SHM_ENTRY_STATE_OFFSET)
+                    slots = mm[self.data_offset + index * slot_bytes:self.data_offset + (index + 1) * slot_bytes]
+                    if zlib.crc32(slots, zlib.crc32(SHM_RING_STATE.pack(head, count), period_crc)) != checksum:
+                        return None
+                    if age >= count:
+                        continue
+                    slot = (head - 1 - age) % self.capacity
+                    values = record.unpack_from(slots, slot * record.size)
+                    data[disk_name][stage_name][iotype_name] = [int(value) if value.is_integer() else value
+                                                                for value in values]
+        return {"seq": period_seq, "time": period_time, "data": data}
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+            self.entries = {}
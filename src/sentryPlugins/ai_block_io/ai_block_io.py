@@ -20,9 +20,7 @@ from .sliding_window import SlidingWindowFactory, DataWindow
 from .utils import get_data_queue_size_and_update_size
 from .config_parser import ConfigParser
 from .data_access import (
-    get_io_data_from_collect_plug,
-    get_iodump_data_from_collect_plug,
-    get_disk_data_from_collect_plug,
+    get_period_bundle_from_collect_plug,
     check_collect_valid,
     get_disk_type,
     check_disk_is_available
@@ -199,15 +197,14 @@ class SlowIODetection:
             logging.debug("step0. AI threshold slow io event detection is looping.")
 
             # Step1：获取IO数据
-            io_data_dict_with_disk_name = get_io_data_from_collect_plug(
-                self._config_parser.period_time, self._disk_list
-            )
-            iodump_data_dict_with_disk_name = get_iodump_data_from_collect_plug(
-                self._config_parser.period_time, self._disk_list
-            )
-            io_disk_data_dict_with_disk_name = get_disk_data_from_collect_plug(
+            period_bundle = get_period_bundle_from_collect_plug(
                 self._config_parser.period_time, self._disk_list
             )
+            if period_bundle is None:
+                io_data_dict_with_disk_name = None
+            else:
+                (io_data_dict_with_disk_name, iodump_data_dict_with_disk_name,
+                 io_disk_data_dict_with_disk_name) = period_bundle
             logging.debug(f"step1. Get io data: {str(io_data_dict_with_disk_name)}")
             if io_data_dict_with_disk_name is None:
                 Report.report_pass(
@@ -251,7 +248,7 @@ class SlowIODetection:
                 logging.warning(f"latency: " + str(alarm_content.get("details").get("latency")))
                 logging.warning(f"iodump: " + str(alarm_content.get("details").get("iodump")))
                 logging.warning(f"iops: " + str(alarm_content.get("details").get("iops")))
-                extra_slow_log(alarm_content)
+                extra_slow_log(alarm_content, self._config_parser.period_time)
                 del alarm_content["details"]["iodump_data"] # 极端场景下iodump_data可能过大,导致发送失败,所以只在日志中打印,不发送到告警模块
                 del alarm_content["details"]["disk_data"]
                 Xalarm.major(alarm_content)
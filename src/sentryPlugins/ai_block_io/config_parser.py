@@ -13,6 +13,7 @@ import os
 import configparser
 import logging
 
+from sentryCollector.collect_plugin import LIMIT_DISK_LIST_LEN
 from .alarm_report import Report
 from .threshold import ThresholdType
 from .utils import get_threshold_type_enum, get_sliding_window_type_enum, get_log_level
@@ -229,18 +230,15 @@ class ConfigParser:
         if len(disk_list) == 1 and disk_list[0] == "default":
             self._conf["common"]["disk"] = None
             return
-        if len(disk_list) > 10:
-            ten_disk_list = disk_list[0:10]
-            other_disk_list = disk_list[10:]
-            logging.warning(f"disk only support maximum is 10, disks: {ten_disk_list} will be retained, other: {other_disk_list} will be ignored.")
-        else:
-            ten_disk_list = disk_list
-        set_ten_disk_list = set(ten_disk_list)
-        if len(ten_disk_list) > len(set_ten_disk_list):
-            tmp = ten_disk_list
-            ten_disk_list = list(set_ten_disk_list)
-            logging.warning(f"disk exist duplicate, it will be deduplicate, before: {tmp}, after: {ten_disk_list}")
-        self._conf["common"]["disk"] = ten_disk_list
+        if len(disk_list) > LIMIT_DISK_LIST_LEN:
+            logging.warning(f"disk only support maximum is {LIMIT_DISK_LIST_LEN}, disks: {disk_list[LIMIT_DISK_LIST_LEN:]} will be ignored.")
+            disk_list = disk_list[:LIMIT_DISK_LIST_LEN]
+        set_disk_list = set(disk_list)
+        if len(disk_list) > len(set_disk_list):
+            tmp = disk_list
+            disk_list = list(set_disk_list)
+            logging.warning(f"disk exist duplicate, it will be deduplicate, before: {tmp}, after: {disk_list}")
+        self._conf["common"]["disk"] = disk_list
 
     def _read_train_data_duration(self, items_algorithm: dict):
         self._conf["algorithm"]["train_data_duration"] = self._get_config_value(
@@ -17,8 +17,13 @@ from sentryCollector.collect_plugin import (
     get_io_data,
     get_iodump_data,
     get_disk_data,
+    get_period_bundle,
     is_iocollect_valid,
-    get_disk_type
+    get_disk_type,
+    DATASET_IO,
+    DATASET_IODUMP,
+    DATASET_DISK,
+    ENCODING_BINARY
 )
 
 
@@ -104,28 +109,31 @@ def _get_io_stage_data(data):
     return io_stage_data
 
 
+def _convert_io_data(data):
+    ret = {}
+    for disk in data:
+        disk_data = data[disk]
+        disk_ret = IOData()
+        for k, v in disk_data.items():
+            try:
+                getattr(disk_ret, k)
+                setattr(disk_ret, k, _get_io_stage_data(v))
+            except AttributeError:
+                logging.debug(f"no attr {k}")
+                continue
+        ret[disk] = disk_ret
+    return ret
+
+
 def get_io_data_from_collect_plug(period, disk_list):
     data_raw = _get_raw_data(period, disk_list)
     if data_raw["ret"] == 0:
-        ret = {}
         try:
             data = json.loads(data_raw["message"])
         except json.decoder.JSONDecodeError as e:
             logging.warning(f"get io data failed, {e}")
             return None
-
-        for disk in data:
-            disk_data = data[disk]
-            disk_ret = IOData()
-            for k, v in disk_data.items():
-                try:
-                    getattr(disk_ret, k)
-                    setattr(disk_ret, k, _get_io_stage_data(v))
-                except AttributeError:
-                    logging.debug(f"no attr {k}")
-                    continue
-            ret[disk] = disk_ret
-        return ret
+        return _convert_io_data(data)
     logging.warning(f'get io data failed with message: {data_raw["message"]}')
     return None
 
@@ -147,28 +155,31 @@ def _get_iodump_stage_data(data):
     return io_stage_data
 
 
+def _convert_iodump_data(data):
+    ret = {}
+    for disk in data:
+        disk_data = data[disk]
+        disk_ret = IODumpData()
+        for k, v in disk_data.items():
+            try:
+                getattr(disk_ret, k)
+                setattr(disk_ret, k, _get_iodump_stage_data(v))
+            except AttributeError:
+                logging.debug(f"no attr {k}")
+                continue
+        ret[disk] = disk_ret
+    return ret
+
+
 def get_iodump_data_from_collect_plug(period, disk_list):
     data_raw = _get_raw_iodump_data(period, disk_list)
     if data_raw["ret"] == 0:
-        ret = {}
         try:
             data = json.loads(data_raw["message"])
         except json.decoder.JSONDecodeError as e:
             logging.warning(f"get iodump data failed, {e}")
             return None
-
-        for disk in data:
-            disk_data = data[disk]
-            disk_ret = IODumpData()
-            for k, v in disk_data.items():
-                try:
-                    getattr(disk_ret, k)
-                    setattr(disk_ret, k, _get_iodump_stage_data(v))
-                except AttributeError:
-                    logging.debug(f"no attr {k}")
-                    continue
-            ret[disk] = disk_ret
-        return ret
+        return _convert_iodump_data(data)
     logging.warning(f'get iodump data failed with message: {data_raw["message"]}')
     return None
 
@@ -190,27 +201,81 @@ def _get_disk_stage_data(data):
     return io_stage_data
 
 
+def _convert_disk_data(data):
+    ret = {}
+    for disk in data:
+        disk_data = data[disk]
+        disk_ret = IODiskData()
+        for k, v in disk_data.items():
+            try:
+                getattr(disk_ret, k)
+                setattr(disk_ret, k, _get_disk_stage_data(v))
+            except AttributeError:
+                logging.debug(f"no attr {k}")
+                continue
+        ret[disk] = disk_ret
+    return ret
+
+
 def get_disk_data_from_collect_plug(period, disk_list):
     data_raw = _get_raw_disk_data(period, disk_list)
     if data_raw["ret"] == 0:
-        ret = {}
         try:
             data = json.loads(data_raw["message"])
         except json.decoder.JSONDecodeError as e:
             logging.warning(f"get disk data failed, {e}")
             return None
-
-        for disk in data:
-            disk_data = data[disk]
-            disk_ret = IODiskData()
-            for k, v in disk_data.items():
-                try:
-                    getattr(disk_ret, k)
-                    setattr(disk_ret, k, _get_disk_stage_data(v))
-                except AttributeError:
-                    logging.debug(f"no attr {k}")
-                    continue
-            ret[disk] = disk_ret
-        return ret
+        return _convert_disk_data(data)
     logging.warning(f'get disk data failed with message: {data_raw["message"]}')
-    return None
\ No newline at end of file
+    return None
+
+
+def _convert_io_table(table):
+    ret = {}
+    for disk, stage, data_type, values in table.records():
+        disk_ret = ret.get(disk)
+        if disk_ret is None:
+            disk_ret = ret[disk] = IOData()
+        io_stage_data = getattr(disk_ret, stage, None)
+        if not isinstance(io_stage_data, IOStageData):
+            logging.debug(f"no attr {stage}")
+            continue
+        base_data = getattr(io_stage_data, data_type)
+        # the table holds doubles, whole values are ints like in the json response
+        base_data.latency, base_data.io_dump, base_data.io_length, base_data.iops = \
+            (int(value) if value.is_integer() else value for value in values)
+    return ret
+
+
+def _convert_disk_table(table):
+    ret = {}
+    for disk, stage, data_type, values in table.records():
+        disk_ret = ret.get(disk)
+        if disk_ret is None:
+            disk_ret = ret[disk] = IODiskData()
+        io_stage_data = getattr(disk_ret, stage, None)
+        if not isinstance(io_stage_data, IOStageDiskData):
+            logging.debug(f"no attr {stage}")
+            continue
+        getattr(io_stage_data, data_type).disk_data = [int(value) for value in values]
+    return ret
+
+
+def get_period_bundle_from_collect_plug(period, disk_list):
+    """io, iodump and disk data of the same period in one request, None on failure"""
+    data_raw = get_period_bundle(
+        period,
+        disk_list,
+        COLLECT_STAGES,
+        ["read", "write", "flush", "discard"],
+        ENCODING_BINARY,
+    )
+    if data_raw["ret"] == 0:
+        data = data_raw["message"]
+        return (
+            _convert_io_table(data[DATASET_IO]),
+            _convert_iodump_data(data[DATASET_IODUMP]),
+            _convert_disk_table(data[DATASET_DISK]),
+        )
+    logging.warning(f'get period bundle failed with message: {data_raw["message"]}')
+    return None
@@ -15,7 +15,8 @@ import time
 
 from .config import read_config_log, read_config_common, read_config_algorithm, read_config_latency, read_config_iodump, read_config_stage
 from .stage_window import IoWindow, IoDumpWindow, IopsWindow, IoArrayDataWindow
-from .module_conn import avg_is_iocollect_valid, avg_get_io_data, avg_get_iodump_data, avg_get_disk_data, \
+from sentryCollector.collect_plugin import DATASET_IO, DATASET_IODUMP, DATASET_DISK, LIMIT_DISK_LIST_LEN
+from .module_conn import avg_is_iocollect_valid, avg_get_period_bundle, \
     report_alarm_fail, process_report_data, sig_handler, get_disk_type_by_name, check_disk_list_validation
 from .utils import update_avg_and_check_abnormal, update_avg_array_data
 from .extra_logger import init_extra_logger
@@ -98,7 +99,7 @@ def get_valid_disk_stage_list(io_dic, config_disk, config_stage):
 
     disk_list = check_disk_list_validation(disk_list)
 
-    disk_list = disk_list[:10] if len(disk_list) > 10 else disk_list
+    disk_list = disk_list[:LIMIT_DISK_LIST_LEN]
 
     if not config_disk:
         logging.info(f"Default common.disk using disk={disk_list}")
@@ -135,17 +136,14 @@ def main_loop(io_dic, io_data, io_avg_value):
         # 等待x秒
         time.sleep(period_time)
 
-        # 采集模块对接，获取周期数据
-        is_success, curr_period_data = avg_get_io_data(io_dic)
+        # 采集模块对接，一次获取同一周期的io、iodump和磁盘时延数据
+        is_success, bundle = avg_get_period_bundle(io_dic)
         if not is_success:
-            logging.error(f"{curr_period_data['msg']}")
+            logging.error(f"{bundle['msg']}")
             continue
-
-        # 获取iodump的详细信息
-        is_success_iodump, iodump_data = avg_get_iodump_data(io_dic)
-
-        # 获取磁盘的时延数据
-        is_success_disk, disk_data = avg_get_disk_data(io_dic)
+        curr_period_data = bundle.get(DATASET_IO, {})
+        is_success_iodump, iodump_data = True, bundle.get(DATASET_IODUMP, {})
+        is_success_disk, disk_data = True, bundle.get(DATASET_DISK, {})
 
         # 处理周期数据
         reach_size = False
@@ -165,7 +163,7 @@ def main_loop(io_dic, io_data, io_avg_value):
         # 判断异常窗口、异常场景
         for disk_name in disk_list:
             for rw in iotype_list:
-                process_report_data(disk_name, rw, io_data)
+                process_report_data(disk_name, rw, io_data, period_time)
 
 
 def main():
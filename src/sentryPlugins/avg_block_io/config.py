@@ -3,7 +3,7 @@ import logging
 import os
 
 from .module_conn import report_alarm_fail
-from sentryCollector.collect_plugin import Disk_Type
+from sentryCollector.collect_plugin import Disk_Type, LIMIT_DISK_LIST_LEN
 
 
 CONF_LOG = 'log'
@@ -119,9 +119,9 @@ def read_config_common(config):
         stage = []
         logging.warning(f"Unset {CONF_COMMON}.{CONF_COMMON_STAGE}, set to default")
 
-    if len(disk) > 10:
-        logging.warning(f"Too many {CONF_COMMON}.disks, record only max 10 disks")
-        disk = disk[:10]
+    if len(disk) > LIMIT_DISK_LIST_LEN:
+        logging.warning(f"Too many {CONF_COMMON}.disks, record only max {LIMIT_DISK_LIST_LEN} disks")
+        disk = disk[:LIMIT_DISK_LIST_LEN]
 
     try:
         iotype_name = config.get(CONF_COMMON, CONF_COMMON_IOTYPE).lower().split(",")
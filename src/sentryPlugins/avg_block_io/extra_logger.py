@@ -13,6 +13,8 @@ import os
 import re
 import ast
 
+from sentryCollector.collect_plugin import get_stage_group_stats, STAGE_GROUP_LIST
+
 extra_logger = None
 
 
@@ -52,14 +54,14 @@ def init_extra_logger(log_path, log_level, log_format):
         extra_logger = logging.getLogger()  # Fallback to default logger
 
 
-def extra_slow_log(msg):
+def extra_slow_log(msg, period_time):
     if "latency" in str(msg.get('alarm_type', '')):
-        extra_latency_log(msg)
+        extra_latency_log(msg, period_time)
     if "iodump" in str(msg.get('alarm_type', '')):
         extra_iodump_log(msg)
 
 
-def extra_latency_log(msg):
+def extra_latency_log(msg, period_time):
     # Parse the iops string from msg
     iops_avg = 0
     iops_str = msg['details']['iops']
@@ -75,65 +77,13 @@ def extra_latency_log(msg):
     extra_logger.warning(f"[SLOW IO] alarm_type: latency, disk: {msg['driver_name']}, "
                          f"iotype: {msg['io_type']}, iops: {int(iops_avg)}")
 
-    # Parse the latency string from msg
-    latency_str = msg['details']['latency']
-    latency_matches = re.findall(PATTERN, latency_str)
-    latency_data = {}
-    for match in latency_matches:
-        key = match[0]
-        values = list(map(float, match[1].split(',')))
-        latency_data[key] = values
-
-    # Calculate statistics for each group
-    group_stats = {}
-    for group_name, stages in STAGE_GROUPS.items():
-        all_values = []
-        for stage in stages:
-            if stage in latency_data:
-                all_values.extend(latency_data[stage])
-        if all_values:
-            min_val = min(all_values)
-            max_val = max(all_values)
-            avg_val = sum(all_values) / len(all_values)
-        else:
-            min_val = 0
-            max_val = 0
-            avg_val = 0
-        # Convert to ms
-        min_val_ms = min_val / 1000.0
-        max_val_ms = max_val / 1000.0
-        avg_val_ms = avg_val / 1000.0
-        group_stats[group_name] = {
-            'min': min_val_ms,
-            'max': max_val_ms,
-            'avg': avg_val_ms
-        }
-
-    # Calculate total latency (B->C)
-    total_avg = 0
-    total_min = 0
-    total_max = 0
-    for group_name in STAGE_GROUPS:
-        total_avg += group_stats[group_name]['avg']
-        total_min += group_stats[group_name]['min']
-        total_max += group_stats[group_name]['max']
-    group_stats['B->C'] = {
-        'min': total_min,
-        'max': total_max,
-        'avg': total_avg
-    }
-
-    # Calculate PCT for each group (except B->C)
-    for group_name in STAGE_GROUPS:
-        if total_avg > 0:
-            pct = (group_stats[group_name]['avg'] / total_avg) * 100
-        else:
-            pct = 0
-        group_stats[group_name]['pct'] = pct
-    group_stats['B->C']['pct'] = 100.0
+    # the stage groups over as many periods as the alarm window, one more collector request
+    latency_matches = re.findall(PATTERN, msg['details']['latency'])
+    window = max((len(match[1].split(',')) for match in latency_matches), default=1)
+
+    group_stats = get_stage_group_stats(period_time, window, msg['driver_name'], msg['io_type'])
 
     # Output table
-    stage_order = ['B->Q', 'Q->G', 'G->I', 'I->D', 'D->C', 'B->C']
     stage_width = 7
     num_width = 12
     pct_width = 8
@@ -146,12 +96,14 @@ def extra_latency_log(msg):
         f"{'PCT':>{pct_width}}"
     )
 
-    for stage in stage_order:
+    for group in STAGE_GROUP_LIST:
         try:
-            s = group_stats[stage]
-            min_str = f"{s['min']:>.3f}"
-            max_str = f"{s['max']:>.3f}"
-            avg_str = f"{s['avg']:>.3f}"
+            # virtual stage B-Q is logged as B->Q, latency in ms
+            stage = group.replace('-', '->')
+            s = group_stats[group]
+            min_str = f"{s['min'] / 1000.0:>.3f}"
+            max_str = f"{s['max'] / 1000.0:>.3f}"
+            avg_str = f"{s['avg'] / 1000.0:>.3f}"
             pct_str = f"{s['pct']:.2f}%"
 
             extra_logger.warning(
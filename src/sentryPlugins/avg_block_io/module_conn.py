@@ -13,7 +13,7 @@ import logging
 import sys
 
 from sentryCollector.collect_plugin import is_iocollect_valid, get_io_data, get_iodump_data, get_disk_data, \
-    Result_Messages, get_disk_type, Disk_Type
+    get_period_bundle, Result_Messages, get_disk_type, Disk_Type
 from syssentry.result import ResultLevel, report_result
 from xalarm.sentry_notify import xalarm_report, MINOR_ALM, ALARM_TYPE_OCCUR
 from .utils import is_abnormal, get_win_data, log_slow_win
@@ -51,6 +51,14 @@ def avg_get_disk_data(io_dic):
     return check_result_validation(res, 'get disk data')
 
 
+def avg_get_period_bundle(io_dic):
+    """get io, iodump and disk data of the same period from sentryCollector"""
+    logging.debug(f"send to sentryCollector get_period_bundle: period={io_dic['period_time']}, "
+                f"disk={io_dic['disk_list']}, stage={io_dic['stage_list']}, iotype={io_dic['iotype_list']}")
+    res = get_period_bundle(io_dic["period_time"], io_dic["disk_list"], io_dic["stage_list"], io_dic["iotype_list"])
+    return check_result_validation(res, 'get period bundle')
+
+
 def avg_is_iocollect_valid(io_dic, config_disk, config_stage):
     """is_iocollect_valid from sentryCollector"""
     logging.debug(f"send to sentryCollector is_iocollect_valid: period={io_dic['period_time']}, "
@@ -84,7 +92,7 @@ def report_alarm_fail(alarm_info):
     sys.exit(1)
 
 
-def process_report_data(disk_name, rw, io_data):
+def process_report_data(disk_name, rw, io_data, period_time):
     """check abnormal window and report to xalarm"""
     abnormal, abnormal_list = is_abnormal((disk_name, 'bio', rw), io_data)
     if not abnormal:
@@ -105,7 +113,7 @@ def process_report_data(disk_name, rw, io_data):
         msg["reason"] = "IO press"
         msg["block_stack"] = f"bio,{stage_name}"
         msg["alarm_type"] = abnormal_list
-        log_slow_win(msg, "IO press")
+        log_slow_win(msg, "IO press", period_time)
         del msg["details"]["iodump_data"] # ˳iodump_dataܹ,·ʧ,ֻ־дӡ,͵澯ģ
         del msg["details"]["disk_data"]
         xalarm_report(1002, MINOR_ALM, ALARM_TYPE_OCCUR, json.dumps(msg))
@@ -117,7 +125,7 @@ def process_report_data(disk_name, rw, io_data):
         msg["reason"] = "driver slow"
         msg["block_stack"] = "bio,rq_driver"
         msg["alarm_type"] = abnormal_list
-        log_slow_win(msg, "driver slow")
+        log_slow_win(msg, "driver slow", period_time)
         del msg["details"]["iodump_data"] # ˳iodump_dataܹ,·ʧ,ֻ־дӡ,͵澯ģ
         del msg["details"]["disk_data"]
         xalarm_report(1002, MINOR_ALM, ALARM_TYPE_OCCUR, json.dumps(msg))
@@ -132,13 +140,13 @@ def process_report_data(disk_name, rw, io_data):
         msg["reason"] = "kernel slow"
         msg["block_stack"] = f"bio,{stage_name}"
         msg["alarm_type"] = abnormal_list
-        log_slow_win(msg, "kernel slow")
+        log_slow_win(msg, "kernel slow", period_time)
         del msg["details"]["iodump_data"] # ˳iodump_dataܹ,·ʧ,ֻ־дӡ,͵澯ģ
         del msg["details"]["disk_data"]
         xalarm_report(1002, MINOR_ALM, ALARM_TYPE_OCCUR, json.dumps(msg))
         return
 
-    log_slow_win(msg, "unknown")
+    log_slow_win(msg, "unknown", period_time)
     del msg["details"]["iodump_data"] # ˳iodump_dataܹ,·ʧ,ֻ־дӡ,͵澯ģ
     del msg["details"]["disk_data"]
     xalarm_report(1002, MINOR_ALM, ALARM_TYPE_OCCUR, json.dumps(msg))
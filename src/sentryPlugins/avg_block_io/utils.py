@@ -125,14 +125,14 @@ def log_abnormal_period(old_avg, period_value, io_data, io_key):
                             f"type: iodump, curr_val: {period_value[1]}")
 
 
-def log_slow_win(msg, reason):
+def log_slow_win(msg, reason, period_time):
     """record log of slow win"""
     logging.warning(f"[SLOW IO] disk: {msg['driver_name']}, stage: {msg['block_stack']}, "
                     f"iotype: {msg['io_type']}, type: {msg['alarm_type']}, reason: {reason}")
     logging.info(f"latency: {msg['details']['latency']}")
     logging.info(f"iodump: {msg['details']['iodump']}")
     logging.info(f"iops: {msg['details']['iops']}")
-    extra_slow_log(msg)
+    extra_slow_log(msg, period_time)
 
 
 def update_avg_and_check_abnormal(data, io_key, win_size, io_avg_value, io_data):
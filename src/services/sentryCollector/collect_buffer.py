@@ -0,0 +1,122 @@
+# coding: utf-8
+# Copyright (c) 2025 Huawei Technologies Co., Ltd.
+# sysSentry is licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+
+"""
+fixed capacity ring buffer for collect history.
+"""
+from array import array
+
+
+class RingBuffer():
+    """
+    fixed capacity ring buffer, items are read by age: index 0 is the newest
+    item, index len - 1 is the oldest one. append is O(1), when the buffer is
+    full the oldest item is overwritten.
+    """
+
+    def __init__(self, capacity):
+        if capacity <= 0:
+            raise ValueError("ring buffer capacity must be greater than 0")
+        self.capacity = capacity
+        # slot which the next item is written to
+        self.head = 0
+        self.count = 0
+        self.slots = [None] * capacity
+
+    def append(self, value):
+        self._store(self.head, value)
+        self.head = (self.head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+        # drop the references to the old items, the numeric records hold no objects
+        if self.slots is not None:
+            self.slots = [None] * self.capacity
+
+    def get(self, age, default=None):
+        if age < 0 or age >= self.count:
+            return default
+        return self._load(self._slot(age))
+
+    def window(self, age, num):
+        """up to num items from age on, the oldest first"""
+        if age < 0:
+            return []
+        end = min(age + num, self.count)
+        return [self._load(self._slot(index)) for index in range(end - 1, age - 1, -1)]
+
+    def _slot(self, age):
+        return (self.head - 1 - age) % self.capacity
+
+    def _store(self, slot, value):
+        self.slots[slot] = value
+
+    def _load(self, slot):
+        return self.slots[slot]
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, age):
+        if age < 0:
+            age += self.count
+        if age < 0 or age >= self.count:
+            raise IndexError("ring buffer index out of range")
+        return self._load(self._slot(age))
+
+    def __iter__(self):
+        for age in range(self.count):
+            yield self._load(self._slot(age))
+
+
+class NumericRingBuffer(RingBuffer):
+    """
+    ring buffer of fixed width numeric records, all records share one
+    preallocated array instead of one list object per record.
+    """
+
+    def __init__(self, capacity, width, typecode='d'):
+        super().__init__(capacity)
+        self.width = width
+        self.typecode = typecode
+        self.slots = None
+        self.data = array(typecode, [0]) * (capacity * width)
+
+    def _store(self, slot, value):
+        base = slot * self.width
+        data = self.data
+        for index in range(self.width):
+            data[base + index] = value[index]
+
+    def _load(self, slot):
+        base = slot * self.width
+        if self.typecode != 'd':
+            return self.data[base:base + self.width].tolist()
+        return [int(value) if value.is_integer() else value
+                for value in self.data[base:base + self.width]]
+
+    def extend_into(self, age, out, width=None):
+        """
+        append the first width fields of the record at age, all of them if width is None,
+        to the array out without building a list, False if there is none
+        """
+        if age < 0 or age >= self.count:
+            return False
+        base = self._slot(age) * self.width
+        record = self.data[base:base + (width or self.width)]
+        if out.typecode == self.typecode:
+            out.extend(record)
+        else:
+            out.extend(record.tolist())
+        return True
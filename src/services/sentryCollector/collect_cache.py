@@ -0,0 +1,76 @@
+# coding: utf-8
+# Copyright (c) 2025 Huawei Technologies Co., Ltd.
+# sysSentry is licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+
+"""
+response cache of the collector server.
+"""
+import json
+
+from .collect_config import period_to_ms
+
+RESPONSE_CACHE_MAX_ENTRIES = 256
+# request fields normalized in the key
+CACHE_KEY_FIELDS = ('period', 'disk_list', 'stage', 'iotype')
+
+
+class ResponseCache():
+    """
+    responses of the latest published period. an entry is only valid for
+    the period sequence it was built at, the whole cache is dropped once a
+    new period is published.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.seq = None
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(protocol_id, data_struct):
+        """
+        key of a disk/stage/iotype query, the lists are sorted since the
+        response order follows the collected data, not the request. the
+        other fields of the request are part of the key as they are.
+        None if the request can not be cached.
+        """
+        try:
+            period = period_to_ms(data_struct['period'])
+            if period is None:
+                return None
+            key = (protocol_id, period,
+                   tuple(sorted(json.loads(data_struct['disk_list']))),
+                   tuple(sorted(json.loads(data_struct['stage']))),
+                   tuple(sorted(json.loads(data_struct['iotype']))),
+                   tuple(sorted((name, str(value)) for name, value in data_struct.items()
+                                if name not in CACHE_KEY_FIELDS)))
+            hash(key)
+        except (KeyError, TypeError, ValueError):
+            return None
+        return key
+
+    def get(self, key, seq):
+        if seq != self.seq:
+            self.entries.clear()
+            self.seq = seq
+        res_data = self.entries.get(key)
+        if res_data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return res_data
+
+    def put(self, key, seq, res_data):
+        """seq is the period sequence read before res_data was built"""
+        if seq != self.seq or len(self.entries) >= self.max_entries:
+            return
+        self.entries[key] = res_data
@@ -14,6 +14,7 @@ Read and save collector.conf value.
 """
 import configparser
 import logging
+import math
 import os
 import re
 
@@ -29,12 +30,34 @@ CONF_IO_PERIOD_TIME = 'period_time'
 CONF_IO_MAX_SAVE = 'max_save'
 CONF_IO_DISK = 'disk'
 CONF_IO_PERIOD_TIME_DEFAULT = 1
+# period_time is in seconds with a millisecond resolution, down to 100ms
+CONF_IO_PERIOD_TIME_MIN_MS = 100
+CONF_IO_PERIOD_TIME_MAX_MS = 300 * 1000
 CONF_IO_MAX_SAVE_DEFAULT = 10
 CONF_IO_DISK_DEFAULT = "default"
 CONF_IO_NVME_SSD = "nvme_ssd_threshold"
 CONF_IO_SATA_SSD = "sata_ssd_threshold"
 CONF_IO_SATA_HDD = "sata_hdd_threshold"
 CONF_IO_THRESHOLD_DEFAULT = 1000
+CONF_IO_EBPF_FORMAT = 'ebpf_format'
+CONF_IO_EBPF_FORMAT_TEXT = 'text'
+CONF_IO_EBPF_FORMAT_BINARY = 'binary'
+CONF_IO_EBPF_FORMAT_DEFAULT = CONF_IO_EBPF_FORMAT_TEXT
+CONF_IO_COLLECT_WORKERS = 'collect_workers'
+CONF_IO_COLLECT_WORKERS_DEFAULT = 0
+CONF_IO_COLLECT_WORKERS_MAX = 64
+CONF_IO_SHM_EXPORT = 'shm_export'
+CONF_IO_SHM_EXPORT_DEFAULT = False
+CONF_IO_ROLLUP = 'rollup'
+CONF_IO_ROLLUP_DEFAULT = "10,60"
+CONF_IO_ROLLUP_MAX = 3600
+CONF_IO_ROLLUP_SAVE = 'rollup_save'
+CONF_IO_ROLLUP_SAVE_DEFAULT = 60
+CONF_IO_ROLLUP_SAVE_MAX = 1440
+
+# periods are compared and divided in whole milliseconds
+PERIOD_MS_PER_SECOND = 1000
+PERIOD_MS_TOLERANCE = 1e-6
 
 # log
 CONF_LOG = 'log'
@@ -65,6 +88,24 @@ def get_log_level(filename=COLLECT_CONF_PATH):
         return logging.INFO
 
 
+def period_to_ms(period):
+    """seconds in an int, float or str to whole milliseconds, None if it is not a number of whole milliseconds"""
+    try:
+        period_ms = float(period) * PERIOD_MS_PER_SECOND
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(period_ms) or abs(period_ms - round(period_ms)) > PERIOD_MS_TOLERANCE:
+        return None
+    return round(period_ms)
+
+
+def ms_to_period(period_ms):
+    """whole milliseconds to seconds, an int for whole seconds"""
+    if period_ms % PERIOD_MS_PER_SECOND == 0:
+        return period_ms // PERIOD_MS_PER_SECOND
+    return period_ms / PERIOD_MS_PER_SECOND
+
+
 class CollectConfig:
     def __init__(self, filename=COLLECT_CONF_PATH):
         
@@ -115,9 +156,9 @@ class CollectConfig:
         result_io_config = {}
         io_map_value = self.load_module_config(CONF_IO)
         # period_time
-        period_time = io_map_value.get(CONF_IO_PERIOD_TIME)
-        if period_time and period_time.isdigit() and int(period_time) >= 1 and int(period_time) <= 300:
-            result_io_config[CONF_IO_PERIOD_TIME] = int(period_time)
+        period_time_ms = period_to_ms(io_map_value.get(CONF_IO_PERIOD_TIME))
+        if period_time_ms and CONF_IO_PERIOD_TIME_MIN_MS <= period_time_ms <= CONF_IO_PERIOD_TIME_MAX_MS:
+            result_io_config[CONF_IO_PERIOD_TIME] = ms_to_period(period_time_ms)
         else:
             logging.warning("module_name = %s section, field = %s is incorrect, use default %d", 
                 CONF_IO, CONF_IO_PERIOD_TIME, CONF_IO_PERIOD_TIME_DEFAULT)
@@ -145,6 +186,57 @@ class CollectConfig:
             logging.warning("module_name = %s section, field = %s is incorrect, use default %s", 
                 CONF_IO, CONF_IO_DISK, CONF_IO_DISK_DEFAULT)
             result_io_config[CONF_IO_DISK] = CONF_IO_DISK_DEFAULT
+        # ebpf_format
+        ebpf_format = io_map_value.get(CONF_IO_EBPF_FORMAT, CONF_IO_EBPF_FORMAT_DEFAULT).strip().lower()
+        if ebpf_format in (CONF_IO_EBPF_FORMAT_TEXT, CONF_IO_EBPF_FORMAT_BINARY):
+            result_io_config[CONF_IO_EBPF_FORMAT] = ebpf_format
+        else:
+            logging.warning("module_name = %s section, field = %s is incorrect, use default %s",
+                CONF_IO, CONF_IO_EBPF_FORMAT, CONF_IO_EBPF_FORMAT_DEFAULT)
+            result_io_config[CONF_IO_EBPF_FORMAT] = CONF_IO_EBPF_FORMAT_DEFAULT
+        # collect_workers, 0 or 1 means collect disks one by one
+        collect_workers = io_map_value.get(CONF_IO_COLLECT_WORKERS)
+        if collect_workers is None:
+            result_io_config[CONF_IO_COLLECT_WORKERS] = CONF_IO_COLLECT_WORKERS_DEFAULT
+        elif collect_workers.isdigit() and int(collect_workers) <= CONF_IO_COLLECT_WORKERS_MAX:
+            result_io_config[CONF_IO_COLLECT_WORKERS] = int(collect_workers)
+        else:
+            logging.warning("module_name = %s section, field = %s is incorrect, use default %d",
+                CONF_IO, CONF_IO_COLLECT_WORKERS, CONF_IO_COLLECT_WORKERS_DEFAULT)
+            result_io_config[CONF_IO_COLLECT_WORKERS] = CONF_IO_COLLECT_WORKERS_DEFAULT
+        # shm_export, export the io data to a mmap file for local readers
+        shm_export = io_map_value.get(CONF_IO_SHM_EXPORT)
+        if shm_export is None:
+            result_io_config[CONF_IO_SHM_EXPORT] = CONF_IO_SHM_EXPORT_DEFAULT
+        elif shm_export.strip().lower() in ('true', 'false'):
+            result_io_config[CONF_IO_SHM_EXPORT] = shm_export.strip().lower() == 'true'
+        else:
+            logging.warning("module_name = %s section, field = %s is incorrect, use default %s",
+                CONF_IO, CONF_IO_SHM_EXPORT, CONF_IO_SHM_EXPORT_DEFAULT)
+            result_io_config[CONF_IO_SHM_EXPORT] = CONF_IO_SHM_EXPORT_DEFAULT
+        # rollup, resolutions in seconds of the coarser history, multiples of period_time
+        rollup = io_map_value.get(CONF_IO_ROLLUP, CONF_IO_ROLLUP_DEFAULT).replace(" ", "")
+        result_io_config[CONF_IO_ROLLUP] = []
+        period_time_ms = period_to_ms(result_io_config[CONF_IO_PERIOD_TIME])
+        for resolution in filter(None, rollup.split(',')):
+            if not resolution.isdigit() or int(resolution) * PERIOD_MS_PER_SECOND <= period_time_ms or \
+                    int(resolution) > CONF_IO_ROLLUP_MAX or int(resolution) * PERIOD_MS_PER_SECOND % period_time_ms:
+                logging.warning("module_name = %s section, field = %s, resolution %s is incorrect, ignore it",
+                    CONF_IO, CONF_IO_ROLLUP, resolution)
+                continue
+            if int(resolution) not in result_io_config[CONF_IO_ROLLUP]:
+                result_io_config[CONF_IO_ROLLUP].append(int(resolution))
+        result_io_config[CONF_IO_ROLLUP].sort()
+        # rollup_save, windows kept of each resolution
+        rollup_save = io_map_value.get(CONF_IO_ROLLUP_SAVE)
+        if rollup_save is None:
+            result_io_config[CONF_IO_ROLLUP_SAVE] = CONF_IO_ROLLUP_SAVE_DEFAULT
+        elif rollup_save.isdigit() and 1 <= int(rollup_save) <= CONF_IO_ROLLUP_SAVE_MAX:
+            result_io_config[CONF_IO_ROLLUP_SAVE] = int(rollup_save)
+        else:
+            logging.warning("module_name = %s section, field = %s is incorrect, use default %d",
+                CONF_IO, CONF_IO_ROLLUP_SAVE, CONF_IO_ROLLUP_SAVE_DEFAULT)
+            result_io_config[CONF_IO_ROLLUP_SAVE] = CONF_IO_ROLLUP_SAVE_DEFAULT
         logging.debug("config get_io_config: %s", result_io_config)
         return result_io_config
 
@@ -12,12 +12,46 @@
 """
 Get disk latency distribution data.
 """
+import os
+import sys
 import struct
+import fcntl
+import ctypes
 import logging
+from array import array
 from typing import List, Optional, Dict, Any
 from .collect_plugin import get_disk_type
 from syssentry.utils import execute_command
 
+# latency distribution log page
+NVME_LOG_ID = 0xC2
+NVME_LOG_LEN = 784
+NVME_LOG_HEAD_LEN = 8
+# read buckets: 32 * 32us, 31 * 1ms, 30 * 32ms, 1-2s, 2-3s, 3-4s, >4s, write buckets are the same
+NVME_HIST_BUCKETS = 97
+# upper bound in us of each bucket, same as DISK_HIST_BUCKET_UPPER_US in collect_plugin
+NVME_HIST_UPPER_US = ([32 * (i + 1) for i in range(32)] +
+                      [1000 * (i + 2) for i in range(31)] +
+                      [32000 * (i + 2) for i in range(29)] + [1000000] +
+                      [2000000, 3000000, 4000000, float('inf')])
+# [start, end) of the merged 0-1ms, 1-10ms, 10-100ms, 100ms-1s, 1-3s, >3s ranges,
+# read ranges first, then write ranges
+_READ_BIN_SLICES = ((0, 32), (32, 41), (41, 66), (66, 93), (93, 95), (95, 97))
+NVME_BIN_SLICES = _READ_BIN_SLICES + tuple(
+    (start + NVME_HIST_BUCKETS, end + NVME_HIST_BUCKETS) for start, end in _READ_BIN_SLICES)
+# the log page is little-endian, array('I') is in host byte order
+NVME_NEED_BYTESWAP = sys.byteorder != 'little'
+
+# Get Log Page admin command through NVME_IOCTL_ADMIN_CMD, see linux/nvme_ioctl.h
+NVME_ADMIN_GET_LOG_PAGE = 0x02
+NVME_NSID_ALL = 0xFFFFFFFF
+NVME_ADMIN_TIMEOUT_MS = 1000
+# struct nvme_passthru_cmd: opcode, flags, rsvd1, nsid, cdw2, cdw3, metadata, addr,
+# metadata_len, data_len, cdw10 ~ cdw15, timeout_ms, result, in host byte order like the ioctl
+NVME_PASSTHRU_CMD = struct.Struct('=BBHIIIQQII6III')
+# _IOWR('N', 0x41, struct nvme_passthru_cmd)
+NVME_IOCTL_ADMIN_CMD = (3 << 30) | (NVME_PASSTHRU_CMD.size << 16) | (ord('N') << 8) | 0x41
+
 
 class CollectDisk:
     """
@@ -55,28 +89,82 @@ class CollectDisk:
     def __init__(self, disk_name: str):
         self.disk_name = disk_name
         self.is_support = False
+        self.use_ioctl = True
+        self.dev_fd = None
+        self.log_buffer = ctypes.create_string_buffer(NVME_LOG_LEN)
+        self.admin_cmd = bytearray(NVME_PASSTHRU_CMD.size)
         self._check_support()
 
     def get_support_flag(self) -> bool:
         return self.is_support
 
     def collect_data(self) -> List[int]:
+        histogram = self.collect_histogram()
+        if histogram is None:
+            return []
+        return self._merge_histogram(histogram)
+
+    def collect_histogram(self) -> Optional[array]:
+        """
+        return the raw read buckets followed by the write buckets,
+        NVME_HIST_BUCKETS each, None on failure.
+        """
         if not self.is_support:
             logging.error(f"Disk {self.disk_name} is not supported for latency collection.")
-            return []
+            return None
 
         try:
-            cmd = ["nvme", "get-log", "-i", "0xC2", "-l", "784", f"/dev/{self.disk_name}"]
-            output = execute_command(cmd)
-            if not output:
+            data = self._get_log_data()
+            if data is None:
                 logging.error(f"Failed to get NVMe log for disk {self.disk_name}.")
-                return []
+                return None
 
-            result = self._parse_nvme_output(output)
-            return result
+            return self._decode_histogram(data)
         except Exception as e:
             logging.error(f"Error collecting latency data for disk {self.disk_name}: {e}")
-        return []
+        return None
+
+    def close(self):
+        if self.dev_fd is not None:
+            os.close(self.dev_fd)
+            self.dev_fd = None
+
+    def _get_log_data(self) -> Optional[memoryview]:
+        """get the latency log page, by ioctl first and nvme-cli as fallback"""
+        if self.use_ioctl:
+            data = self._get_log_by_ioctl()
+            if data is not None:
+                return data
+            logging.warning(f"Disk {self.disk_name} get log page by ioctl failed, use nvme-cli instead.")
+            self.use_ioctl = False
+            self.close()
+
+        cmd = ["nvme", "get-log", "-i", "0xC2", "-l", "784", f"/dev/{self.disk_name}"]
+        output = execute_command(cmd)
+        if not output:
+            return None
+        return memoryview(self._hex_output_to_bytes(output))
+
+    def _get_log_by_ioctl(self) -> Optional[memoryview]:
+        # number of dwords to read, 0's based
+        numd = NVME_LOG_LEN // 4 - 1
+        NVME_PASSTHRU_CMD.pack_into(
+            self.admin_cmd, 0,
+            NVME_ADMIN_GET_LOG_PAGE, 0, 0, NVME_NSID_ALL, 0, 0, 0,
+            ctypes.addressof(self.log_buffer), 0, NVME_LOG_LEN,
+            NVME_LOG_ID | ((numd & 0xFFFF) << 16), numd >> 16, 0, 0, 0, 0,
+            NVME_ADMIN_TIMEOUT_MS, 0)
+        try:
+            if self.dev_fd is None:
+                self.dev_fd = os.open(f"/dev/{self.disk_name}", os.O_RDONLY | os.O_CLOEXEC)
+            status = fcntl.ioctl(self.dev_fd, NVME_IOCTL_ADMIN_CMD, self.admin_cmd, True)
+        except OSError as e:
+            logging.error(f"Disk {self.disk_name} NVMe admin ioctl failed: {e}")
+            return None
+        if status != 0:
+            logging.error(f"Disk {self.disk_name} NVMe get log page status: {status:#x}")
+            return None
+        return memoryview(self.log_buffer).cast('B')[:NVME_LOG_LEN]
 
     def _check_support(self):
         try:
@@ -119,27 +207,15 @@ class CollectDisk:
 
     def _check_nvme_version(self) -> bool:
         try:
-            cmd = ["nvme", "get-log", "-i", "0xC2", "-l", "784", f"/dev/{self.disk_name}"]
-            output = execute_command(cmd)
-            if not output:
+            data = self._get_log_data()
+            if data is None:
                 logging.error(f"Failed to get NVMe log for disk {self.disk_name}.")
                 return False
 
-            lines = output.splitlines()
-            line = lines[2]
-            parts = line.split()
-            hex_data = []
-            if len(parts) < 17:
-                return False
-            for hex_byte in parts[1:9]:
-                hex_data.append(hex_byte)
-
-            data = bytes.fromhex(''.join(hex_data))
             if len(data) < 8:
                 return False
 
-            major_version = struct.unpack('<I', data[0:4])[0]
-            minor_version = struct.unpack('<I', data[4:8])[0]
+            major_version, minor_version = struct.unpack_from('<II', data, 0)
             if major_version != 1 or minor_version != 0:
                 logging.warning(f"Disk {self.disk_name} NVMe log version is {major_version}.{minor_version}, expected 1.0.")
                 return False
@@ -149,6 +225,10 @@ class CollectDisk:
         return False
 
     def _parse_nvme_output(self, output: str) -> List[int]:
+        return self._parse_log_data(self._hex_output_to_bytes(output))
+
+    @staticmethod
+    def _hex_output_to_bytes(output: str) -> bytes:
         lines = output.splitlines()
         hex_data = []
 
@@ -157,59 +237,27 @@ class CollectDisk:
             for hex_byte in parts[1:17]:
                 hex_data.append(hex_byte)
 
-        data = bytes.fromhex(''.join(hex_data))
-        if len(data) < 784:
-            logging.error(f"NVMe log data for disk {self.disk_name} is incomplete.")
+        return bytes.fromhex(''.join(hex_data))
+
+    def _parse_log_data(self, data) -> List[int]:
+        histogram = self._decode_histogram(data)
+        if histogram is None:
             return []
+        return self._merge_histogram(histogram)
+
+    def _decode_histogram(self, data) -> Optional[array]:
+        """view the read and write buckets as one little-endian uint32 array"""
+        if len(data) < NVME_LOG_LEN:
+            logging.error(f"NVMe log data for disk {self.disk_name} is incomplete.")
+            return None
+
+        histogram = array('I')
+        histogram.frombytes(memoryview(data)[NVME_LOG_HEAD_LEN:NVME_LOG_LEN])
+        if NVME_NEED_BYTESWAP:
+            histogram.byteswap()
+        return histogram
 
-        result = [0] * 12  # 6 read + 6 write latency buckets
-        for i in range(32):
-            offset = 8 + i * 4
-            count = struct.unpack('<I', data[offset:offset+4])[0]
-            result[0] += count
-        for i in range(9):
-            offset = 136 + i * 4
-            count = struct.unpack('<I', data[offset:offset+4])[0]
-            result[1] += count
-        for i in range(9, 31):
-            offset = 136 + i * 4
-            count = struct.unpack('<I', data[offset:offset+4])[0]
-            result[2] += count
-        for i in range(3):
-            offset = 260 + i * 4
-            count = struct.unpack('<I', data[offset:offset+4])[0]
-            result[2] += count
-        for i in range(3, 30):
-            offset = 260 + i * 4
-            count = struct.unpack('<I', data[offset:offset+4])[0]
-            result[3] += count
-        result[4] += struct.unpack('<I', data[380:384])[0]
-        result[4] += struct.unpack('<I', data[384:388])[0]
-        result[5] += struct.unpack('<I', data[388:392])[0]
-        result[5] += struct.unpack('<I', data[392:396])[0]
-
-        for i in range(32):
-            offset = 396 + i * 4
-            count = struct.unpack('<I', data[offset:offset+4])[0]
-            result[6] += count
-        for i in range(9):
-            offset = 524 + i * 4
-            count = struct.unpack('<I', data[offset:offset+4])[0]
-            result[7] += count
-        for i in range(9, 31):
-            offset = 524 + i * 4
-            count = struct.unpack('<I', data[offset:offset+4])[0]
-            result[8] += count
-        for i in range(3):
-            offset = 648 + i * 4
-            count = struct.unpack('<I', data[offset:offset+4])[0]
-            result[8] += count
-        for i in range(3, 30):
-            offset = 648 + i * 4
-            count = struct.unpack('<I', data[offset:offset+4])[0]
-            result[9] += count
-        result[10] += struct.unpack('<I', data[768:772])[0]
-        result[10] += struct.unpack('<I', data[772:776])[0]
-        result[11] += struct.unpack('<I', data[776:780])[0]
-        result[11] += struct.unpack('<I', data[780:784])[0]
-        return result
\ No newline at end of file
+    @staticmethod
+    def _merge_histogram(histogram) -> List[int]:
+        """merge the read and write buckets into 6 + 6 latency ranges"""
+        return [sum(histogram[start:end]) for start, end in NVME_BIN_SLICES]
@@ -0,0 +1,111 @@
+# coding: utf-8
+# Copyright (c) 2025 Huawei Technologies Co., Ltd.
+# sysSentry is licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+
+"""
+binary response encoding, keep in sync with the decoder in collect_plugin.
+
+message: head, then section num sections.
+  head: marker 0 (a json response starts with '{'), version, section num
+  section: type, name len, payload len, name, payload
+table section payload, columnar:
+  width, record num, name num, names (len + utf-8 each),
+  disk index[record num], stage index[record num], iotype index[record num] as uint16,
+  values[record num * width] as float64
+json section payload: utf-8 json.
+arrays are in host byte order, the message never leaves the host.
+"""
+import json
+import struct
+from array import array
+
+ENCODING_JSON = "json"
+ENCODING_BINARY = "binary"
+
+BIN_MSG_MARKER = 0
+BIN_MSG_VERSION = 1
+BIN_SECTION_TABLE = 1
+BIN_SECTION_JSON = 2
+BIN_MSG_HEAD = struct.Struct('<BBH')
+BIN_SECTION_HEAD = struct.Struct('<BBI')
+BIN_TABLE_HEAD = struct.Struct('<HIH')
+BIN_NAME_LEN = struct.Struct('<B')
+
+
+def is_binary_request(data_struct):
+    return data_struct.get('encoding') == ENCODING_BINARY
+
+
+def encode_table(data_struct, data_source, collect_index):
+    """
+    encode the records of NumericRingBuffer data_source [disk][stage][iotype]
+    at collect_index, filtered like CollectServer.collect_common.
+    IO_DATA_LOCK must be held.
+    """
+    disk_list = json.loads(data_struct['disk_list'])
+    stage_list = json.loads(data_struct['stage'])
+    iotype_list = json.loads(data_struct['iotype'])
+
+    names = []
+    name_index = {}
+    index = [array('H'), array('H'), array('H')]
+    values = array('d')
+    width = 0
+
+    def add_name(name):
+        if name not in name_index:
+            name_index[name] = len(names)
+            names.append(name)
+        return name_index[name]
+
+    rings = []
+    for disk_name, stage_info in data_source.items():
+        if disk_name not in disk_list:
+            continue
+        for stage_name, iotype_info in stage_info.items():
+            if len(stage_list) > 0 and stage_name not in stage_list:
+                continue
+            for iotype_name, iotype_data in iotype_info.items():
+                if iotype_name in iotype_list:
+                    rings.append((disk_name, stage_name, iotype_name, iotype_data))
+    # the records of a table have one width, the wider records of the stage groups
+    # keep the io fields only when they are in one table with raw stages
+    if rings:
+        width = min(ring[3].width for ring in rings)
+    for disk_name, stage_name, iotype_name, iotype_data in rings:
+        if iotype_data.extend_into(collect_index, values, width):
+            index[0].append(add_name(disk_name))
+            index[1].append(add_name(stage_name))
+            index[2].append(add_name(iotype_name))
+
+    parts = [BIN_TABLE_HEAD.pack(width, len(index[0]), len(names))]
+    for name in names:
+        name_bytes = name.encode()
+        parts.append(BIN_NAME_LEN.pack(len(name_bytes)))
+        parts.append(name_bytes)
+    for column in index:
+        parts.append(column.tobytes())
+    parts.append(values.tobytes())
+    return b''.join(parts)
+
+
+def encode_json(result):
+    return json.dumps(result).encode()
+
+
+def encode_msg(sections):
+    """sections: list of (type, name, payload bytes)"""
+    parts = [BIN_MSG_HEAD.pack(BIN_MSG_MARKER, BIN_MSG_VERSION, len(sections))]
+    for section_type, name, payload in sections:
+        name_bytes = name.encode()
+        parts.append(BIN_SECTION_HEAD.pack(section_type, len(name_bytes), len(payload)))
+        parts.append(name_bytes)
+        parts.append(payload)
+    return b''.join(parts)
@@ -0,0 +1,107 @@
+# coding: utf-8
+# Copyright (c) 2025 Huawei Technologies Co., Ltd.
+# sysSentry is licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+
+"""
+keep the periodically read debugfs/sysfs files open.
+"""
+import os
+import errno
+import logging
+import threading
+
+FD_CACHE_READ_SIZE = 16 * 1024
+FD_CACHE_MAX_READ_SIZE = 16 * 1024 * 1024
+FD_CACHE_MAX_OPEN = 512
+
+# the file behind the fd is gone, e.g. the disk was removed, open it again
+REOPEN_ERRNO = (errno.ENOENT, errno.ENODEV, errno.ENXIO, errno.EIO, errno.ESTALE, errno.EBADF)
+
+
+class FdCache():
+    """
+    cache of opened read-only files, every read is one pread from offset 0
+    into a reusable per-thread buffer instead of open/read/close.
+    """
+
+    def __init__(self, max_open=FD_CACHE_MAX_OPEN):
+        self.max_open = max_open
+        self.fds = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def read(self, file_path):
+        """return the file content as str, raise OSError like open() does"""
+        fd = self._get_fd(file_path)
+        if fd is None:
+            # too many cached files, read it the plain way
+            with open(file_path, 'r') as file:
+                return file.read()
+        try:
+            return self._read_fd(fd)
+        except OSError as e:
+            if e.errno not in REOPEN_ERRNO:
+                raise
+        logging.debug("reopen %s", file_path)
+        self.close(file_path)
+        return self._read_fd(self._get_fd(file_path))
+
+    def close(self, file_path):
+        with self.lock:
+            fd = self.fds.pop(file_path, None)
+        if fd is not None:
+            self._close_fd(fd)
+
+    def close_all(self):
+        with self.lock:
+            fds = list(self.fds.values())
+            self.fds.clear()
+        for fd in fds:
+            self._close_fd(fd)
+
+    def __len__(self):
+        return len(self.fds)
+
+    def _get_fd(self, file_path):
+        with self.lock:
+            fd = self.fds.get(file_path)
+            if fd is not None:
+                return fd
+            if len(self.fds) >= self.max_open:
+                return None
+            fd = os.open(file_path, os.O_RDONLY | os.O_CLOEXEC)
+            self.fds[file_path] = fd
+            if len(self.fds) == self.max_open:
+                logging.warning("fd cache is full, %d files are kept open", self.max_open)
+            return fd
+
+    def _get_buffer(self):
+        buffer = getattr(self.local, "buffer", None)
+        if buffer is None:
+            buffer = bytearray(FD_CACHE_READ_SIZE)
+            self.local.buffer = buffer
+        return buffer
+
+    def _read_fd(self, fd):
+        buffer = self._get_buffer()
+        while True:
+            read_len = os.preadv(fd, [buffer], 0)
+            if read_len < len(buffer) or len(buffer) >= FD_CACHE_MAX_READ_SIZE:
+                return buffer[:read_len].decode(errors='ignore')
+            # the file may be longer than the buffer, grow it and read again
+            buffer = bytearray(len(buffer) * 2)
+            self.local.buffer = buffer
+
+    @staticmethod
+    def _close_fd(fd):
+        try:
+            os.close(fd)
+        except OSError:
+            pass
@@ -0,0 +1,84 @@
+# coding: utf-8
+# Copyright (c) 2025 Huawei Technologies Co., Ltd.
+# sysSentry is licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+
+"""
+virtual stages of the stage groups, derived from the raw stages of each period.
+"""
+
+# virtual stage -> raw stages, B->Q, Q->G, G->I, I->D and D->C of the extra loggers
+STAGE_GROUPS = {
+    "B-Q": ["throtl", "wbt", "iocost"],
+    "Q-G": ["gettag"],
+    "G-I": ["plug"],
+    "I-D": ["deadline", "bfq", "hctx", "requeue"],
+    "D-C": ["rq_driver"],
+}
+# virtual stage of the whole path, its latency is the sum of the group latencies
+STAGE_GROUP_TOTAL = "B-C"
+STAGE_GROUP_NAMES = list(STAGE_GROUPS) + [STAGE_GROUP_TOTAL]
+# latency, io_dump, io_length, iops like a raw stage, then the share in percent of
+# the group latency in the latency of STAGE_GROUP_TOTAL
+STAGE_GROUP_WIDTH = 5
+
+
+def get_stage_groups(stage_list):
+    """the virtual stages of a disk with these raw stages"""
+    groups = [group for group, stages in STAGE_GROUPS.items() if set(stages) & set(stage_list)]
+    if groups:
+        groups.append(STAGE_GROUP_TOTAL)
+    return groups
+
+
+def round_value(value):
+    if float(value).is_integer():
+        return int(value)
+    return round(value, 1)
+
+
+def build_stage_groups(period_io):
+    """
+    period_io: {stage: {iotype: io record}} of one disk in one period.
+    return {virtual stage: {iotype: group record}}, the latency and io_length of a group
+    are the average of its raw stages, io_dump is the sum, iops the greatest, then
+    the share of the group latency in the total one.
+    """
+    result = {}
+    total = {}
+    for group, stages in STAGE_GROUPS.items():
+        members = {}
+        for stage in stages:
+            for iotype, record in period_io.get(stage, {}).items():
+                members.setdefault(iotype, []).append(record)
+        if not members:
+            continue
+        result[group] = {}
+        for iotype, records in members.items():
+            count = len(records)
+            record = (round_value(sum(item[0] for item in records) / count),
+                      sum(item[1] for item in records),
+                      round_value(sum(item[2] for item in records) / count),
+                      max(item[3] for item in records))
+            result[group][iotype] = record
+            total.setdefault(iotype, []).append(record)
+    if total:
+        result[STAGE_GROUP_TOTAL] = {}
+        for iotype, records in total.items():
+            total_latency = round_value(sum(item[0] for item in records))
+            result[STAGE_GROUP_TOTAL][iotype] = (total_latency,
+                                                 sum(item[1] for item in records),
+                                                 round_value(sum(item[2] for item in records)),
+                                                 max(item[3] for item in records))
+            for group, iotype_record in result.items():
+                record = iotype_record.get(iotype)
+                if record is not None:
+                    share = round(record[0] * 100 / total_latency, 2) if total_latency > 0 else 0
+                    iotype_record[iotype] = record + (int(share) if float(share).is_integer() else share,)
+    return result
@@ -0,0 +1,130 @@
+# coding: utf-8
+# Copyright (c) 2025 Huawei Technologies Co., Ltd.
+# sysSentry is licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+
+"""
+block disk hotplug watcher. kernel uevents of block disks on a netlink socket
+trigger a rescan of the disks, the disks are also rescanned at an interval in
+case an event is lost or netlink is not available.
+"""
+import time
+import errno
+import socket
+import logging
+
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_GROUP_KERNEL = 1
+UEVENT_RECV_SIZE = 64 * 1024
+UEVENT_ACTIONS = ("add", "remove")
+# rescan in the next periods after an event, the debugfs of a new disk may show up later
+DISK_EVENT_RESCAN = 3
+# seconds between two rescans without an event
+DISK_RESCAN_INTERVAL = 60
+
+
+def parse_uevent(data):
+    """
+    "action@devpath\\0KEY=VALUE\\0..." of a kernel uevent to {KEY: VALUE},
+    None if it is not an add or remove of a block disk.
+    """
+    fields = data.split(b'\0')
+    uevent = {}
+    for field in fields[1:]:
+        key, sep, value = field.partition(b'=')
+        if sep:
+            uevent[key.decode(errors='ignore')] = value.decode(errors='ignore')
+    if uevent.get("SUBSYSTEM") != "block" or uevent.get("DEVTYPE") != "disk":
+        return None
+    if uevent.get("ACTION") not in UEVENT_ACTIONS:
+        return None
+    return uevent
+
+
+class DiskWatcher():
+    """tell the collect loop when to rescan the disks, poll is called once a period"""
+
+    def __init__(self, rescan_interval=DISK_RESCAN_INTERVAL):
+        self.rescan_interval = rescan_interval
+        self.sock = None
+        self.rescan_left = 0
+        self.last_scan = time.monotonic()
+        # disks with a remove event, a disk of these names found again is a new disk
+        self.removed_disks = set()
+
+    def open(self):
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM | socket.SOCK_NONBLOCK | socket.SOCK_CLOEXEC,
+                                 NETLINK_KOBJECT_UEVENT)
+        except (OSError, AttributeError) as e:
+            logging.warning("open uevent socket failed, %s, rescan disks every %ds", e, self.rescan_interval)
+            return
+        try:
+            sock.bind((0, UEVENT_GROUP_KERNEL))
+        except OSError as e:
+            logging.warning("bind uevent socket failed, %s, rescan disks every %ds", e, self.rescan_interval)
+            sock.close()
+            return
+        self.sock = sock
+        self.last_scan = time.monotonic()
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def read_events(self):
+        """block disk add and remove events received since the last poll"""
+        events = []
+        if self.sock is None:
+            return events
+        while True:
+            try:
+                data = self.sock.recv(UEVENT_RECV_SIZE)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno != errno.ENOBUFS:
+                    logging.error("recv uevent failed, %s", e)
+                    break
+                # events are dropped by the kernel, rescan for them
+                logging.warning("uevent socket overflows, rescan disks")
+                events.append({"ACTION": "overflow"})
+                continue
+            uevent = parse_uevent(data)
+            if uevent is not None:
+                logging.info("uevent %s disk %s", uevent["ACTION"], uevent.get("DEVNAME", ""))
+                if uevent["ACTION"] == "remove" and uevent.get("DEVNAME"):
+                    self.removed_disks.add(uevent["DEVNAME"])
+                events.append(uevent)
+        return events
+
+    def request_rescan(self):
+        """rescan at the next poll, e.g. the files of a disk are gone"""
+        self.rescan_left = max(self.rescan_left, 1)
+
+    def take_removed(self):
+        """names of the disks removed since the last call"""
+        removed_disks = self.removed_disks
+        self.removed_disks = set()
+        return removed_disks
+
+    def poll(self):
+        """True if the disks should be rescanned now"""
+        if self.read_events():
+            self.rescan_left = DISK_EVENT_RESCAN
+        now = time.monotonic()
+        if self.rescan_left > 0:
+            self.rescan_left -= 1
+            self.last_scan = now
+            return True
+        if now - self.last_scan >= self.rescan_interval:
+            self.last_scan = now
+            return True
+        return False
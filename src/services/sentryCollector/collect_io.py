@@ -18,25 +18,112 @@ import logging
 import threading
 import subprocess
 import re
+import queue
+import select
+import struct
+from concurrent.futures import ThreadPoolExecutor
 from typing import Union
 
 from .collect_config import CollectConfig
 from .collect_config import CONF_IO_NVME_SSD, CONF_IO_SATA_SSD, CONF_IO_SATA_HDD, CONF_IO_THRESHOLD_DEFAULT
+from .collect_config import CONF_IO_EBPF_FORMAT, CONF_IO_EBPF_FORMAT_BINARY, CONF_IO_COLLECT_WORKERS
+from .collect_config import CONF_IO_SHM_EXPORT, CONF_IO_ROLLUP, CONF_IO_ROLLUP_SAVE
+from .collect_config import PERIOD_MS_PER_SECOND, period_to_ms
 from .collect_plugin import get_disk_type, DiskType
-from .collect_disk import CollectDisk
+from .collect_disk import CollectDisk, NVME_BIN_SLICES, NVME_HIST_BUCKETS
+from .collect_buffer import RingBuffer, NumericRingBuffer
+from .collect_file import FdCache
+from .collect_shm import ShmExporter
+from .collect_topk import TOP_METRICS, build_top_index
+from .collect_group import get_stage_groups, build_stage_groups, STAGE_GROUP_WIDTH
+from .collect_rollup import Rollup
+from .collect_quantile import LAT_HIST_SLOTS
+from .collect_hotplug import DiskWatcher
+from .collect_timer import PeriodTimer
 
 Io_Category = ["read", "write", "flush", "discard"]
 IO_GLOBAL_DATA = {}
 IO_CONFIG_DATA = []
 IO_DUMP_DATA = {}
 DISK_DATA = {}
-EBPF_GLOBAL_DATA = []
+DISK_HIST_DATA = {}
+# ebpf latency histogram of each period, see collect_quantile
+LAT_HIST_DATA = {}
+# held while a period is published to or read from the global stores
+IO_DATA_LOCK = threading.Lock()
+# called in the collect thread after each period is published
+PERIOD_LISTENERS = []
+# called in the collect thread with the added and removed disks after the disks change
+DISK_LISTENERS = []
+# sequence number and monotonic time of the latest published period, 0 before the first one
+PERIOD_SEQ = [0]
+PERIOD_TIME = [0.0]
+# disk -> ring buffer of (sequence, monotonic time, sampled interval, missed periods before it)
+# of the periods in IO_GLOBAL_DATA
+PERIOD_STAMP_DATA = {}
+PERIOD_STAMP_WIDTH = 4
+# periods missed by the collect loop since it started, see collect_timer
+MISSED_PERIODS = [0]
+# metric -> ring buffer of the top index of each period, see collect_topk
+TOP_INDEX_DATA = {}
+# cpu time of the collector process per second, of the last check interval
+COLLECT_CPU_USAGE = [0.0]
+# cpu budget of the collector, a share of one cpu. a disk of 12 stages takes about 1ms
+# of cpu a period, so 12 disks take about 12% of a cpu at the period 100ms
+COLLECT_CPU_BUDGET = 0.15
+COLLECT_CPU_CHECK_INTERVAL = 60
+# resolution in seconds -> Rollup of the io records, see collect_rollup
+ROLLUP_DATA = {}
 EBPF_PROCESS = None
+DEBUGFS_BLOCK_PATH = '/sys/kernel/debug/block'
 EBPF_STAGE_LIST = ["wbt", "rq_driver", "bio", "gettag"]
 EBPF_SUPPORT_VERSION = ["6.6.0"]
+# ebpf ingestion param
+EBPF_READ_SIZE = 64 * 1024
+EBPF_QUEUE_SIZE = 64
+EBPF_SELECT_TIMEOUT = 0.5
+EBPF_STAT_READ = "read"
+EBPF_STAT_DROPPED = "dropped"
+EBPF_STAT_LAGGING = "lagging"
+# queued after the last batch of an ebpf_collector replaced by a restart
+EBPF_RESTART_MARK = None
+# binary record of "ebpf_collector --binary", keep in sync with struct ebpf_record:
+# stage id, io type char, flags, major, minor, io_dump, finish_count, duration, latency histogram
+EBPF_RECORD = struct.Struct('<BBHIIIQQ%dQ' % LAT_HIST_SLOTS)
+EBPF_RECORD_HEAD_NUM = 8
+# the latency histogram of the io type is filled, the wbt and gettag stages have none
+EBPF_RECORD_LAT_HIST = 1
+EBPF_STAGE_ID = {1: "rq_driver", 2: "bio", 3: "wbt", 4: "gettag"}
+EBPF_IO_TYPE_ID = {ord('R'): "read", ord('W'): "write", ord('F'): "flush", ord('D'): "discard"}
+
+# latency, io_dump, io_length, iops
+IO_DATA_WIDTH = 4
+# 6 read or write latency distribution buckets
+DISK_DATA_WIDTH = 6
+
+# data of one disk in one period, before publish
+PERIOD_IO = "io"
+PERIOD_IODUMP = "iodump"
+PERIOD_DISK = "disk"
+PERIOD_DISK_HIST = "disk_hist"
+# virtual stages of collect_group, published to IO_GLOBAL_DATA beside the raw stages
+PERIOD_STAGE_GROUP = "stage_group"
+PERIOD_LAT_HIST = "lat_hist"
+# seconds between the counter samples the rates of the period are computed from
+PERIOD_INTERVAL = "interval"
 
 #iodump data limit
 IO_DUMP_DATA_LIMIT = 10
+IO_DUMP_OP_FLAG = '.op='
+IO_DUMP_OP_NAME = [category.upper() for category in Io_Category]
+
+def register_period_listener(listener):
+    PERIOD_LISTENERS.append(listener)
+
+
+def register_disk_listener(listener):
+    DISK_LISTENERS.append(listener)
+
 
 class IoStatus():
     TOTAL = 0
@@ -52,13 +139,24 @@ class CollectIo():
 
         self.period_time = io_config['period_time']
         self.max_save = io_config['max_save']
+        self.collect_workers = io_config[CONF_IO_COLLECT_WORKERS]
+        self.executor = None
+        self.disk_collect_cost = {}
         disk_str = io_config['disk']
 
         self.disk_map_stage = {}
         self.window_value = {}
         self.disk_data_window_value = {}
+        # disk -> monotonic time of its last counter sample, the report time of it for ebpf
+        self.sample_time = {}
+        # disk -> monotonic time of the latest ebpf_collector report of the disk
+        self.ebpf_report_time = {}
+        self.cpu_check_time = time.monotonic()
+        self.cpu_check_cpu_time = time.process_time()
 
         self.ebpf_base_path = 'ebpf_collector'
+        self.ebpf_binary = io_config[CONF_IO_EBPF_FORMAT] == CONF_IO_EBPF_FORMAT_BINARY
+        self.ebpf_disk_name = {}
 
         self.loop_all = False
         self.io_threshold_config = module_config.get_io_threshold()
@@ -69,6 +167,29 @@ class CollectIo():
             self.disk_list = disk_str.strip().split(',')
 
         self.stop_event = threading.Event()
+        self.fd_cache = FdCache()
+        self.disk_watcher = DiskWatcher()
+        self.shm_exporter = ShmExporter() if io_config[CONF_IO_SHM_EXPORT] else None
+        for metric in TOP_METRICS:
+            TOP_INDEX_DATA[metric] = RingBuffer(self.max_save)
+        # rollups fed with the periods, the others are fed by a finer rollup
+        self.period_rollups = []
+        rollups = {}
+        for resolution in io_config[CONF_IO_ROLLUP]:
+            finer = [finer_resolution for finer_resolution in rollups if resolution % finer_resolution == 0]
+            if finer:
+                rollup = Rollup(resolution, resolution // max(finer), io_config[CONF_IO_ROLLUP_SAVE])
+                rollups[max(finer)].add_coarser(rollup)
+            else:
+                rollup = Rollup(resolution, resolution * PERIOD_MS_PER_SECOND // period_to_ms(self.period_time),
+                                io_config[CONF_IO_ROLLUP_SAVE])
+                self.period_rollups.append(rollup)
+            rollups[resolution] = rollup
+        ROLLUP_DATA.update(rollups)
+        self.ebpf_queue = queue.Queue(maxsize=EBPF_QUEUE_SIZE)
+        self.ebpf_lock = threading.Lock()
+        self.ebpf_stat = {EBPF_STAT_READ: 0, EBPF_STAT_DROPPED: 0, EBPF_STAT_LAGGING: 0}
+        self.ebpf_last_stat = dict(self.ebpf_stat)
         self.iodump_pattern = re.compile(
             r'(?P<task_name>[^-]+)-(?P<pid>\d+)\s+'
             r'\w+\s+'
@@ -117,56 +238,65 @@ class CollectIo():
     def get_blk_io_hierarchy(self, disk_name, stage_list):
         stats_file = '/sys/kernel/debug/block/{}/blk_io_hierarchy/stats'.format(disk_name)
         try:
-            with open(stats_file, 'r') as file:
-                lines = file.read()
+            lines = self.fd_cache.read(stats_file)
         except FileNotFoundError:
             logging.error("The file %s does not exist", stats_file)
+            # the disk may be removed
+            self.disk_watcher.request_rescan()
             return -1
         except Exception as e:
             logging.error("An error occurred: %s", e)
             return -1
 
-        curr_value = lines.strip().split('\n')
-
-        for stage_val in curr_value:
-            stage = stage_val.split(' ')[0]
-            if (len(self.window_value[disk_name][stage])) >= 2:
-                self.window_value[disk_name][stage].pop(0)
-
-            curr_stage_value = stage_val.split(' ')[1:-1]
-            self.window_value[disk_name][stage].append(curr_stage_value)
+        window_value = self.window_value[disk_name]
+        for stage_val in lines.strip().split('\n'):
+            # split and convert each line once, the counters are used by several metrics
+            fields = stage_val.split(' ')
+            stage_window = window_value.get(fields[0])
+            if stage_window is None:
+                continue
+            try:
+                curr_stage_value = [int(value) for value in fields[1:-1]]
+            except ValueError as e:
+                logging.error("parse %s of %s failed, %s", fields[0], stats_file, e)
+                continue
+            if len(stage_window) >= 2:
+                stage_window.pop(0)
+            stage_window.append(curr_stage_value)
         return 0
 
-    def append_period_lat(self, disk_name, stage_list):
+    def get_period_lat(self, disk_name, stage_list, period_data):
+        interval = period_data[PERIOD_INTERVAL]
         for stage in stage_list:
             if len(self.window_value[disk_name][stage]) < 2:
-                return
+                return False
             curr_stage_value = self.window_value[disk_name][stage][-1]
             last_stage_value = self.window_value[disk_name][stage][-2]
 
+            io_dump_count, io_dump_msg = self.get_io_dump(disk_name, stage)
+            period_data[PERIOD_IO][stage] = {}
+            period_data[PERIOD_IODUMP][stage] = {}
+
             for index in range(len(Io_Category)):
                 # read=0, write=1, flush=2, discard=3
-                if (len(IO_GLOBAL_DATA[disk_name][stage][Io_Category[index]])) >= self.max_save:
-                    IO_GLOBAL_DATA[disk_name][stage][Io_Category[index]].pop()
-                if (len(IO_DUMP_DATA[disk_name][stage][Io_Category[index]])) >= self.max_save:
-                    IO_DUMP_DATA[disk_name][stage][Io_Category[index]].pop()
-
                 curr_lat = self.get_latency_value(curr_stage_value, last_stage_value, index)
-                curr_iops = self.get_iops(curr_stage_value, last_stage_value, index)
-                curr_io_length = self.get_io_length(curr_stage_value, last_stage_value, index)
-                curr_io_dump = self.get_io_dump(disk_name, stage, index)
+                curr_iops = self.get_iops(curr_stage_value, last_stage_value, index, interval)
+                curr_io_length = self.get_io_length(curr_stage_value, last_stage_value, index, interval)
+                curr_io_dump = io_dump_count[index]
 
-                IO_GLOBAL_DATA[disk_name][stage][Io_Category[index]].insert(0, [curr_lat, curr_io_dump, curr_io_length, curr_iops])
-                if curr_io_dump == 0:
-                    IO_DUMP_DATA[disk_name][stage][Io_Category[index]].insert(0, [])
+                period_data[PERIOD_IO][stage][Io_Category[index]] = (curr_lat, curr_io_dump, curr_io_length, curr_iops)
+                period_data[PERIOD_IODUMP][stage][Io_Category[index]] = io_dump_msg[index]
+                if curr_io_dump > 0:
+                    logging.info(f"io_dump info : {disk_name}, {stage}, {Io_Category[index]}, {curr_io_dump}")
+        return True
 
-    def get_iops(self, curr_stage_value, last_stage_value, category):
+    def get_iops(self, curr_stage_value, last_stage_value, category, interval):
         try:
             finish = int(curr_stage_value[category * 3 + IoStatus.FINISH]) - int(last_stage_value[category * 3 + IoStatus.FINISH])
         except ValueError as e:
             logging.error("get_iops convert to int failed, %s", e)
             return 0
-        value = finish / self.period_time
+        value = finish / interval
         if value.is_integer():
             return int(value)
         else:
@@ -187,7 +317,7 @@ class CollectIo():
         else:
             return round(value, 1)
 
-    def get_io_length(self, curr_stage_value, last_stage_value, category):
+    def get_io_length(self, curr_stage_value, last_stage_value, category, interval):
         try:
             lat_time = (int(curr_stage_value[category * 3 + IoStatus.LATENCY]) - int(last_stage_value[category * 3 + IoStatus.LATENCY]))
         except ValueError as e:
@@ -198,49 +328,59 @@ class CollectIo():
         # ns convert us
         lat_time = lat_time / 1000
         # s convert us
-        period_time = self.period_time * 1000 * 1000
+        period_time = interval * 1000 * 1000
         value = lat_time / period_time
         if value.is_integer():
             return int(value)
         else:
             return round(value, 1)
 
-    def get_io_dump(self, disk_name, stage, category):
+    def get_io_dump(self, disk_name, stage):
         io_dump_file = '/sys/kernel/debug/block/{}/blk_io_hierarchy/{}/io_dump'.format(disk_name, stage)
-        count = 0
-        io_dump_msg = []
+        return self.parse_io_dump_file(io_dump_file)
+
+    def parse_io_dump_file(self, io_dump_file):
+        """scan io_dump once, bucket every line into read/write/flush/discard"""
+        count = [0] * len(Io_Category)
+        io_dump_msg = [[] for _ in Io_Category]
         pattern = self.iodump_pattern
+        op_flag_len = len(IO_DUMP_OP_FLAG)
 
         try:
-            with open(io_dump_file, 'r') as file:
-                for line in file:
-                    if line.count('.op=' + Io_Category[category].upper()) > 0:
-                        match = pattern.match(line)
-                        if match:
-                            if count < IO_DUMP_DATA_LIMIT:
-                                parsed = match.groupdict()
-                                values = [
-                                    parsed["task_name"],
-                                    parsed["pid"],
-                                    parsed["stage"],
-                                    parsed["ptr"],
-                                    str(int(parsed["start_time_ns"]) // 1000000)
-                                ]
-                                value_str = ",".join(values)
-                                io_dump_msg.append(value_str)
-                        else:
-                            logging.info(f"io_dump parse err, info : {line.strip()}")
-                        count += 1
-                if count > 0:
-                    IO_DUMP_DATA[disk_name][stage][Io_Category[category]].insert(0, io_dump_msg)
-                    logging.info(f"io_dump info : {disk_name}, {stage}, {Io_Category[category]}, {count}")
+            content = self.fd_cache.read(io_dump_file)
+            for line in content.splitlines():
+                pos = line.find(IO_DUMP_OP_FLAG)
+                if pos < 0:
+                    continue
+                pos += op_flag_len
+                for index, op_name in enumerate(IO_DUMP_OP_NAME):
+                    if line.startswith(op_name, pos):
+                        break
+                else:
+                    continue
+                # only count the lines over limit, no need to parse them
+                if count[index] >= IO_DUMP_DATA_LIMIT:
+                    count[index] += 1
+                    continue
+                match = pattern.match(line)
+                if match:
+                    parsed = match.groupdict()
+                    values = [
+                        parsed["task_name"],
+                        parsed["pid"],
+                        parsed["stage"],
+                        parsed["ptr"],
+                        str(int(parsed["start_time_ns"]) // 1000000)
+                    ]
+                    io_dump_msg[index].append(",".join(values))
+                else:
+                    logging.info(f"io_dump parse err, info : {line.strip()}")
+                count[index] += 1
         except FileNotFoundError:
             logging.error("The file %s does not exist.", io_dump_file)
-            return count
         except Exception as e:
             logging.error("An error occurred1: %s", e)
-            return count
-        return count
+        return count, io_dump_msg
 
     def extract_first_column(self, file_path):
         column_names = [] 
@@ -256,42 +396,51 @@ class CollectIo():
             logging.error("An error occurred2: %s", e)
         return column_names
 
-    def is_kernel_avaliable(self):
-        base_path = '/sys/kernel/debug/block'
-        all_disk = []
-        for disk_name in os.listdir(base_path):
-            disk_path = os.path.join(base_path, disk_name)
-            blk_io_hierarchy_path = os.path.join(disk_path, 'blk_io_hierarchy')
-
-            if not os.path.exists(blk_io_hierarchy_path):
-                logging.warning("no blk_io_hierarchy directory found in %s, skipping.", disk_name)
+    def get_kernel_disks(self):
+        """{disk: stage list} of the selected disks with blk_io_hierarchy, None if the disks are unknown"""
+        try:
+            disk_names = os.listdir(DEBUGFS_BLOCK_PATH)
+        except OSError as e:
+            logging.error("Failed to access %s, %s", DEBUGFS_BLOCK_PATH, e)
+            return None
+
+        disks = {}
+        for disk_name in disk_names:
+            if not self.loop_all and disk_name not in self.disk_list:
+                continue
+            stats_file = os.path.join(DEBUGFS_BLOCK_PATH, disk_name, 'blk_io_hierarchy', 'stats')
+            if not os.path.exists(stats_file):
+                logging.debug("no blk_io_hierarchy stats found in %s, skipping.", disk_name)
                 continue
+            stage_list = self.extract_first_column(stats_file)
+            if stage_list:
+                disks[disk_name] = stage_list
+        return disks
 
-            for file_name in os.listdir(blk_io_hierarchy_path):
-                file_path = os.path.join(blk_io_hierarchy_path, file_name)
-                if file_name == 'stats':
-                    all_disk.append(disk_name)
+    def get_ebpf_disks(self):
+        """{disk: stage list} of the selected disks, None if the disks are unknown"""
+        try:
+            disk_names = os.listdir(DEBUGFS_BLOCK_PATH)
+        except OSError as e:
+            logging.error("Failed to access %s, %s", DEBUGFS_BLOCK_PATH, e)
+            return None
+        return {disk_name: EBPF_STAGE_LIST for disk_name in disk_names
+                if self.loop_all or disk_name in self.disk_list}
 
-        if len(all_disk) == 0:
+    def is_kernel_avaliable(self):
+        disks = self.get_kernel_disks()
+        if not disks:
             logging.debug("no blk_io_hierarchy disk, it is not lock-free collection")
             return False
 
-        if self.loop_all:
-            self.disk_list = all_disk
-
-        for disk_name in self.disk_list:
-            if not self.loop_all and disk_name not in all_disk:
-                logging.warning("the %s disk not exist!", disk_name)
-                continue
-            stats_file = '/sys/kernel/debug/block/{}/blk_io_hierarchy/stats'.format(disk_name)
-            stage_list = self.extract_first_column(stats_file)
-            self.disk_map_stage[disk_name] = stage_list
-            self.window_value[disk_name] = {}
-            IO_GLOBAL_DATA[disk_name] = {}
-            IO_DUMP_DATA[disk_name] = {}
+        if not self.loop_all:
+            for disk_name in self.disk_list:
+                if disk_name not in disks:
+                    logging.warning("the %s disk not exist!", disk_name)
+        for disk_name, stage_list in disks.items():
+            self.add_kernel_disk(disk_name, stage_list)
+        return len(self.disk_map_stage) != 0
 
-        return len(IO_GLOBAL_DATA) != 0
-    
     def is_ebpf_avaliable(self):
         try:
             with open('/proc/version', 'r') as f:
@@ -300,80 +449,263 @@ class CollectIo():
         except (FileNotFoundError, IndexError, PermissionError):
             logging.error("Failed to read kernel version")
             return False
-        
-        base_path = '/sys/kernel/debug/block'
-        try:
-            disk_names = os.listdir(base_path)
-        except (FileNotFoundError, PermissionError):
-            logging.error("Failed to access %s", base_path)
+
+        disks = self.get_ebpf_disks()
+        if disks is None:
             return False
+        for disk_name, stage_list in disks.items():
+            self.add_ebpf_disk(disk_name, stage_list)
 
-        for disk_name in disk_names:
-            if not self.loop_all and disk_name not in self.disk_list:
-                continue
-            self.disk_map_stage[disk_name] = EBPF_STAGE_LIST
-            self.window_value[disk_name] = {}
-            IO_GLOBAL_DATA[disk_name] = {}
-            IO_DUMP_DATA[disk_name] = {}
-            self.init_disk_collect(disk_name)
+        return major_version in EBPF_SUPPORT_VERSION and os.path.exists('/usr/bin/ebpf_collector') and \
+            len(self.disk_map_stage) != 0
+
+    def add_kernel_disk(self, disk_name, stage_list):
+        self.window_value[disk_name] = {stage: [] for stage in stage_list}
+        with IO_DATA_LOCK:
+            self.init_disk_data(disk_name, stage_list)
+        self.update_io_threshold(disk_name, stage_list)
+        self.init_disk_collect(disk_name)
+        self.disk_map_stage[disk_name] = stage_list
 
-        for disk_name, stage_list in self.disk_map_stage.items():
+    def add_ebpf_disk(self, disk_name, stage_list):
+        with self.ebpf_lock:
+            self.window_value[disk_name] = {
+                stage: {category: [[0, 0, 0, None], [0, 0, 0, None]] for category in Io_Category}
+                for stage in stage_list
+            }
+        with IO_DATA_LOCK:
+            self.init_disk_data(disk_name, stage_list)
+            LAT_HIST_DATA[disk_name] = {}
             for stage in stage_list:
-                self.window_value[disk_name][stage] = {}
-                IO_GLOBAL_DATA[disk_name][stage] = {}
-                IO_DUMP_DATA[disk_name][stage] = {}
+                LAT_HIST_DATA[disk_name][stage] = {}
                 for category in Io_Category:
-                    IO_GLOBAL_DATA[disk_name][stage][category] = []
-                    IO_DUMP_DATA[disk_name][stage][category] = []
-                    self.window_value[disk_name][stage][category] = [[0,0,0], [0,0,0]]
+                    LAT_HIST_DATA[disk_name][stage][category] = NumericRingBuffer(self.max_save, LAT_HIST_SLOTS, 'Q')
+        self.init_disk_collect(disk_name)
+        self.disk_map_stage[disk_name] = stage_list
+
+    def remove_disk(self, disk_name):
+        """stop collecting a removed disk and drop its data"""
+        stage_list = self.disk_map_stage.pop(disk_name, [])
+        with self.ebpf_lock:
+            self.window_value.pop(disk_name, None)
+            self.ebpf_report_time.pop(disk_name, None)
+        self.disk_data_window_value.pop(disk_name, None)
+        self.disk_collect_cost.pop(disk_name, None)
+        self.sample_time.pop(disk_name, None)
+        collector = self.disk_collectors.pop(disk_name, None)
+        if collector:
+            collector.close()
+        with IO_DATA_LOCK:
+            for data_source in (IO_GLOBAL_DATA, IO_DUMP_DATA, DISK_DATA, DISK_HIST_DATA, LAT_HIST_DATA,
+                                PERIOD_STAMP_DATA):
+                data_source.pop(disk_name, None)
+            for rollup in ROLLUP_DATA.values():
+                rollup.remove_disk(disk_name)
+        hierarchy_path = os.path.join(DEBUGFS_BLOCK_PATH, disk_name, 'blk_io_hierarchy')
+        self.fd_cache.close(os.path.join(hierarchy_path, 'stats'))
+        for stage in stage_list:
+            self.fd_cache.close(os.path.join(hierarchy_path, stage, 'io_dump'))
+
+    def sync_disks(self, get_disks, add_disk):
+        """add the new disks and remove the gone ones when the disk watcher asks for a rescan, return the added"""
+        if not self.disk_watcher.poll():
+            return []
+        disks = get_disks()
+        if disks is None:
+            return []
+        # a disk removed and added again between two rescans is a new disk, e.g. a swapped drive
+        replaced = self.disk_watcher.take_removed()
+        removed = [disk_name for disk_name, stage_list in self.disk_map_stage.items()
+                   if disks.get(disk_name) != stage_list or disk_name in replaced]
+        for disk_name in removed:
+            self.remove_disk(disk_name)
+        added = [disk_name for disk_name in disks if disk_name not in self.disk_map_stage]
+        for disk_name in added:
+            add_disk(disk_name, disks[disk_name])
+        if not added and not removed:
+            return added
+
+        with self.ebpf_lock:
+            # the device number of a removed disk may be taken by a new one
+            self.ebpf_disk_name.clear()
+        logging.info("disks changed, added %s, removed %s", added, removed)
+        for listener in DISK_LISTENERS:
+            try:
+                listener(added, removed)
+            except Exception as e:
+                logging.error("disk listener failed, %s", e)
+        return added
 
-        return major_version in EBPF_SUPPORT_VERSION and os.path.exists('/usr/bin/ebpf_collector') and len(IO_GLOBAL_DATA) != 0 
-    
     def get_ebpf_raw_data(
         self
     ) -> None:
+        """read ebpf_collector stdout in batches and queue the complete records"""
         global EBPF_PROCESS
-        global EBPF_GLOBAL_DATA
+
+        process = EBPF_PROCESS
+        pipe = process.stdout
+        buffer = bytearray(EBPF_READ_SIZE)
+        buffer_view = memoryview(buffer)
+        remain = b''
 
         while True:
             if self.stop_event.is_set():
                 logging.debug("collect io thread exit")
                 return
-            line = EBPF_PROCESS.stdout.readline()
-            if not line:
+            try:
+                readable, _, _ = select.select([pipe], [], [], EBPF_SELECT_TIMEOUT)
+                if not readable:
+                    continue
+                read_len = pipe.readinto(buffer_view)
+                # the reader waits on the pipe, a batch is read right when ebpf_collector reports it
+                report_time = time.monotonic()
+            except (OSError, ValueError) as e:
+                logging.error("read ebpf data failed, %s", e)
+                break
+            if not read_len:
+                if EBPF_PROCESS is not None and EBPF_PROCESS is not process:
+                    # the old ebpf_collector is stopped after a restart, follow the new one
+                    pipe.close()
+                    process = EBPF_PROCESS
+                    pipe = process.stdout
+                    remain = b''
+                    self.put_ebpf_restart_mark()
+                    continue
                 logging.info("no ebpf data found, wait for collect")
                 break
-            EBPF_GLOBAL_DATA.append(line.strip())
-            time.sleep(0.1)
-    
+
+            chunk = remain + buffer_view[:read_len]
+            batch, batch_count, remain = self.split_ebpf_chunk(chunk)
+            if not batch_count:
+                if len(remain) >= EBPF_READ_SIZE:
+                    remain = b''
+                continue
+            self.ebpf_stat[EBPF_STAT_READ] += batch_count
+            try:
+                self.ebpf_queue.put_nowait((report_time, batch))
+            except queue.Full:
+                self.ebpf_stat[EBPF_STAT_DROPPED] += batch_count
+
+    def put_ebpf_restart_mark(self):
+        """the counters of the new ebpf_collector start from 0, reset the baselines after the old batches"""
+        while not self.stop_event.is_set():
+            try:
+                self.ebpf_queue.put(EBPF_RESTART_MARK, timeout=EBPF_SELECT_TIMEOUT)
+                return
+            except queue.Full:
+                continue
+
+    def reset_ebpf_windows(self):
+        """drop the counters of a stopped ebpf_collector, ebpf_lock must be held"""
+        for disk_name, disk_window in self.window_value.items():
+            for stage_window in disk_window.values():
+                for category in stage_window:
+                    stage_window[category] = [[0, 0, 0, None], [0, 0, 0, None]]
+            self.sample_time.pop(disk_name, None)
+
+    def split_ebpf_chunk(self, chunk):
+        """split raw output into complete records and the incomplete remain"""
+        if self.ebpf_binary:
+            batch_len = len(chunk) - len(chunk) % EBPF_RECORD.size
+            return chunk[:batch_len], batch_len // EBPF_RECORD.size, chunk[batch_len:]
+        line_end = chunk.rfind(b'\n')
+        if line_end < 0:
+            return None, 0, chunk
+        batch = chunk[:line_end].decode(errors='ignore').splitlines()
+        return batch, len(batch), chunk[line_end + 1:]
+
     def update_ebpf_collector_data(
         self,
     ) -> None:
-        global EBPF_GLOBAL_DATA
-
         while True:
             if self.stop_event.is_set():
                 logging.debug("collect io thread exit")
                 return
-            if EBPF_GLOBAL_DATA:
-                for data in EBPF_GLOBAL_DATA:
-                    data_list = data.split()
-                    if len(data_list) != 6:
-                        continue
-                    stage, finish_count, latency, io_dump, io_type ,disk_name = data_list
-                    if stage not in EBPF_STAGE_LIST:
-                        continue
-                    if disk_name not in self.window_value:
-                        continue
-                    io_type = self.get_ebpf_io_type(io_type)
-                    if not io_type:
-                        continue                  
-                    if (len(self.window_value[disk_name][stage][io_type])) >= 2:
-                        self.window_value[disk_name][stage][io_type].pop()
-                    self.window_value[disk_name][stage][io_type].append([int(finish_count), int(latency), int(io_dump)])
-                EBPF_GLOBAL_DATA.clear()
-            time.sleep(0.1)
-    
+            try:
+                item = self.ebpf_queue.get(timeout=EBPF_SELECT_TIMEOUT)
+            except queue.Empty:
+                continue
+            if item is EBPF_RESTART_MARK:
+                with self.ebpf_lock:
+                    self.reset_ebpf_windows()
+                continue
+            report_time, batch = item
+            # more batches are waiting, the aggregator is behind the reader
+            if not self.ebpf_queue.empty():
+                self.ebpf_stat[EBPF_STAT_LAGGING] += len(batch)
+
+            with self.ebpf_lock:
+                if self.ebpf_binary:
+                    self.update_ebpf_binary_batch(batch, report_time)
+                else:
+                    self.update_ebpf_text_batch(batch, report_time)
+
+    def update_ebpf_text_batch(self, batch, report_time):
+        for data in batch:
+            data_list = data.split()
+            if len(data_list) not in (6, 7):
+                continue
+            stage, finish_count, latency, io_dump, io_type ,disk_name = data_list[:6]
+            if stage not in EBPF_STAGE_LIST:
+                continue
+            io_type = self.get_ebpf_io_type(io_type)
+            if not io_type:
+                continue
+            value = [int(finish_count), int(latency), int(io_dump), report_time]
+            # the latency histogram of a newer ebpf_collector
+            if len(data_list) == 7:
+                lat_hist = data_list[6].split(',')
+                if len(lat_hist) == LAT_HIST_SLOTS:
+                    value.append([int(count) for count in lat_hist])
+            self.update_ebpf_window(disk_name, stage, io_type, value)
+
+    def update_ebpf_binary_batch(self, batch, report_time):
+        for record in EBPF_RECORD.iter_unpack(batch):
+            stage_id, io_type_id, flags, major, minor, io_dump, finish_count, latency = record[:EBPF_RECORD_HEAD_NUM]
+            stage = EBPF_STAGE_ID.get(stage_id)
+            io_type = EBPF_IO_TYPE_ID.get(io_type_id)
+            if not stage or not io_type:
+                continue
+            disk_name = self.get_ebpf_disk_name(major, minor)
+            if not disk_name:
+                continue
+            value = [finish_count, latency, io_dump, report_time]
+            if flags & EBPF_RECORD_LAT_HIST:
+                value.append(record[EBPF_RECORD_HEAD_NUM:])
+            self.update_ebpf_window(disk_name, stage, io_type, value)
+
+    def update_ebpf_window(self, disk_name, stage, io_type, value):
+        if disk_name not in self.window_value:
+            return
+        if (len(self.window_value[disk_name][stage][io_type])) >= 2:
+            self.window_value[disk_name][stage][io_type].pop()
+        self.window_value[disk_name][stage][io_type].append(value)
+        self.ebpf_report_time[disk_name] = value[3]
+
+    def get_ebpf_disk_name(self, major, minor):
+        """map device number of binary record to disk name, cached"""
+        dev = (major, minor)
+        if dev not in self.ebpf_disk_name:
+            try:
+                dev_path = os.readlink('/sys/dev/block/{}:{}'.format(major, minor))
+                self.ebpf_disk_name[dev] = os.path.basename(dev_path)
+            except OSError:
+                logging.warning("no block device found for %d:%d", major, minor)
+                self.ebpf_disk_name[dev] = None
+        return self.ebpf_disk_name[dev]
+
+    def report_ebpf_stat(self):
+        """log the ebpf ingestion counters when records are dropped or delayed"""
+        curr_stat = dict(self.ebpf_stat)
+        dropped = curr_stat[EBPF_STAT_DROPPED] - self.ebpf_last_stat[EBPF_STAT_DROPPED]
+        lagging = curr_stat[EBPF_STAT_LAGGING] - self.ebpf_last_stat[EBPF_STAT_LAGGING]
+        if dropped > 0 or lagging > 0:
+            logging.warning("ebpf ingestion falls behind, dropped %d, lagging %d, total %s",
+                            dropped, lagging, curr_stat)
+        else:
+            logging.debug("ebpf ingestion stat: %s", curr_stat)
+        self.ebpf_last_stat = curr_stat
+
     def get_ebpf_io_type(
         self,
         io_type: str
@@ -390,48 +722,71 @@ class CollectIo():
     def append_ebpf_period_data(
         self, 
     ) -> None:
-        global IO_GLOBAL_DATA
-        global IO_DUMP_DATA
+        timer = PeriodTimer(self.period_time)
+        missed = 0
         while True:
             if self.stop_event.is_set():
                 logging.debug("collect io thread exit")
                 return
-            start_time = time.time()
-            for disk_name, stage_list in self.disk_map_stage.items():
-                for stage in stage_list:
-                    for io_type in Io_Category:
-                        if len(self.window_value[disk_name][stage][io_type]) < 2:
-                            return
-                        if (len(IO_GLOBAL_DATA[disk_name][stage][io_type])) >= self.max_save:
-                            IO_GLOBAL_DATA[disk_name][stage][io_type].pop()
-                        if (len(IO_DUMP_DATA[disk_name][stage][io_type])) >= self.max_save:
-                            IO_DUMP_DATA[disk_name][stage][io_type].pop()
-                        curr_finish_count, curr_latency, curr_io_dump_count = self.window_value[disk_name][stage][io_type][-1]
-                        prev_finish_count, prev_latency, prev_io_dump_count = self.window_value[disk_name][stage][io_type][-2]
-                        self.window_value[disk_name][stage][io_type].pop(0)
-                        self.window_value[disk_name][stage][io_type].insert(1, self.window_value[disk_name][stage][io_type][0])
-                        curr_lat = self.get_ebpf_latency_value(curr_latency=curr_latency, prev_latency=prev_latency, curr_finish_count=curr_finish_count, prev_finish_count=prev_finish_count)
-                        curr_iops = self.get_ebpf_iops(curr_finish_count=curr_finish_count, prev_finish_count=prev_finish_count)
-                        curr_io_length = self.get_ebpf_io_length(curr_latency=curr_latency, prev_latency=prev_latency)
-                        curr_io_dump = self.get_ebpf_io_dump(curr_io_dump_count=curr_io_dump_count, prev_io_dump_count=prev_io_dump_count)
-                        if curr_io_dump > 0:
-                            logging.info(f"ebpf io_dump info : {disk_name}, {stage}, {io_type}, {curr_io_dump}")
-                        IO_GLOBAL_DATA[disk_name][stage][io_type].insert(0, [curr_lat, curr_io_dump, curr_io_length, curr_iops])
-                        IO_DUMP_DATA[disk_name][stage][io_type].insert(0, [])
-                self.append_disk_data(disk_name)
-
-            elapsed_time = time.time() - start_time
-            sleep_time = self.period_time - elapsed_time
-            if sleep_time < 0:
-                continue
-            while sleep_time > 1:
-                if self.stop_event.is_set():
-                    logging.debug("collect io thread exit")
-                    return
-                time.sleep(1)
-                sleep_time -= 1
-            time.sleep(sleep_time)
+            if self.sync_disks(self.get_ebpf_disks, self.add_ebpf_disk):
+                # ebpf_collector traces the disks found at its start
+                self.restart_ebpf_subprocess()
+            self.publish_period(self.collect_period(self.collect_ebpf_disk), missed)
+            self.report_ebpf_stat()
+            self.report_cpu_usage()
+
+            missed = timer.wait(self.stop_event)
+            if missed is None:
+                logging.debug("collect io thread exit")
+                return
             
+    def get_ebpf_disk_period(
+        self,
+        disk_name: str,
+        stage_list: list,
+        period_data: dict
+    ) -> bool:
+        interval = period_data[PERIOD_INTERVAL]
+        period_data[PERIOD_LAT_HIST] = {}
+        for stage in stage_list:
+            period_data[PERIOD_IO][stage] = {}
+            period_data[PERIOD_IODUMP][stage] = {}
+            period_data[PERIOD_LAT_HIST][stage] = {}
+            for io_type in Io_Category:
+                if len(self.window_value[disk_name][stage][io_type]) < 2:
+                    return False
+                curr_finish_count, curr_latency, curr_io_dump_count, curr_time = \
+                    self.window_value[disk_name][stage][io_type][-1][:4]
+                prev_finish_count, prev_latency, prev_io_dump_count, prev_time = \
+                    self.window_value[disk_name][stage][io_type][-2][:4]
+                # the reports of an io type may be periods apart, see struct stage_data
+                report_interval = interval
+                if curr_time is not None and prev_time is not None and curr_time > prev_time:
+                    report_interval = curr_time - prev_time
+                curr_lat_hist = self.get_ebpf_lat_hist(self.window_value[disk_name][stage][io_type])
+                if curr_lat_hist:
+                    period_data[PERIOD_LAT_HIST][stage][io_type] = curr_lat_hist
+                self.window_value[disk_name][stage][io_type].pop(0)
+                self.window_value[disk_name][stage][io_type].insert(1, self.window_value[disk_name][stage][io_type][0])
+                curr_lat = self.get_ebpf_latency_value(curr_latency=curr_latency, prev_latency=prev_latency, curr_finish_count=curr_finish_count, prev_finish_count=prev_finish_count)
+                curr_iops = self.get_ebpf_iops(curr_finish_count=curr_finish_count, prev_finish_count=prev_finish_count,
+                                               interval=report_interval)
+                curr_io_length = self.get_ebpf_io_length(curr_latency=curr_latency, prev_latency=prev_latency,
+                                                         interval=report_interval)
+                curr_io_dump = self.get_ebpf_io_dump(curr_io_dump_count=curr_io_dump_count, prev_io_dump_count=prev_io_dump_count)
+                if curr_io_dump > 0:
+                    logging.info(f"ebpf io_dump info : {disk_name}, {stage}, {io_type}, {curr_io_dump}")
+                period_data[PERIOD_IO][stage][io_type] = (curr_lat, curr_io_dump, curr_io_length, curr_iops)
+                period_data[PERIOD_IODUMP][stage][io_type] = []
+        return True
+
+    @staticmethod
+    def get_ebpf_lat_hist(window):
+        """latency histogram of the period, None if a value has no histogram"""
+        if len(window[-1]) <= 4 or len(window[-2]) <= 4:
+            return None
+        return [max(0, curr - prev) for curr, prev in zip(window[-1][4], window[-2][4])]
+
     def get_ebpf_latency_value(
         self,
         curr_latency: int,
@@ -452,12 +807,13 @@ class CollectIo():
     def get_ebpf_iops(
         self,
         curr_finish_count: int,
-        prev_finish_count: int
+        prev_finish_count: int,
+        interval: float
     ) -> Union[int, float]:
         finish = curr_finish_count - prev_finish_count
         if finish <= 0:
             return 0
-        value = finish / self.period_time
+        value = finish / interval
         if value.is_integer():
             return int(value)
         else:
@@ -467,6 +823,7 @@ class CollectIo():
         self,
         curr_latency: int,
         prev_latency: int,
+        interval: float
     ) -> Union[int, float]:
         lat_time = curr_latency - prev_latency
         if lat_time <= 0:
@@ -474,7 +831,7 @@ class CollectIo():
         # ns convert us
         lat_time = lat_time / 1000
         # s convert us
-        period_time = self.period_time * 1000 * 1000
+        period_time = interval * 1000 * 1000
         value = lat_time / period_time
         if value.is_integer():
             return int(value)
@@ -496,12 +853,19 @@ class CollectIo():
         self
     ) -> None:
         global EBPF_PROCESS
+        ebpf_cmd = [self.ebpf_base_path]
+        if self.ebpf_binary:
+            ebpf_cmd.append('--binary')
+        period_ms = period_to_ms(self.period_time)
+        if period_ms < PERIOD_MS_PER_SECOND:
+            # ebpf_collector reports each second by default
+            ebpf_cmd.extend(['--interval', str(period_ms)])
         try:
             EBPF_PROCESS = subprocess.Popen(
-                self.ebpf_base_path,
+                ebpf_cmd,
                 stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
+                stderr=subprocess.DEVNULL,
+                bufsize=0,
                 shell=False
             )
         except (FileNotFoundError, PermissionError, ValueError):
@@ -515,14 +879,62 @@ class CollectIo():
         if not EBPF_PROCESS:
             logging.debug("No eBPF process to stop")
             return
+        self.terminate_ebpf_process(EBPF_PROCESS)
+        logging.info("ebpf collector thread exit")
+
+    def restart_ebpf_subprocess(
+        self
+    ) -> None:
+        """start an ebpf_collector tracing the current disks, then stop the old one"""
+        global EBPF_PROCESS
+        old_process = EBPF_PROCESS
+        self.start_ebpf_subprocess()
+        if EBPF_PROCESS is None:
+            logging.error("restart ebpf collector failed, the new disks are not traced")
+            EBPF_PROCESS = old_process
+            return
+        if old_process:
+            self.terminate_ebpf_process(old_process)
+        logging.info("ebpf collector restarted for the new disks")
+
+    @staticmethod
+    def terminate_ebpf_process(process):
         try:
-            EBPF_PROCESS.terminate()
-            EBPF_PROCESS.wait(timeout=3)
+            process.terminate()
+            process.wait(timeout=3)
         except subprocess.TimeoutExpired:
             logging.error("eBPF process did not exit within timeout. Forcing kill.")
-            EBPF_PROCESS.kill()
-            EBPF_PROCESS.wait()
-        logging.info("ebpf collector thread exit")
+            process.kill()
+            process.wait()
+
+    def close_files(self):
+        self.fd_cache.close_all()
+        if self.shm_exporter:
+            self.shm_exporter.close()
+        for collect_disk in self.disk_collectors.values():
+            collect_disk.close()
+
+    def init_io_data(self, disk_name, stage, category):
+        IO_GLOBAL_DATA[disk_name][stage][category] = NumericRingBuffer(self.max_save, IO_DATA_WIDTH)
+        IO_DUMP_DATA[disk_name][stage][category] = RingBuffer(self.max_save)
+
+    def init_disk_data(self, disk_name, stage_list):
+        """io stores of a new disk, IO_DATA_LOCK must be held"""
+        IO_GLOBAL_DATA[disk_name] = {}
+        IO_DUMP_DATA[disk_name] = {}
+        PERIOD_STAMP_DATA[disk_name] = NumericRingBuffer(self.max_save, PERIOD_STAMP_WIDTH)
+        for stage in stage_list:
+            IO_GLOBAL_DATA[disk_name][stage] = {}
+            IO_DUMP_DATA[disk_name][stage] = {}
+            for category in Io_Category:
+                self.init_io_data(disk_name, stage, category)
+        self.init_stage_groups(disk_name, stage_list)
+
+    def init_stage_groups(self, disk_name, stage_list):
+        for group in get_stage_groups(stage_list):
+            IO_GLOBAL_DATA[disk_name][group] = {}
+            for category in Io_Category:
+                IO_GLOBAL_DATA[disk_name][group][category] = NumericRingBuffer(self.max_save, STAGE_GROUP_WIDTH)
 
     def init_disk_collect(
         self,
@@ -532,84 +944,206 @@ class CollectIo():
         support_flag = collector.get_support_flag()
         if support_flag:
             self.disk_collectors[disk_name] = collector
-            self.disk_data_window_value[disk_name] = []
-            DISK_DATA[disk_name] = {}
-            DISK_DATA[disk_name]['rq_driver'] = {}
-            DISK_DATA[disk_name]['rq_driver']['read'] = []
-            DISK_DATA[disk_name]['rq_driver']['write'] = []
+            self.disk_data_window_value[disk_name] = None
+            with IO_DATA_LOCK:
+                DISK_DATA[disk_name] = {}
+                DISK_DATA[disk_name]['rq_driver'] = {}
+                DISK_DATA[disk_name]['rq_driver']['read'] = NumericRingBuffer(self.max_save, DISK_DATA_WIDTH, 'Q')
+                DISK_DATA[disk_name]['rq_driver']['write'] = NumericRingBuffer(self.max_save, DISK_DATA_WIDTH, 'Q')
+                DISK_HIST_DATA[disk_name] = {}
+                DISK_HIST_DATA[disk_name]['rq_driver'] = {}
+                DISK_HIST_DATA[disk_name]['rq_driver']['read'] = \
+                    NumericRingBuffer(self.max_save, NVME_HIST_BUCKETS, 'Q')
+                DISK_HIST_DATA[disk_name]['rq_driver']['write'] = \
+                    NumericRingBuffer(self.max_save, NVME_HIST_BUCKETS, 'Q')
 
-    def append_disk_data(
-        self,
-        disk_name: str,
-    ) -> None:
-        if disk_name in self.disk_collectors:
-            collect_disk = self.disk_collectors[disk_name]
-            curr_value = collect_disk.collect_data()
-            if len(curr_value) != 0:
-                self.disk_data_window_value[disk_name].append(curr_value)
-                if len(self.disk_data_window_value[disk_name]) < 2:
-                    return
-                if len(self.disk_data_window_value[disk_name]) > 2:
-                    self.disk_data_window_value[disk_name].pop(0)
-
-                read_data = []
-                write_data = []
-                last_value = self.disk_data_window_value[disk_name][0]
-
-                for i in range(6):
-                    delta = curr_value[i] - last_value[i]
-                    read_data.append(max(0, delta))
-                for i in range(6, 12):
-                    delta = curr_value[i] - last_value[i]
-                    write_data.append(max(0, delta))
-                if len(DISK_DATA[disk_name]['rq_driver']['read']) >= self.max_save:
-                    DISK_DATA[disk_name]['rq_driver']['read'].pop()
-                if len(DISK_DATA[disk_name]['rq_driver']['write']) >= self.max_save:
-                    DISK_DATA[disk_name]['rq_driver']['write'].pop()
-                DISK_DATA[disk_name]['rq_driver']['read'].insert(0, read_data)
-                DISK_DATA[disk_name]['rq_driver']['write'].insert(0, write_data)
+    def get_disk_period_data(self, disk_name, period_data):
+        if disk_name not in self.disk_collectors:
+            return
+        curr_value = self.disk_collectors[disk_name].collect_histogram()
+        if curr_value is None:
+            return
+        last_value = self.disk_data_window_value[disk_name]
+        self.disk_data_window_value[disk_name] = curr_value
+        if last_value is None:
+            return
+
+        delta = [max(0, curr - last) for curr, last in zip(curr_value, last_value)]
+        bins = [sum(delta[start:end]) for start, end in NVME_BIN_SLICES]
+        period_data[PERIOD_DISK] = [bins[:DISK_DATA_WIDTH], bins[DISK_DATA_WIDTH:]]
+        period_data[PERIOD_DISK_HIST] = [delta[:NVME_HIST_BUCKETS], delta[NVME_HIST_BUCKETS:]]
+
+    def get_sample_interval(self, disk_name, sample_time):
+        """seconds from the last counter sample of the disk to sample_time, the period without an earlier one"""
+        last_time = self.sample_time.get(disk_name)
+        if last_time is None or sample_time is None or sample_time <= last_time:
+            return self.period_time
+        return sample_time - last_time
+
+    def collect_kernel_disk(self, disk_name, stage_list):
+        period_data = {PERIOD_IO: {}, PERIOD_IODUMP: {}}
+        sample_time = time.monotonic()
+        if self.get_blk_io_hierarchy(disk_name, stage_list) < 0:
+            return None
+        period_data[PERIOD_INTERVAL] = self.get_sample_interval(disk_name, sample_time)
+        if not self.get_period_lat(disk_name, stage_list, period_data):
+            return None
+        self.sample_time[disk_name] = sample_time
+        period_data[PERIOD_STAGE_GROUP] = build_stage_groups(period_data[PERIOD_IO])
+        self.get_disk_period_data(disk_name, period_data)
+        return period_data
+
+    def collect_ebpf_disk(self, disk_name, stage_list):
+        period_data = {PERIOD_IO: {}, PERIOD_IODUMP: {}}
+        with self.ebpf_lock:
+            # the rates are over the reports of ebpf_collector, not over the collect loop
+            report_time = self.ebpf_report_time.get(disk_name)
+            period_data[PERIOD_INTERVAL] = self.get_sample_interval(disk_name, report_time)
+            if not self.get_ebpf_disk_period(disk_name, stage_list, period_data):
+                return None
+            if report_time is not None:
+                self.sample_time[disk_name] = report_time
+        period_data[PERIOD_STAGE_GROUP] = build_stage_groups(period_data[PERIOD_IO])
+        self.get_disk_period_data(disk_name, period_data)
+        return period_data
+
+    def collect_disk_timed(self, collect_func, disk_name, stage_list):
+        start_time = time.monotonic()
+        try:
+            period_data = collect_func(disk_name, stage_list)
+        except Exception as e:
+            logging.error("collect %s failed, %s", disk_name, e)
+            period_data = None
+        self.disk_collect_cost[disk_name] = time.monotonic() - start_time
+        return period_data
+
+    def collect_period(self, collect_func):
+        """collect all disks of one period, concurrently when the worker pool is enabled"""
+        results = {}
+        if self.executor:
+            futures = {}
+            for disk_name, stage_list in self.disk_map_stage.items():
+                futures[disk_name] = self.executor.submit(self.collect_disk_timed, collect_func,
+                                                          disk_name, stage_list)
+            for disk_name, future in futures.items():
+                results[disk_name] = future.result()
+        else:
+            for disk_name, stage_list in self.disk_map_stage.items():
+                results[disk_name] = self.collect_disk_timed(collect_func, disk_name, stage_list)
+        self.report_collect_cost()
+        return results
+
+    def publish_period(self, results, missed=0):
+        """append the data of one period to the global stores at once, missed: periods skipped before it"""
+        now = time.monotonic()
+        period_io = {disk_name: period_data[PERIOD_IO] for disk_name, period_data in results.items() if period_data}
+        top_index = build_top_index(period_io)
+        period_group = {disk_name: period_data[PERIOD_STAGE_GROUP] for disk_name, period_data in results.items()
+                        if period_data and PERIOD_STAGE_GROUP in period_data}
+        for rollup in self.period_rollups:
+            rollup.add_period(period_io)
+            rollup.add_period(period_group)
+        with IO_DATA_LOCK:
+            PERIOD_SEQ[0] += 1
+            PERIOD_TIME[0] = now
+            MISSED_PERIODS[0] += missed
+            for metric, index_data in TOP_INDEX_DATA.items():
+                index_data.append(top_index[metric])
+            for disk_name, period_data in results.items():
+                if not period_data:
+                    continue
+                PERIOD_STAMP_DATA[disk_name].append((PERIOD_SEQ[0], now, period_data[PERIOD_INTERVAL], missed))
+                for stage, iotype_data in period_data[PERIOD_IO].items():
+                    for iotype, value in iotype_data.items():
+                        IO_GLOBAL_DATA[disk_name][stage][iotype].append(value)
+                for group, iotype_data in period_data.get(PERIOD_STAGE_GROUP, {}).items():
+                    for iotype, value in iotype_data.items():
+                        IO_GLOBAL_DATA[disk_name][group][iotype].append(value)
+                for stage, iotype_data in period_data[PERIOD_IODUMP].items():
+                    for iotype, value in iotype_data.items():
+                        IO_DUMP_DATA[disk_name][stage][iotype].append(value)
+                for stage, iotype_data in period_data.get(PERIOD_LAT_HIST, {}).items():
+                    for iotype, value in iotype_data.items():
+                        LAT_HIST_DATA[disk_name][stage][iotype].append(value)
+                disk_data = period_data.get(PERIOD_DISK)
+                if disk_data:
+                    DISK_DATA[disk_name]['rq_driver']['read'].append(disk_data[0])
+                    DISK_DATA[disk_name]['rq_driver']['write'].append(disk_data[1])
+                disk_hist_data = period_data.get(PERIOD_DISK_HIST)
+                if disk_hist_data:
+                    DISK_HIST_DATA[disk_name]['rq_driver']['read'].append(disk_hist_data[0])
+                    DISK_HIST_DATA[disk_name]['rq_driver']['write'].append(disk_hist_data[1])
+            for rollup in self.period_rollups:
+                rollup.end_period()
+            if self.shm_exporter:
+                self.shm_exporter.export(IO_GLOBAL_DATA, PERIOD_SEQ[0], now)
+        for listener in PERIOD_LISTENERS:
+            try:
+                listener()
+            except Exception as e:
+                logging.error("period listener failed, %s", e)
+
+    def report_collect_cost(self):
+        if not self.disk_collect_cost:
+            return
+        slowest = max(self.disk_collect_cost, key=self.disk_collect_cost.get)
+        slowest_cost = self.disk_collect_cost[slowest]
+        if slowest_cost > self.period_time:
+            logging.warning("collect %s cost %.3fs, longer than period %ss",
+                            slowest, slowest_cost, self.period_time)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("disk collect cost: %s",
+                          {disk_name: round(cost, 4) for disk_name, cost in self.disk_collect_cost.items()})
+
+    def report_cpu_usage(self):
+        """cpu time of the collector process over the last check interval, a warning if over the budget"""
+        now = time.monotonic()
+        elapsed = now - self.cpu_check_time
+        if elapsed < COLLECT_CPU_CHECK_INTERVAL:
+            return
+        cpu_time = time.process_time()
+        usage = (cpu_time - self.cpu_check_cpu_time) / elapsed
+        self.cpu_check_time = now
+        self.cpu_check_cpu_time = cpu_time
+        COLLECT_CPU_USAGE[0] = round(usage, 4)
+        if usage > COLLECT_CPU_BUDGET:
+            logging.warning("collector uses %.1f%% of a cpu, over the budget %.1f%% at period %ss",
+                            usage * 100, COLLECT_CPU_BUDGET * 100, self.period_time)
 
     def main_loop(self):
-        global IO_GLOBAL_DATA
-        global IO_DUMP_DATA
         logging.info("collect io thread start")
-        
-        if self.is_kernel_avaliable() and len(self.disk_map_stage) != 0:
-            for disk_name, stage_list in self.disk_map_stage.items():
-                for stage in stage_list:
-                    self.window_value[disk_name][stage] = []
-                    IO_GLOBAL_DATA[disk_name][stage] = {}
-                    IO_DUMP_DATA[disk_name][stage] = {}
-                    for category in Io_Category:
-                        IO_GLOBAL_DATA[disk_name][stage][category] = []
-                        IO_DUMP_DATA[disk_name][stage][category] = []
-                    self.update_io_threshold(disk_name, stage_list)
-                self.init_disk_collect(disk_name)
+        if self.collect_workers > 1:
+            self.executor = ThreadPoolExecutor(max_workers=self.collect_workers,
+                                               thread_name_prefix="collect_disk")
+            logging.info("collect disks with %d workers", self.collect_workers)
+        self.disk_watcher.open()
+        try:
+            self.collect_loop()
+        finally:
+            self.disk_watcher.close()
+            if self.executor:
+                self.executor.shutdown(wait=False)
+                self.executor = None
 
+    def collect_loop(self):
+        if self.is_kernel_avaliable():
+            timer = PeriodTimer(self.period_time)
+            missed = 0
             while True:
-                start_time = time.time()
-
                 if self.stop_event.is_set():
+                    self.close_files()
                     logging.debug("collect io thread exit")
                     return
 
-                for disk_name, stage_list in self.disk_map_stage.items():
-                    if self.get_blk_io_hierarchy(disk_name, stage_list) < 0:
-                        continue
-                    self.append_period_lat(disk_name, stage_list)
-                    self.append_disk_data(disk_name)
+                self.sync_disks(self.get_kernel_disks, self.add_kernel_disk)
+                self.publish_period(self.collect_period(self.collect_kernel_disk), missed)
+                self.report_cpu_usage()
 
-                elapsed_time = time.time() - start_time
-                sleep_time = self.period_time - elapsed_time
-                if sleep_time < 0:
-                    continue
-                while sleep_time > 1:
-                    if self.stop_event.is_set():
-                        logging.debug("collect io thread exit")
-                        return
-                    time.sleep(1)
-                    sleep_time -= 1
-                time.sleep(sleep_time)
+                missed = timer.wait(self.stop_event)
+                if missed is None:
+                    self.close_files()
+                    logging.debug("collect io thread exit")
+                    return
         elif self.is_ebpf_avaliable():
             logging.info("ebpf collector thread start")
             self.start_ebpf_subprocess()
@@ -0,0 +1,63 @@
+# coding: utf-8
+# Copyright (c) 2025 Huawei Technologies Co., Ltd.
+# sysSentry is licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+
+"""
+latency quantiles of fixed bucket histograms. a histogram of some periods is
+the sum of their bucket counts, so the memory of a histogram does not depend on
+the io num or the look-back.
+"""
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+# ebpf latency histogram, slot 0 is < 1us, slot i is [2^(i-1), 2^i) us,
+# keep in sync with LAT_HIST_SLOTS and lat_hist_slot in ebpf_collector
+LAT_HIST_SLOTS = 24
+LAT_HIST_UPPER_US = [2 ** slot for slot in range(LAT_HIST_SLOTS - 1)] + [float('inf')]
+
+
+def merge_hist(records):
+    """bucket sums of the histogram records of several periods"""
+    if not records:
+        return []
+    merged = list(records[0])
+    for record in records[1:]:
+        for index, count in enumerate(record):
+            merged[index] += count
+    return merged
+
+
+def hist_quantiles(counts, upper_bounds, quantiles=QUANTILES):
+    """
+    latency in us of each quantile, linear inside a bucket. the last bucket has no
+    upper bound, its lower bound is used. None if the histogram is empty.
+    """
+    total = sum(counts)
+    if total <= 0:
+        return None
+    result = []
+    index = 0
+    below = 0
+    for quantile in quantiles:
+        rank = quantile * total
+        while index < len(counts) - 1 and below + counts[index] < rank:
+            below += counts[index]
+            index += 1
+        lower = upper_bounds[index - 1] if index else 0
+        upper = upper_bounds[index]
+        if upper == float('inf'):
+            value = lower
+        elif counts[index] <= 0:
+            value = upper
+        else:
+            value = lower + (upper - lower) * (rank - below) / counts[index]
+        value = round(float(value), 1)
+        result.append(int(value) if value.is_integer() else value)
+    return result
@@ -0,0 +1,135 @@
+# coding: utf-8
+# Copyright (c) 2025 Huawei Technologies Co., Ltd.
+# sysSentry is licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+
+"""
+coarser rollups of the io records, each resolution has its own ring buffers.
+
+a window record of an io record with width fields is the sum, min and max of
+each field over the periods of the window, then the period count:
+  [sum * width, min * width, max * width, count]
+
+a coarser resolution that is a multiple of a finer one merges the windows of
+the finer one, so only the finest resolutions merge every period.
+"""
+from .collect_buffer import NumericRingBuffer
+
+
+def to_window(record):
+    """window record of a single period"""
+    return list(record) * 3 + [1]
+
+
+def merge_window(window, record):
+    width = len(record)
+    for index, value in enumerate(record):
+        window[index] += value
+        if value < window[width + index]:
+            window[width + index] = value
+        if value > window[2 * width + index]:
+            window[2 * width + index] = value
+    window[-1] += 1
+
+
+def merge_windows(window, other):
+    """merge the window record other into window"""
+    width = (len(window) - 1) // 3
+    for index in range(width):
+        window[index] += other[index]
+        if other[width + index] < window[width + index]:
+            window[width + index] = other[width + index]
+        if other[2 * width + index] > window[2 * width + index]:
+            window[2 * width + index] = other[2 * width + index]
+    window[-1] += other[-1]
+
+
+def select_resolution(resolutions, period, step):
+    """
+    resolutions: [(resolution, save)]. the cheapest resolution for the look-back period
+    with windows not longer than step is the coarsest of them keeping period. if none
+    keeps it or step is 0, the finest resolution keeping period, else the one keeping
+    the longest.
+    """
+    keeping = [item for item in resolutions if item[0] * item[1] >= period]
+    fine = [item for item in keeping if item[0] <= step]
+    if fine:
+        return max(fine)[0]
+    if keeping:
+        return min(keeping)[0]
+    return max(resolutions, key=lambda item: item[0] * item[1])[0]
+
+
+class Rollup():
+    """
+    window records of every steps periods, in ring buffers of save windows as
+    data[disk][stage][iotype] like IO_GLOBAL_DATA. a disk, stage or iotype gets
+    its ring buffer with its first window.
+    """
+
+    def __init__(self, resolution, steps, save):
+        self.resolution = resolution
+        self.steps = steps
+        self.save = save
+        self.data = {}
+        # (disk, stage, iotype) -> window record of the current window
+        self.pending = {}
+        self.period_num = 0
+        # rollups fed with the windows of this one, their steps are in windows of this one
+        self.coarser = []
+
+    def add_coarser(self, rollup):
+        self.coarser.append(rollup)
+
+    def add_period(self, period_io):
+        """period_io: {disk: {stage: {iotype: io record}}} of one period, called before end_period"""
+        pending = self.pending
+        for disk_name, stage_info in period_io.items():
+            for stage_name, iotype_info in stage_info.items():
+                for iotype_name, record in iotype_info.items():
+                    key = (disk_name, stage_name, iotype_name)
+                    window = pending.get(key)
+                    if window is None:
+                        pending[key] = to_window(record)
+                    else:
+                        merge_window(window, record)
+
+    def add_windows(self, windows):
+        """windows: {(disk, stage, iotype): window record} of a finer rollup, called before end_period"""
+        pending = self.pending
+        for key, window in windows.items():
+            merged = pending.get(key)
+            if merged is None:
+                pending[key] = list(window)
+            else:
+                merge_windows(merged, window)
+
+    def end_period(self):
+        """append the windows every steps periods, IO_DATA_LOCK must be held"""
+        self.period_num += 1
+        if self.period_num < self.steps:
+            return
+        self.period_num = 0
+        for (disk_name, stage_name, iotype_name), window in self.pending.items():
+            iotype_info = self.data.setdefault(disk_name, {}).setdefault(stage_name, {})
+            ring = iotype_info.get(iotype_name)
+            if ring is None:
+                ring = NumericRingBuffer(self.save, len(window))
+                iotype_info[iotype_name] = ring
+            ring.append(window)
+        for rollup in self.coarser:
+            rollup.add_windows(self.pending)
+            rollup.end_period()
+        self.pending.clear()
+
+    def remove_disk(self, disk_name):
+        """drop the windows of a removed disk, IO_DATA_LOCK must be held"""
+        self.data.pop(disk_name, None)
+        for key in [key for key in self.pending if key[0] == disk_name]:
+            del self.pending[key]
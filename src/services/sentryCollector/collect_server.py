@@ -23,28 +23,80 @@ import fcntl
 import select
 import threading
 import time
+import re
 
 from syssentry.utils import MAX_MSG_LEN
 
-from .collect_io import IO_GLOBAL_DATA, IO_CONFIG_DATA, IO_DUMP_DATA, DISK_DATA
-from .collect_config import CollectConfig
+from .collect_io import IO_GLOBAL_DATA, IO_CONFIG_DATA, IO_DUMP_DATA, DISK_DATA, DISK_HIST_DATA, IO_DATA_LOCK
+from .collect_io import register_period_listener, PERIOD_SEQ, PERIOD_TIME, PERIOD_STAMP_DATA, TOP_INDEX_DATA
+from .collect_io import ROLLUP_DATA, LAT_HIST_DATA, MISSED_PERIODS, COLLECT_CPU_USAGE, register_disk_listener
+from .collect_topk import select_top, TOP_INDEX_MAX_LEN
+from .collect_cache import ResponseCache
+from .collect_group import STAGE_GROUP_NAMES
+from .collect_rollup import select_resolution, to_window
+from .collect_quantile import LAT_HIST_UPPER_US, merge_hist, hist_quantiles
+from .collect_disk import NVME_HIST_UPPER_US
+from .collect_config import CollectConfig, PERIOD_MS_PER_SECOND, period_to_ms, ms_to_period
+from .collect_encode import is_binary_request, encode_table, encode_json, encode_msg, BIN_SECTION_TABLE, \
+    BIN_SECTION_JSON
 
 SENTRY_RUN_DIR = "/var/run/sysSentry"
 COLLECT_SOCKET_PATH = "/var/run/sysSentry/collector.sock"
 
 # socket param
-CLT_LISTEN_QUEUE_LEN = 5
+CLT_LISTEN_QUEUE_LEN = 128
 SERVER_EPOLL_TIMEOUT = 0.3
+SERVER_READ_SIZE = 64 * 1024
+# a started request or response must be finished in time, an idle connection is closed
+SERVER_RECV_TIMEOUT = 1
+SERVER_SEND_TIMEOUT = 3
+SERVER_IDLE_TIMEOUT = 600
+MAX_CONNECTION_NUM = 128
+CONN_EPOLL_EVENTS = select.EPOLLIN | select.EPOLLRDHUP
+
+# server stat, reported every SERVER_STAT_INTERVAL seconds
+SERVER_STAT_INTERVAL = 60
+STAT_REQUESTS = "requests"
+STAT_LATENCY_SUM = "latency_sum"
+STAT_LATENCY_MAX = "latency_max"
 
 # data length param
 CLT_MSG_HEAD_LEN = 9    #3+2+4
 CLT_MSG_PRO_LEN = 2
 CLT_MSG_MAGIC_LEN = 3
 CLT_MSG_LEN_LEN = 4
+# head of a request with id and its response: magic, protocol, req id, data len, 3+2+8+8
+CLM_MSG_HEAD_LEN = 21
+CLM_MSG_REQ_ID_LEN = 8
+CLM_MSG_LEN_LEN = 8
+# max data len of a response with the 4 digits len head
+RES_MSG_MAX_LEN = 10 ** CLT_MSG_LEN_LEN - 1
+
+# subscribe param
+MAX_SUBSCRIBER_NUM = 32
+# pushed data not read by a subscriber yet
+SUBSCRIBER_MAX_PENDING = 1024 * 1024
+SUBSCRIBER_NOTIFY_READ_LEN = 64
+
+# dataset names of a subscribed period, a period bundle or a binary response
+DATASET_IO = "io"
+DATASET_IODUMP = "iodump"
+DATASET_DISK = "disk"
+DATASET_DISK_HIST = "disk_hist"
 
 # data flag param
 CLT_MAGIC = "CLT"
 RES_MAGIC = "RES"
+# requests with id on a kept connection and their responses
+CLM_MAGIC = "CLM"
+RSM_MAGIC = "RSM"
+
+# bulk query param, a page ends once its data exceeds IO_PAGE_MAX_LEN
+IO_PAGE_MAX_LEN = 1024 * 1024
+IO_PAGE_DATASETS = {DATASET_IO: IO_GLOBAL_DATA, DATASET_IODUMP: IO_DUMP_DATA, DATASET_DISK: DISK_DATA}
+# latency histograms of the quantile query and their bucket bounds
+QUANTILE_DATASETS = {DATASET_IO: (LAT_HIST_DATA, LAT_HIST_UPPER_US),
+                     DATASET_DISK_HIST: (DISK_HIST_DATA, NVME_HIST_UPPER_US)}
 
 # interface protocol
 class ServerProtocol():
@@ -52,39 +104,107 @@ class ServerProtocol():
     GET_IO_DATA = 1
     GET_IODUMP_DATA = 2
     GET_DISK_DATA = 3
-    PRO_END = 4
+    GET_DISK_HIST_DATA = 4
+    SUBSCRIBE = 5
+    GET_PERIOD_BUNDLE = 6
+    GET_SERVER_STAT = 7
+    GET_IO_WINDOW = 8
+    GET_IO_SINCE = 9
+    GET_IO_PAGE = 10
+    GET_TOP_K = 11
+    GET_IO_ROLLUP = 12
+    GET_IO_QUANTILE = 13
+    GET_DISK_LIST = 14
+    PRO_END = 15
+
+# protocols whose response only depends on the request and the published period
+CACHED_PROTOCOLS = (ServerProtocol.GET_IO_DATA, ServerProtocol.GET_IODUMP_DATA, ServerProtocol.GET_DISK_DATA,
+                    ServerProtocol.GET_DISK_HIST_DATA, ServerProtocol.GET_PERIOD_BUNDLE,
+                    ServerProtocol.GET_IO_WINDOW, ServerProtocol.GET_IO_PAGE, ServerProtocol.GET_IO_ROLLUP,
+                    ServerProtocol.GET_IO_QUANTILE)
+
+
+class ClientConn():
+    """buffered state of one non-blocking client connection"""
+
+    def __init__(self, client_socket, now):
+        self.sock = client_socket
+        self.fd = client_socket.fileno()
+        self.rbuf = bytearray()
+        self.wbuf = bytearray()
+        self.last_active = now
+        # arrival time of the pending request data, None if there is none
+        self.rbuf_time = None
+        # time since the write buffer is not drained, None if it is empty
+        self.wbuf_time = None
+        # filter data_struct once the connection subscribed
+        self.subscription = None
+        # pushed messages carry the req id of the subscribe request
+        self.subscription_req_id = None
+        # sequence of the latest period pushed to the subscriber
+        self.pushed_seq = 0
+        self.events = CONN_EPOLL_EVENTS
+
 
 class CollectServer():
 
     def __init__(self):
 
         self.io_global_data = {}
+        # client connection fd: ClientConn
+        self.connections = {}
+        self.epoll_fd = None
+        self.notify_rfd = None
+        self.notify_wfd = None
+        self.stat = {STAT_REQUESTS: 0, STAT_LATENCY_SUM: 0.0, STAT_LATENCY_MAX: 0.0}
+        self.response_cache = ResponseCache()
+        self.last_timeout_check = 0
+        self.last_stat_report = 0
+        # (added, removed) disks from the collect thread, pushed with the next period
+        self.disk_events = []
+        self.disk_events_lock = threading.Lock()
 
         self.stop_event = threading.Event()
 
     @staticmethod
-    def get_io_common(data_struct, data_source):
-        result_rev = {}
+    def get_period_num(data_struct, caller):
+        """the requested period in collect periods, None if it is invalid. periods are compared in ms"""
+        period_time = period_to_ms(IO_CONFIG_DATA[0])
+        max_save = IO_CONFIG_DATA[1]
 
+        period = period_to_ms(data_struct['period'])
+        if period is None or (period < period_time) or (period > period_time * max_save) or (period % period_time):
+            logging.error("%s: period time is invalid, user period: %s, config period_time: %s",
+                          caller, data_struct['period'], IO_CONFIG_DATA[0])
+            return None
+        return period // period_time
+
+    @staticmethod
+    def get_collect_index(data_struct):
+        """index of the requested period in the ring buffers, None if it is invalid"""
         if len(IO_CONFIG_DATA) == 0:
             logging.error("the collect thread is not started, the data is invalid.")
-            return json.dumps(result_rev)
-        period_time = IO_CONFIG_DATA[0]
-        max_save = IO_CONFIG_DATA[1]
+            return None
+        period_num = CollectServer.get_period_num(data_struct, "get_io_common")
+        if period_num is None:
+            return None
 
-        period = int(data_struct['period'])
+        collect_index = period_num - 1
+        logging.debug("user period: %s, config period_time: %s,  collect_index: %d",
+                      data_struct['period'], IO_CONFIG_DATA[0], collect_index)
+        return collect_index
+
+    @staticmethod
+    def collect_common(data_struct, data_source, collect_index, window=None):
+        """
+        filter one data source by disk, stage and iotype, IO_DATA_LOCK must be held.
+        with window, each value is the list of up to window periods from collect_index on, the oldest first.
+        """
+        result_rev = {}
         disk_list = json.loads(data_struct['disk_list'])
         stage_list = json.loads(data_struct['stage'])
         iotype_list = json.loads(data_struct['iotype'])
 
-        if (period < period_time) or (period > period_time * max_save) or (period % period_time):
-            logging.error("get_io_common: period time is invalid, user period: %d, config period_time: %d",
-                           period, period_time)
-            return json.dumps(result_rev)
-
-        collect_index = period // period_time - 1
-        logging.debug("user period: %d, config period_time: %d,  collect_index: %d", period, period_time, collect_index)
-
         for disk_name, stage_info in data_source.items():
             if disk_name not in disk_list:
                 continue
@@ -96,12 +216,250 @@ class CollectServer():
                 for iotype_name, iotype_data in iotype_info.items():
                     if iotype_name not in iotype_list:
                         continue
-                    if len(iotype_data) - 1 < collect_index:
+                    # iotype_data is a ring buffer, index by age, 0 is the latest period
+                    if window is None:
+                        collect_value = iotype_data.get(collect_index)
+                    else:
+                        collect_value = iotype_data.window(collect_index, window) or None
+                    if collect_value is None:
                         continue
-                    result_rev[disk_name][stage_name][iotype_name] = iotype_data[collect_index]
+                    result_rev[disk_name][stage_name][iotype_name] = collect_value
+        return result_rev
 
+    @staticmethod
+    def get_io_common(data_struct, data_source, dataset=None):
+        """dataset: name of a numeric data source, it is encoded as a table if the request asks for binary"""
+        collect_index = CollectServer.get_collect_index(data_struct)
+        if collect_index is None:
+            return json.dumps({})
+
+        # all values of the response come from the same published period
+        with IO_DATA_LOCK:
+            if dataset and is_binary_request(data_struct):
+                return encode_msg([(BIN_SECTION_TABLE, dataset,
+                                    encode_table(data_struct, data_source, collect_index))])
+            result_rev = CollectServer.collect_common(data_struct, data_source, collect_index)
         return json.dumps(result_rev)
 
+    @staticmethod
+    def get_period_datasets(data_struct, max_len=MAX_MSG_LEN):
+        """io, iodump and disk data of one period, all taken under one lock, iodump is dropped beyond max_len"""
+        collect_index = CollectServer.get_collect_index(data_struct)
+        if collect_index is None:
+            return json.dumps({})
+
+        binary = is_binary_request(data_struct)
+        with IO_DATA_LOCK:
+            iodump_data = CollectServer.collect_common(data_struct, IO_DUMP_DATA, collect_index)
+            if binary:
+                sections = [
+                    (BIN_SECTION_TABLE, DATASET_IO, encode_table(data_struct, IO_GLOBAL_DATA, collect_index)),
+                    (BIN_SECTION_JSON, DATASET_IODUMP, encode_json(iodump_data)),
+                    (BIN_SECTION_TABLE, DATASET_DISK, encode_table(data_struct, DISK_DATA, collect_index))
+                ]
+            else:
+                result_rev = {
+                    DATASET_IO: CollectServer.collect_common(data_struct, IO_GLOBAL_DATA, collect_index),
+                    DATASET_IODUMP: iodump_data,
+                    DATASET_DISK: CollectServer.collect_common(data_struct, DISK_DATA, collect_index)
+                }
+        res_data = encode_msg(sections) if binary else json.dumps(result_rev)
+        if len(res_data) > max_len:
+            # iodump is only detail for the alarm, keep io and disk data in the msg len limit
+            logging.warning("period datasets len %d exceeds the msg len limit, drop iodump data", len(res_data))
+            if binary:
+                sections[1] = (BIN_SECTION_JSON, DATASET_IODUMP, encode_json({}))
+                res_data = encode_msg(sections)
+            else:
+                result_rev[DATASET_IODUMP] = {}
+                res_data = json.dumps(result_rev)
+        return res_data
+
+    @staticmethod
+    def get_window_common(data_struct, data_source):
+        """the latest periods of each disk, stage and iotype, up to the window before the requested period"""
+        collect_index = CollectServer.get_collect_index(data_struct)
+        if collect_index is None:
+            return json.dumps({})
+        window = int(data_struct['window'])
+        if window <= 0:
+            logging.error("get_window_common: window is invalid, user window: %d", window)
+            return json.dumps({})
+
+        with IO_DATA_LOCK:
+            result_rev = CollectServer.collect_common(data_struct, data_source, collect_index, window)
+        return json.dumps(result_rev)
+
+    @staticmethod
+    def get_since_common(data_struct, data_source):
+        """
+        the periods published after sequence since, with the (sequence, time, interval, missed) stamp
+        of each period.
+        only the latest sequence is replied if there is no new period.
+        """
+        since = int(data_struct['since'])
+        disk_list = json.loads(data_struct['disk_list'])
+
+        with IO_DATA_LOCK:
+            seq = PERIOD_SEQ[0]
+            if since > seq:
+                # the sequence is from a previous collector run
+                since = 0
+            if since == seq:
+                return json.dumps({"seq": seq, "time": PERIOD_TIME[0]})
+
+            result_rev = {}
+            stamps = {}
+            for disk_name, stamp_data in PERIOD_STAMP_DATA.items():
+                if disk_name not in disk_list:
+                    continue
+                new_num = 0
+                while new_num < len(stamp_data) and stamp_data[new_num][0] > since:
+                    new_num += 1
+                if new_num == 0:
+                    continue
+                stamps[disk_name] = stamp_data.window(0, new_num)
+                disk_struct = dict(data_struct, disk_list=json.dumps([disk_name]))
+                result_rev.update(CollectServer.collect_common(disk_struct, data_source, 0, new_num))
+        return json.dumps({"seq": seq, "time": PERIOD_TIME[0], "stamps": stamps, "data": result_rev})
+
+    @staticmethod
+    def get_page_common(data_struct):
+        """
+        datasets of the disks matching disk_pattern and disk_list (all disks if empty),
+        one page of them in disk name order after the cursor disk. next is the cursor
+        of the following page, "" after the last page.
+        """
+        collect_index = CollectServer.get_collect_index(data_struct)
+        if collect_index is None:
+            return json.dumps({})
+        try:
+            pattern = re.compile(data_struct.get('disk_pattern') or '.*')
+        except re.error:
+            logging.error("get_page_common: disk pattern is invalid")
+            return json.dumps({})
+        disk_list = json.loads(data_struct['disk_list'])
+        datasets = json.loads(data_struct.get('datasets', json.dumps([DATASET_IO])))
+        if not datasets or any(dataset not in IO_PAGE_DATASETS for dataset in datasets):
+            logging.error("get_page_common: datasets %s is invalid", datasets)
+            return json.dumps({})
+        cursor = data_struct.get('cursor', '')
+
+        result_rev = {dataset: {} for dataset in datasets}
+        page_len = 0
+        last_disk = ""
+        with IO_DATA_LOCK:
+            seq = PERIOD_SEQ[0]
+            disk_names = sorted(disk_name for disk_name in IO_GLOBAL_DATA
+                                if disk_name > cursor and pattern.fullmatch(disk_name)
+                                and (not disk_list or disk_name in disk_list))
+            for disk_name in disk_names:
+                disk_struct = dict(data_struct, disk_list=json.dumps([disk_name]))
+                disk_data = {dataset: CollectServer.collect_common(disk_struct, IO_PAGE_DATASETS[dataset], collect_index)
+                             for dataset in datasets}
+                disk_len = len(json.dumps(disk_data))
+                if page_len > 0 and page_len + disk_len > IO_PAGE_MAX_LEN:
+                    break
+                for dataset, dataset_data in disk_data.items():
+                    result_rev[dataset].update(dataset_data)
+                page_len += disk_len
+                last_disk = disk_name
+            next_disk = last_disk if disk_names and last_disk != disk_names[-1] else ""
+        return json.dumps({"seq": seq, "next": next_disk, "data": result_rev})
+
+    @staticmethod
+    def get_top_k(data_struct):
+        """[[disk, stage, iotype, value], ...] of the k greatest values of the metric in the requested period"""
+        collect_index = CollectServer.get_collect_index(data_struct)
+        if collect_index is None:
+            return json.dumps([])
+        metric = data_struct['metric']
+        k = int(data_struct['k'])
+        if metric not in TOP_INDEX_DATA or k <= 0 or k > TOP_INDEX_MAX_LEN:
+            logging.error("get_top_k: metric %s or k %d is invalid", metric, k)
+            return json.dumps([])
+        stage_list = json.loads(data_struct.get('stage', '[]'))
+        iotype_list = json.loads(data_struct.get('iotype', '[]'))
+
+        with IO_DATA_LOCK:
+            entries = TOP_INDEX_DATA[metric].get(collect_index, [])
+            result_rev = select_top(entries, k, stage_list, iotype_list)
+        return json.dumps(result_rev)
+
+    @staticmethod
+    def get_io_rollup(data_struct):
+        """
+        {"resolution": seconds, "data": {disk: {stage: {iotype: [window record, ...]}}}} of the
+        look-back period, the oldest window first, see collect_rollup. the resolution is chosen
+        by select_resolution among the raw periods and the rollups, a raw period is a window of one.
+        """
+        if len(IO_CONFIG_DATA) == 0:
+            logging.error("the collect thread is not started, the data is invalid.")
+            return json.dumps({})
+        # in ms like the resolutions
+        period = period_to_ms(data_struct['period'])
+        step = period_to_ms(data_struct.get('step', 0))
+        if period is None or step is None or period <= 0 or step < 0:
+            logging.error("get_io_rollup: period %s or step %s is invalid",
+                          data_struct['period'], data_struct.get('step', 0))
+            return json.dumps({})
+
+        period_time = period_to_ms(IO_CONFIG_DATA[0])
+        max_save = IO_CONFIG_DATA[1]
+        resolutions = [(period_time, max_save)]
+        resolutions += [(resolution * PERIOD_MS_PER_SECOND, rollup.save) for resolution, rollup in ROLLUP_DATA.items()]
+        resolution_ms = select_resolution(resolutions, period, step)
+        window = -(-period // resolution_ms)
+        resolution = ms_to_period(resolution_ms)
+
+        with IO_DATA_LOCK:
+            if resolution_ms != period_time:
+                result_rev = CollectServer.collect_common(data_struct, ROLLUP_DATA[resolution].data, 0, window)
+            else:
+                result_rev = CollectServer.collect_common(data_struct, IO_GLOBAL_DATA, 0, window)
+                for stage_info in result_rev.values():
+                    for iotype_info in stage_info.values():
+                        for iotype_name, records in iotype_info.items():
+                            iotype_info[iotype_name] = [to_window(record) for record in records]
+        return json.dumps({"resolution": resolution, "data": result_rev})
+
+    @staticmethod
+    def get_io_quantile(data_struct):
+        """
+        {disk: {stage: {iotype: [p50, p90, p99, p999, io num]}}} in us of the latency histograms
+        of up to window periods before the requested period, the ebpf histograms of the io
+        dataset or the nvme histograms of the disk_hist dataset.
+        """
+        collect_index = CollectServer.get_collect_index(data_struct)
+        if collect_index is None:
+            return json.dumps({})
+        window = int(data_struct.get('window', 1))
+        dataset = data_struct.get('dataset', DATASET_IO)
+        if window <= 0 or dataset not in QUANTILE_DATASETS:
+            logging.error("get_io_quantile: window %d or dataset %s is invalid", window, dataset)
+            return json.dumps({})
+        data_source, upper_bounds = QUANTILE_DATASETS[dataset]
+
+        with IO_DATA_LOCK:
+            result_rev = CollectServer.collect_common(data_struct, data_source, collect_index, window)
+        for stage_info in result_rev.values():
+            for iotype_info in stage_info.values():
+                for iotype_name, records in list(iotype_info.items()):
+                    counts = merge_hist(records)
+                    quantiles = hist_quantiles(counts, upper_bounds)
+                    if quantiles is None:
+                        del iotype_info[iotype_name]
+                        continue
+                    iotype_info[iotype_name] = quantiles + [sum(counts)]
+        return json.dumps(result_rev)
+
+    @staticmethod
+    def get_disk_list():
+        """names of the disks being collected"""
+        with IO_DATA_LOCK:
+            disks = sorted(IO_GLOBAL_DATA)
+        return json.dumps({"disks": disks})
+
     def is_iocollect_valid(self, data_struct):
 
         result_rev = {}
@@ -111,38 +469,52 @@ class CollectServer():
             logging.error("the collect thread is not started, the data is invalid.")
             return json.dumps(result_rev)
 
-        period_time = IO_CONFIG_DATA[0]
-        max_save = IO_CONFIG_DATA[1]
-
         disk_list = json.loads(data_struct['disk_list'])
-        period = int(data_struct['period'])
         stage_list = json.loads(data_struct['stage'])
 
-        if (period < period_time) or (period > period_time * max_save) or (period % period_time):
-            logging.error("is_iocollect_valid: period time is invalid, user period: %d, config period_time: %d", period, period_time)
+        if self.get_period_num(data_struct, "is_iocollect_valid") is None:
             return json.dumps(result_rev)
 
-        for disk_name, stage_info in self.io_global_data.items():
-            if len(disk_list) > 0 and disk_name not in disk_list:
-                continue
-            result_rev[disk_name] = []
-            if len(stage_list) == 0:
-                result_rev[disk_name] = list(stage_info.keys())
-                continue
-            for stage_name, stage_data in stage_info.items():
-                if stage_name in stage_list:
-                    result_rev[disk_name].append(stage_name)
+        # disks are added and removed by the collect thread
+        with IO_DATA_LOCK:
+            for disk_name, stage_info in self.io_global_data.items():
+                if len(disk_list) > 0 and disk_name not in disk_list:
+                    continue
+                result_rev[disk_name] = []
+                if len(stage_list) == 0:
+                    # virtual stages are listed only when asked for by name
+                    result_rev[disk_name] = [stage_name for stage_name in stage_info
+                                             if stage_name not in STAGE_GROUP_NAMES]
+                    continue
+                for stage_name, stage_data in stage_info.items():
+                    if stage_name in stage_list:
+                        result_rev[disk_name].append(stage_name)
 
         return json.dumps(result_rev)
 
     def get_io_data(self, data_struct):
-        return self.get_io_common(data_struct, IO_GLOBAL_DATA)
+        return self.get_io_common(data_struct, IO_GLOBAL_DATA, DATASET_IO)
 
     def get_iodump_data(self, data_struct):
         return self.get_io_common(data_struct, IO_DUMP_DATA)
 
     def get_disk_data(self, data_struct):
-        return self.get_io_common(data_struct, DISK_DATA)
+        return self.get_io_common(data_struct, DISK_DATA, DATASET_DISK)
+
+    def get_disk_hist_data(self, data_struct):
+        return self.get_io_common(data_struct, DISK_HIST_DATA, DATASET_DISK_HIST)
+
+    def get_period_bundle(self, data_struct):
+        return self.get_period_datasets(data_struct)
+
+    def get_io_window(self, data_struct):
+        return self.get_window_common(data_struct, IO_GLOBAL_DATA)
+
+    def get_io_since(self, data_struct):
+        return self.get_since_common(data_struct, IO_GLOBAL_DATA)
+
+    def get_io_page(self, data_struct):
+        return self.get_page_common(data_struct)
 
     def msg_data_process(self, msg_data, protocal_id):
         """message data process"""
@@ -154,21 +526,71 @@ class CollectServer():
             logging.error("msg data process: json decode error")
             return "Request message decode failed"
 
-        if protocal_id == ServerProtocol.IS_IOCOLLECT_VALID:
-            res_msg = self.is_iocollect_valid(data_struct)
-        elif protocal_id == ServerProtocol.GET_IO_DATA:
-            res_msg = self.get_io_data(data_struct)
-        elif protocal_id == ServerProtocol.GET_IODUMP_DATA:
-            res_msg = self.get_iodump_data(data_struct)
-        elif protocal_id == ServerProtocol.GET_DISK_DATA:
-            res_msg = self.get_disk_data(data_struct)
-
+        try:
+            # the same query in the same period gets the same response
+            cache_key = None
+            if protocal_id in CACHED_PROTOCOLS:
+                cache_key = ResponseCache.make_key(protocal_id, data_struct)
+            if cache_key is not None:
+                seq = PERIOD_SEQ[0]
+                res_msg = self.response_cache.get(cache_key, seq)
+                if res_msg is not None:
+                    return res_msg
+
+            if protocal_id == ServerProtocol.IS_IOCOLLECT_VALID:
+                res_msg = self.is_iocollect_valid(data_struct)
+            elif protocal_id == ServerProtocol.GET_IO_DATA:
+                res_msg = self.get_io_data(data_struct)
+            elif protocal_id == ServerProtocol.GET_IODUMP_DATA:
+                res_msg = self.get_iodump_data(data_struct)
+            elif protocal_id == ServerProtocol.GET_DISK_DATA:
+                res_msg = self.get_disk_data(data_struct)
+            elif protocal_id == ServerProtocol.GET_DISK_HIST_DATA:
+                res_msg = self.get_disk_hist_data(data_struct)
+            elif protocal_id == ServerProtocol.GET_PERIOD_BUNDLE:
+                res_msg = self.get_period_bundle(data_struct)
+            elif protocal_id == ServerProtocol.GET_IO_WINDOW:
+                res_msg = self.get_io_window(data_struct)
+            elif protocal_id == ServerProtocol.GET_IO_SINCE:
+                res_msg = self.get_io_since(data_struct)
+            elif protocal_id == ServerProtocol.GET_IO_PAGE:
+                res_msg = self.get_io_page(data_struct)
+            elif protocal_id == ServerProtocol.GET_TOP_K:
+                res_msg = self.get_top_k(data_struct)
+            elif protocal_id == ServerProtocol.GET_IO_ROLLUP:
+                res_msg = self.get_io_rollup(data_struct)
+            elif protocal_id == ServerProtocol.GET_IO_QUANTILE:
+                res_msg = self.get_io_quantile(data_struct)
+            elif protocal_id == ServerProtocol.GET_SERVER_STAT:
+                res_msg = json.dumps(self.get_server_stat())
+            elif protocal_id == ServerProtocol.GET_DISK_LIST:
+                res_msg = self.get_disk_list()
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            # a well-formed request with a missing or bad field still gets a reply
+            logging.error("msg data process: invalid request of protocol %d, %r", protocal_id, e)
+            return json.dumps({})
+
+        if cache_key is not None:
+            if isinstance(res_msg, str):
+                res_msg = res_msg.encode()
+            self.response_cache.put(cache_key, seq, res_msg)
         return res_msg
 
     def msg_head_process(self, msg_head):
-        """message head process"""
+        """message head process, return [protocol_id, data_len, req_id], req_id is None for CLT_MAGIC"""
         ctl_magic = msg_head[:CLT_MSG_MAGIC_LEN]
-        if ctl_magic != CLT_MAGIC:
+        if ctl_magic == CLT_MAGIC:
+            req_id = None
+            data_len_start = CLT_MSG_MAGIC_LEN + CLT_MSG_PRO_LEN
+        elif ctl_magic == CLM_MAGIC:
+            req_id_str = msg_head[CLT_MSG_MAGIC_LEN+CLT_MSG_PRO_LEN:CLM_MSG_HEAD_LEN-CLM_MSG_LEN_LEN]
+            try:
+                req_id = int(req_id_str)
+            except ValueError:
+                logging.error("recv msg req id is invalid")
+                return None
+            data_len_start = CLM_MSG_HEAD_LEN - CLM_MSG_LEN_LEN
+        else:
             logging.error("recv msg head magic invalid")
             return None
 
@@ -179,79 +601,310 @@ class CollectServer():
             logging.error("recv msg protocol id is invalid")
             return None
 
-        data_len_str = msg_head[CLT_MSG_MAGIC_LEN+CLT_MSG_PRO_LEN:CLT_MSG_HEAD_LEN]
+        data_len_str = msg_head[data_len_start:]
         try:
             data_len = int(data_len_str)
         except ValueError:
             logging.error("recv msg data len is invalid %s", data_len_str)
             return None
 
-        return [protocol_id, data_len]
+        return [protocol_id, data_len, req_id]
 
-    def server_recv(self, server_socket: socket.socket):
-        """server receive"""
-        try:
-            client_socket, _ = server_socket.accept()
-            logging.debug("server_fd listen ok")
-        except socket.error:
-            logging.error("server accept failed, %s", socket.error)
-            return
+    def server_accept(self, server_socket: socket.socket):
+        """accept all pending client connections, they are kept for the following requests"""
+        while True:
+            try:
+                client_socket, _ = server_socket.accept()
+                logging.debug("server_fd listen ok")
+            except BlockingIOError:
+                return
+            except socket.error as e:
+                logging.error("server accept failed, %s", e)
+                return
 
-        try:
-            msg_head = client_socket.recv(CLT_MSG_HEAD_LEN)
-            logging.debug("recv msg head: %s", msg_head.decode())
-            head_info = self.msg_head_process(msg_head.decode())
-        except (OSError, UnicodeError):
-            client_socket.close()
-            logging.error("server recv HEAD failed")
+            if len(self.connections) >= MAX_CONNECTION_NUM:
+                logging.error("connection num exceeds %d", MAX_CONNECTION_NUM)
+                client_socket.close()
+                continue
+            client_socket.setblocking(False)
+            conn = ClientConn(client_socket, time.monotonic())
+            self.connections[conn.fd] = conn
+            self.epoll_fd.register(conn.fd, conn.events)
+
+    def close_connection(self, fd):
+        conn = self.connections.pop(fd, None)
+        if conn is None:
             return
+        if conn.subscription is not None:
+            logging.info("remove subscriber %d, subscriber num: %d", fd, self.subscriber_num())
+        try:
+            self.epoll_fd.unregister(fd)
+        except OSError:
+            pass
+        conn.sock.close()
 
-        protocol_id = head_info[0]
-        data_len = head_info[1]
-        logging.debug("msg protocol id: %d, data length: %d", protocol_id, data_len)
-        if protocol_id >= ServerProtocol.PRO_END:
-            client_socket.close()
-            logging.error("protocol id is invalid")
-            return
+    def subscriber_num(self):
+        return sum(1 for conn in self.connections.values() if conn.subscription is not None)
 
-        if data_len < 0:
-            client_socket.close()
-            logging.error("msg head parse failed")
+    def conn_read(self, conn):
+        """read all available data of a connection and serve the complete requests in it"""
+        now = time.monotonic()
+        while True:
+            try:
+                data = conn.sock.recv(SERVER_READ_SIZE)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                logging.error("server recv failed, %s", e)
+                self.close_connection(conn.fd)
+                return
+            if not data:
+                # the client is done with the connection
+                self.close_connection(conn.fd)
+                return
+            if not conn.rbuf:
+                conn.rbuf_time = now
+            conn.rbuf += data
+            if len(conn.rbuf) > CLM_MSG_HEAD_LEN + MAX_MSG_LEN:
+                logging.error("socket recv data is illegal:%d", len(conn.rbuf))
+                self.close_connection(conn.fd)
+                return
+        conn.last_active = now
+
+        if not self.conn_process(conn, now):
+            self.close_connection(conn.fd)
             return
+        self.conn_flush(conn)
 
-        try:
-            if data_len > MAX_MSG_LEN:
-                client_socket.close()
+    def conn_process(self, conn, now):
+        """serve the complete requests in the read buffer, False if the connection must be closed"""
+        while len(conn.rbuf) >= CLT_MSG_MAGIC_LEN:
+            try:
+                magic = conn.rbuf[:CLT_MSG_MAGIC_LEN].decode()
+                head_len = CLM_MSG_HEAD_LEN if magic == CLM_MAGIC else CLT_MSG_HEAD_LEN
+                if len(conn.rbuf) < head_len:
+                    break
+                msg_head = conn.rbuf[:head_len].decode()
+            except UnicodeError:
+                logging.error("server recv HEAD failed")
+                return False
+            logging.debug("recv msg head: %s", msg_head)
+            head_info = self.msg_head_process(msg_head)
+            if head_info is None:
+                return False
+            protocol_id, data_len, req_id = head_info
+            if protocol_id >= ServerProtocol.PRO_END:
+                logging.error("protocol id is invalid")
+                return False
+            if data_len < 0 or data_len > MAX_MSG_LEN:
                 logging.error("socket recv data is illegal:%d", data_len)
+                return False
+            if len(conn.rbuf) < head_len + data_len:
+                break
+
+            try:
+                msg_data_decode = conn.rbuf[head_len:head_len + data_len].decode()
+            except UnicodeError:
+                logging.error("server recv MSG failed")
+                return False
+            del conn.rbuf[:head_len + data_len]
+            logging.debug("msg protocol id: %d, data length: %d, req id: %s", protocol_id, data_len, req_id)
+
+            if protocol_id == ServerProtocol.SUBSCRIBE:
+                if not self.add_subscriber(conn, msg_data_decode, req_id):
+                    return False
+            else:
+                res_data = self.msg_data_process(msg_data_decode, protocol_id)
+                logging.debug("res data %s", res_data)
+                conn.wbuf += self.build_res_msg(protocol_id, res_data, req_id)
+            self.record_latency(time.monotonic() - conn.rbuf_time)
+            # the rest of the buffer arrived with the last read
+            conn.rbuf_time = now
+        if not conn.rbuf:
+            conn.rbuf_time = None
+        return True
+
+    def conn_flush(self, conn):
+        """send as much of the write buffer as the socket takes, wait for EPOLLOUT for the rest"""
+        while conn.wbuf:
+            try:
+                sent = conn.sock.send(conn.wbuf)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                logging.error("server send failed, %s", e)
+                self.close_connection(conn.fd)
                 return
-            msg_data = client_socket.recv(data_len)
-            msg_data_decode = msg_data.decode()
-            logging.debug("msg data %s", msg_data_decode)
-        except (OSError, UnicodeError):
-            client_socket.close()
-            logging.error("server recv MSG failed")
+            del conn.wbuf[:sent]
+
+        if conn.wbuf:
+            if conn.wbuf_time is None:
+                conn.wbuf_time = time.monotonic()
+            events = CONN_EPOLL_EVENTS | select.EPOLLOUT
+        else:
+            conn.wbuf_time = None
+            events = CONN_EPOLL_EVENTS
+        if events != conn.events:
+            conn.events = events
+            self.epoll_fd.modify(conn.fd, events)
+
+    def check_timeout(self, now):
+        """close the connections with a stalled request or response, or idle too long"""
+        if now - self.last_timeout_check < SERVER_EPOLL_TIMEOUT:
             return
+        self.last_timeout_check = now
+        for fd, conn in list(self.connections.items()):
+            if conn.rbuf_time is not None and now - conn.rbuf_time > SERVER_RECV_TIMEOUT:
+                logging.warning("connection %d recv request timeout", fd)
+            elif conn.wbuf_time is not None and now - conn.wbuf_time > SERVER_SEND_TIMEOUT:
+                logging.warning("connection %d send response timeout", fd)
+            elif conn.subscription is None and now - conn.last_active > SERVER_IDLE_TIMEOUT:
+                logging.debug("connection %d is idle", fd)
+            else:
+                continue
+            self.close_connection(fd)
+
+    def record_latency(self, latency):
+        self.stat[STAT_REQUESTS] += 1
+        self.stat[STAT_LATENCY_SUM] += latency
+        self.stat[STAT_LATENCY_MAX] = max(self.stat[STAT_LATENCY_MAX], latency)
+
+    def get_server_stat(self):
+        requests = self.stat[STAT_REQUESTS]
+        latency_avg = self.stat[STAT_LATENCY_SUM] / requests if requests else 0
+        return {
+            "clients": len(self.connections),
+            "subscribers": self.subscriber_num(),
+            "requests": requests,
+            "latency_avg_ms": round(latency_avg * 1000, 3),
+            "latency_max_ms": round(self.stat[STAT_LATENCY_MAX] * 1000, 3),
+            "cache_hits": self.response_cache.hits,
+            "cache_misses": self.response_cache.misses,
+            "missed_periods": MISSED_PERIODS[0],
+            "cpu_usage": COLLECT_CPU_USAGE[0]
+        }
+
+    def report_server_stat(self, now):
+        if now - self.last_stat_report < SERVER_STAT_INTERVAL:
+            return
+        self.last_stat_report = now
+        logging.info("collect server stat: %s", self.get_server_stat())
 
-        res_data = self.msg_data_process(msg_data_decode, protocol_id)
-        logging.debug("res data %s", res_data)
-
-        # server send
-        res_head = RES_MAGIC
+    @staticmethod
+    def build_res_msg(protocol_id, res_data, req_id=None):
+        """res_data is a json str or an encoded binary message"""
+        if isinstance(res_data, str):
+            res_data = res_data.encode()
+        max_len = RES_MSG_MAX_LEN if req_id is None else MAX_MSG_LEN
+        if len(res_data) > max_len:
+            logging.error("res data len %d exceeds the msg len limit, query less disks", len(res_data))
+            res_data = json.dumps({}).encode()
+
+        res_head = RES_MAGIC if req_id is None else RSM_MAGIC
         res_head += str(protocol_id).zfill(CLT_MSG_PRO_LEN)
-        res_data_len = str(len(res_data)).zfill(CLT_MSG_LEN_LEN)
+        if req_id is None:
+            res_data_len = str(len(res_data)).zfill(CLT_MSG_LEN_LEN)
+        else:
+            res_head += str(req_id).zfill(CLM_MSG_REQ_ID_LEN)
+            res_data_len = str(len(res_data)).zfill(CLM_MSG_LEN_LEN)
         res_head += res_data_len
         logging.debug("res head %s", res_head)
 
-        res_msg = res_head + res_data
+        res_msg = res_head.encode() + res_data
         logging.debug("res msg %s", res_msg)
+        return res_msg
 
+    def add_subscriber(self, conn, msg_data, req_id):
+        """the data of each new period is pushed to the connection, False if the subscription is invalid"""
         try:
-            client_socket.send(res_msg.encode())
-        except OSError:
-            logging.error("server recv failed")
-        finally:
-            client_socket.close()
-        return
+            data_struct = json.loads(msg_data)
+            for key in ('disk_list', 'stage', 'iotype'):
+                json.loads(data_struct[key])
+        except (json.JSONDecodeError, KeyError, TypeError):
+            logging.error("subscribe msg data is invalid")
+            return False
+        if conn.subscription is None and self.subscriber_num() >= MAX_SUBSCRIBER_NUM:
+            logging.error("subscriber num exceeds %d", MAX_SUBSCRIBER_NUM)
+            return False
+
+        # the first message is the latest period, it also acks the subscription
+        max_len = RES_MSG_MAX_LEN if req_id is None else MAX_MSG_LEN
+        res_data = json.dumps({})
+        if len(IO_CONFIG_DATA) != 0:
+            data_struct['period'] = IO_CONFIG_DATA[0]
+            res_data = self.get_period_datasets(data_struct, max_len)
+        conn.wbuf += self.build_res_msg(ServerProtocol.SUBSCRIBE, res_data, req_id)
+        conn.subscription = data_struct
+        conn.subscription_req_id = req_id
+        conn.pushed_seq = PERIOD_SEQ[0]
+        logging.info("add subscriber %d, subscriber num: %d", conn.fd, self.subscriber_num())
+        return True
+
+    def notify_period(self):
+        """called in the collect thread after a period is published, wake up server_loop"""
+        if self.notify_wfd is None:
+            return
+        try:
+            os.write(self.notify_wfd, b'\0')
+        except BlockingIOError:
+            # a wake up is already pending
+            pass
+
+    def notify_disks(self, added, removed):
+        """called in the collect thread after the disks change, pushed before the next period"""
+        with self.disk_events_lock:
+            self.disk_events.append((added, removed))
+        self.notify_period()
+
+    def push_disk_events(self):
+        """push the disk changes to the subscribers asking for them, before the period of the new disks"""
+        with self.disk_events_lock:
+            disk_events = self.disk_events
+            self.disk_events = []
+        if not disk_events:
+            return
+        disks = json.loads(self.get_disk_list())["disks"]
+        for added, removed in disk_events:
+            res_data = json.dumps({"added": added, "removed": removed, "disks": disks})
+            for conn in list(self.connections.values()):
+                if conn.subscription is None or not conn.subscription.get('disk_event'):
+                    continue
+                conn.wbuf += self.build_res_msg(ServerProtocol.GET_DISK_LIST, res_data, conn.subscription_req_id)
+                self.conn_flush(conn)
+
+    def push_period(self):
+        """push the latest period to all subscribers"""
+        try:
+            os.read(self.notify_rfd, SUBSCRIBER_NOTIFY_READ_LEN)
+        except BlockingIOError:
+            pass
+        self.push_disk_events()
+        if len(IO_CONFIG_DATA) == 0:
+            return
+
+        # subscribers with the same filter share one response
+        res_cache = {}
+        seq = PERIOD_SEQ[0]
+        for fd, conn in list(self.connections.items()):
+            data_struct = conn.subscription
+            # woken up by disk events only
+            if data_struct is None or conn.pushed_seq == seq:
+                continue
+            if len(conn.wbuf) > SUBSCRIBER_MAX_PENDING:
+                logging.warning("subscriber %d does not read the pushed data, drop it", fd)
+                self.close_connection(fd)
+                continue
+            data_struct['period'] = IO_CONFIG_DATA[0]
+            req_id = conn.subscription_req_id
+            filter_key = (data_struct['disk_list'], data_struct['stage'], data_struct['iotype'],
+                          data_struct.get('encoding'), req_id)
+            if filter_key not in res_cache:
+                max_len = RES_MSG_MAX_LEN if req_id is None else MAX_MSG_LEN
+                res_cache[filter_key] = self.build_res_msg(ServerProtocol.SUBSCRIBE,
+                                                           self.get_period_datasets(data_struct, max_len), req_id)
+            conn.wbuf += res_cache[filter_key]
+            conn.pushed_seq = seq
+            self.conn_flush(conn)
 
     def server_fd_create(self):
         """create server fd"""
@@ -281,24 +934,52 @@ class CollectServer():
         if not server_fd:
             return
 
-        epoll_fd = select.epoll()
-        epoll_fd.register(server_fd.fileno(), select.EPOLLIN)
+        self.epoll_fd = select.epoll()
+        self.epoll_fd.register(server_fd.fileno(), select.EPOLLIN)
+        self.notify_rfd, self.notify_wfd = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+        self.epoll_fd.register(self.notify_rfd, select.EPOLLIN)
+        register_period_listener(self.notify_period)
+        register_disk_listener(self.notify_disks)
+        self.last_timeout_check = self.last_stat_report = time.monotonic()
 
         logging.debug("start server_loop loop")
         while True:
             if self.stop_event.is_set():
                 logging.debug("collect listen thread exit")
+                self.server_close()
                 server_fd = None
                 return
             try:
-                events_list = epoll_fd.poll(SERVER_EPOLL_TIMEOUT)
-                for event_fd, _ in events_list:
+                events_list = self.epoll_fd.poll(SERVER_EPOLL_TIMEOUT)
+                for event_fd, events in events_list:
                     if event_fd == server_fd.fileno():
-                        self.server_recv(server_fd)
+                        self.server_accept(server_fd)
+                    elif event_fd == self.notify_rfd:
+                        self.push_period()
+                    elif event_fd in self.connections:
+                        conn = self.connections[event_fd]
+                        if events & select.EPOLLOUT:
+                            self.conn_flush(conn)
+                        if events & ~select.EPOLLOUT and event_fd in self.connections:
+                            self.conn_read(conn)
                     else:
                         continue
+                now = time.monotonic()
+                self.check_timeout(now)
+                self.report_server_stat(now)
             except Exception:
                 logging.error('collect listen exception : %s', traceback.format_exc())
 
+    def server_close(self):
+        for fd in list(self.connections):
+            self.close_connection(fd)
+        notify_wfd = self.notify_wfd
+        self.notify_wfd = None
+        for fd in (self.notify_rfd, notify_wfd):
+            if fd is not None:
+                os.close(fd)
+        self.notify_rfd = None
+        self.epoll_fd.close()
+
     def stop_thread(self):
         self.stop_event.set() 
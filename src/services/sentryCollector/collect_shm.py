@@ -0,0 +1,173 @@
+# coding: utf-8
+# Copyright (c) 2025 Huawei Technologies Co., Ltd.
+# sysSentry is licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+
+"""
+shared memory export of the io ring buffers, keep in sync with CollectShmReader in collect_plugin.
+
+file layout, host byte order:
+  head: magic, version, lock seq, period seq, period time, valid, entry num, capacity, width,
+        entry offset, data offset
+  entry[entry num]: disk, stage, iotype (nul padded), ring head, ring count, checksum
+  data[entry num]: capacity * width float64 of the ring slots
+the lock seq is odd while the file is written, a reader retries until it reads
+the same even lock seq before and after its copy. the lock seq alone orders the
+stores on x86 only, on weakly ordered cpus like aarch64 a reader may see the even
+lock seq before the data. so the checksum of an entry is the crc32 of the period
+seq and time, the ring head and count and the ring slots, a reader copies an entry
+and retries if the checksum of its copy does not match. valid is cleared when the
+file is replaced by one of a new layout, the reader maps the path again.
+"""
+import os
+import mmap
+import zlib
+import struct
+import logging
+
+SHM_EXPORT_PATH = "/var/run/sysSentry/collector.shm"
+SHM_EXPORT_DIR_PERM = 0o750
+SHM_MAGIC = b'SSCM'
+SHM_VERSION = 2
+SHM_HEAD = struct.Struct('=4sIQQdIIIIII')
+SHM_LOCK_SEQ = struct.Struct('=Q')
+SHM_LOCK_SEQ_OFFSET = 8
+SHM_PERIOD = struct.Struct('=Qd')
+SHM_PERIOD_OFFSET = 16
+SHM_VALID = struct.Struct('=I')
+SHM_VALID_OFFSET = 32
+# disk, stage and iotype names are at most 32, 20 and 7 chars, see collect_plugin
+SHM_ENTRY = struct.Struct('=32s20s8sIII')
+SHM_NAME_LENS = (32, 20, 8)
+SHM_ENTRY_STATE = struct.Struct('=III')
+SHM_RING_STATE = struct.Struct('=II')
+SHM_ENTRY_STATE_OFFSET = 60
+SHM_DATA_ALIGN = 8
+
+
+class ShmExporter():
+    """
+    write the NumericRingBuffer records of a data source [disk][stage][iotype]
+    to a mmap file after each period, export is called with IO_DATA_LOCK held.
+    """
+
+    def __init__(self, path=SHM_EXPORT_PATH):
+        self.path = path
+        self.layout = None
+        self.mm = None
+        self.lock_seq = 0
+        self.data_offset = 0
+        self.slot_bytes = 0
+
+    def export(self, data_source, period_seq, period_time):
+        rings = []
+        for disk_name, stage_info in data_source.items():
+            for stage_name, iotype_info in stage_info.items():
+                for iotype_name, iotype_data in iotype_info.items():
+                    rings.append((disk_name, stage_name, iotype_name, iotype_data))
+        if not rings:
+            return
+        capacity = rings[0][3].capacity
+        width = rings[0][3].width
+        rings = [ring for ring in rings if self.is_exportable(ring, capacity, width)]
+        layout = (capacity, width, tuple(ring[:3] for ring in rings))
+        if layout != self.layout and not self.create(layout):
+            return
+
+        mm = self.mm
+        self.lock_seq += 1
+        SHM_LOCK_SEQ.pack_into(mm, SHM_LOCK_SEQ_OFFSET, self.lock_seq)
+        period = SHM_PERIOD.pack(period_seq, period_time)
+        mm[SHM_PERIOD_OFFSET:SHM_PERIOD_OFFSET + SHM_PERIOD.size] = period
+        period_crc = zlib.crc32(period)
+        entry_offset = SHM_HEAD.size
+        data_offset = self.data_offset
+        for _, _, _, iotype_data in rings:
+            slots = memoryview(iotype_data.data).cast('B')
+            checksum = zlib.crc32(slots, zlib.crc32(SHM_RING_STATE.pack(iotype_data.head, iotype_data.count),
+                                                    period_crc))
+            SHM_ENTRY_STATE.pack_into(mm, entry_offset + SHM_ENTRY_STATE_OFFSET, iotype_data.head, iotype_data.count,
+                                      checksum)
+            mm[data_offset:data_offset + self.slot_bytes] = slots
+            entry_offset += SHM_ENTRY.size
+            data_offset += self.slot_bytes
+        self.lock_seq += 1
+        SHM_LOCK_SEQ.pack_into(mm, SHM_LOCK_SEQ_OFFSET, self.lock_seq)
+
+    @staticmethod
+    def is_exportable(ring, capacity, width):
+        iotype_data = ring[3]
+        if iotype_data.capacity != capacity or iotype_data.width != width or iotype_data.typecode != 'd':
+            return False
+        return all(len(name.encode()) <= name_len for name, name_len in zip(ring[:3], SHM_NAME_LENS))
+
+    def create(self, layout):
+        """write a file of the new layout beside the path and move it over the old one"""
+        capacity, width, names = layout
+        entries = []
+        for disk_name, stage_name, iotype_name in names:
+            entries.append((disk_name.encode(), stage_name.encode(), iotype_name.encode()))
+        slot_bytes = capacity * width * 8
+        data_offset = SHM_HEAD.size + SHM_ENTRY.size * len(entries)
+        data_offset += -data_offset % SHM_DATA_ALIGN
+        size = data_offset + slot_bytes * len(entries)
+
+        tmp_path = self.path + ".tmp"
+        try:
+            export_dir = os.path.dirname(self.path)
+            if not os.path.exists(export_dir):
+                os.mkdir(export_dir)
+                os.chmod(export_dir, SHM_EXPORT_DIR_PERM)
+            fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC, 0o600)
+            try:
+                os.ftruncate(fd, size)
+                mm = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            logging.error("create shm export file %s failed, %s", tmp_path, e)
+            return False
+
+        SHM_HEAD.pack_into(mm, 0, SHM_MAGIC, SHM_VERSION, 0, 0, 0.0, 1, len(entries), capacity, width,
+                           SHM_HEAD.size, data_offset)
+        for index, (disk_name, stage_name, iotype_name) in enumerate(entries):
+            SHM_ENTRY.pack_into(mm, SHM_HEAD.size + index * SHM_ENTRY.size, disk_name, stage_name, iotype_name,
+                                0, 0, 0)
+        try:
+            os.rename(tmp_path, self.path)
+        except OSError as e:
+            logging.error("rename shm export file %s failed, %s", tmp_path, e)
+            mm.close()
+            return False
+
+        self.invalidate()
+        self.mm = mm
+        self.layout = layout
+        self.lock_seq = 0
+        self.data_offset = data_offset
+        self.slot_bytes = slot_bytes
+        logging.info("export %d io ring buffers to %s", len(entries), self.path)
+        return True
+
+    def invalidate(self):
+        if self.mm is None:
+            return
+        SHM_VALID.pack_into(self.mm, SHM_VALID_OFFSET, 0)
+        self.mm.close()
+        self.mm = None
+        self.layout = None
+
+    def close(self):
+        if self.mm is None:
+            return
+        self.invalidate()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
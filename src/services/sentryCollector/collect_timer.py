@@ -0,0 +1,45 @@
+# coding: utf-8
+# Copyright (c) 2025 Huawei Technologies Co., Ltd.
+# sysSentry is licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+
+"""
+period scheduler of the collect loops. the periods tick on absolute deadlines
+of the monotonic clock, start + n * period, so the collect time and a wall
+clock step do not shift the later periods.
+"""
+import time
+import logging
+
+
+class PeriodTimer():
+    """
+    like a periodic timerfd: a tick later than its deadline fires at once, the
+    deadlines passed before it are missed periods, they are skipped and counted.
+    """
+
+    def __init__(self, period, clock=time.monotonic):
+        self.period = period
+        self.clock = clock
+        self.deadline = clock() + period
+        # missed periods since the timer started
+        self.missed = 0
+
+    def wait(self, stop_event):
+        """wait for the next deadline, return the periods missed before it, None once stop_event is set"""
+        timeout = self.deadline - self.clock()
+        if stop_event.wait(max(timeout, 0)):
+            return None
+        late = self.clock() - self.deadline
+        missed = int(late // self.period) if late > 0 else 0
+        self.deadline += (missed + 1) * self.period
+        if missed:
+            self.missed += missed
+            logging.warning("collect falls behind, %d periods are missed, %d in total", missed, self.missed)
+        return missed
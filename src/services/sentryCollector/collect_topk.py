@@ -0,0 +1,55 @@
+# coding: utf-8
+# Copyright (c) 2025 Huawei Technologies Co., Ltd.
+# sysSentry is licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+
+"""
+index of the worst disk, stage and iotype of each period by metric.
+"""
+import heapq
+
+# metric name -> index in the io record
+TOP_METRICS = {"latency": 0, "io_dump": 1, "io_length": 2, "iops": 3}
+# entries kept for each metric of a period, the max k of a query
+TOP_INDEX_MAX_LEN = 256
+
+
+def build_top_index(period_io):
+    """
+    period_io: {disk: {stage: {iotype: io record}}} of one period.
+    return {metric: [[disk, stage, iotype, value], ...]}, the greatest value first.
+    """
+    records = []
+    for disk_name, stage_info in period_io.items():
+        for stage_name, iotype_info in stage_info.items():
+            for iotype_name, record in iotype_info.items():
+                records.append((disk_name, stage_name, iotype_name, record))
+
+    top_index = {}
+    for metric, field in TOP_METRICS.items():
+        top_records = heapq.nlargest(TOP_INDEX_MAX_LEN, records, key=lambda item: item[3][field])
+        top_index[metric] = [[disk_name, stage_name, iotype_name, record[field]]
+                             for disk_name, stage_name, iotype_name, record in top_records]
+    return top_index
+
+
+def select_top(entries, k, stage_list, iotype_list):
+    """the first k entries in the stages and iotypes, an empty list matches all"""
+    if not stage_list and not iotype_list:
+        return entries[:k]
+    result = []
+    for entry in entries:
+        if stage_list and entry[1] not in stage_list:
+            continue
+        if iotype_list and entry[2] not in iotype_list:
+            continue
+        result.append(entry)
+        if len(result) >= k:
+            break
+    return result
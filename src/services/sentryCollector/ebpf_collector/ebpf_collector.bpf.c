@@ -25,6 +25,13 @@ struct {
     __uint(value_size, sizeof(struct stage_data));
 } blk_res SEC(".maps");
 
+struct {
+    __uint(type, BPF_MAP_TYPE_ARRAY);
+    __uint(max_entries, 128 * LAT_HIST_TYPES);
+    __uint(key_size, sizeof(u32));
+    __uint(value_size, sizeof(struct lat_hist));
+} blk_hist SEC(".maps");
+
 struct {
     __uint(type, BPF_MAP_TYPE_HASH);
     __uint(max_entries, 10000);
@@ -39,6 +46,13 @@ struct {
     __uint(value_size, sizeof(struct stage_data));
 } bio_res SEC(".maps");
 
+struct {
+    __uint(type, BPF_MAP_TYPE_ARRAY);
+    __uint(max_entries, 128 * LAT_HIST_TYPES);
+    __uint(key_size, sizeof(u32));
+    __uint(value_size, sizeof(struct lat_hist));
+} bio_hist SEC(".maps");
+
 struct {
     __uint(type, BPF_MAP_TYPE_HASH);
     __uint(max_entries, 10000);
@@ -183,6 +197,22 @@ static void update_curr_data_in_start(struct stage_data *curr_data, struct updat
     }
 }
 
+static __always_inline u32 lat_hist_slot(u64 duration)
+{
+    u64 us = duration / 1000;
+    u32 slot = 0;
+
+#pragma unroll
+    for (int i = 0; i < LAT_HIST_SLOTS - 1; i++) {
+        if (us == 0) {
+            break;
+        }
+        us >>= 1;
+        slot++;
+    }
+    return slot;
+}
+
 static void update_curr_data_in_finish(struct stage_data *curr_data, struct update_params *params, u64 duration) {
     if (curr_data && params) {
         curr_data->finish_count += 1;
@@ -195,6 +225,38 @@ static void update_curr_data_in_finish(struct stage_data *curr_data, struct upda
     }
 }
 
+// io type of the latency histogram like the first char of blk_fill_rwbs, -1 for no histogram
+static __always_inline int lat_hist_type(unsigned int op)
+{
+    switch (op & REQ_OP_MASK) {
+    case REQ_OP_READ:
+        return 0;
+    case REQ_OP_WRITE:
+    case REQ_OP_WRITE_SAME:
+        return 1;
+    case REQ_OP_FLUSH:
+        return 2;
+    case REQ_OP_DISCARD:
+        return 3;
+    default:
+        return -1;
+    }
+}
+
+static void update_lat_hist(void *hist_map, u32 key, unsigned int cmd_flags, u64 duration) {
+    int type = lat_hist_type(cmd_flags);
+    u32 slot = lat_hist_slot(duration);
+
+    if (type < 0) {
+        return;
+    }
+    u32 hist_key = key * LAT_HIST_TYPES + type;
+    struct lat_hist *hist = bpf_map_lookup_elem(hist_map, &hist_key);
+    if (hist && slot < LAT_HIST_SLOTS) {
+        __sync_fetch_and_add(&hist->slots[slot], 1);
+    }
+}
+
 static void init_io_counter(struct io_counter *counterp, int major, int first_minor) {
     if (counterp) {
         counterp->start_time = bpf_ktime_get_ns();
@@ -207,9 +269,11 @@ int find_matching_key_rq_driver(int major, int first_minor) {
     int key = 0;
     for (size_t i = 0; i < MAP_SIZE; i++) {
         struct stage_data *curr_data = bpf_map_lookup_elem(&blk_res, &key);
-        struct stage_data tmp_data;
-        bpf_core_read(&tmp_data, sizeof(tmp_data), curr_data);
-        if (tmp_data.major == major && tmp_data.first_minor == first_minor) {
+        int curr_major = 0;
+        int curr_first_minor = 0;
+        bpf_core_read(&curr_major, sizeof(curr_major), &curr_data->major);
+        bpf_core_read(&curr_first_minor, sizeof(curr_first_minor), &curr_data->first_minor);
+        if (curr_major == major && curr_first_minor == first_minor) {
             return key;
         }
         key++;
@@ -221,9 +285,11 @@ int find_matching_key_bio(int major, int first_minor) {
     int key = 0;
     for (size_t i = 0; i < MAP_SIZE; i++) {
         struct stage_data *curr_data = bpf_map_lookup_elem(&bio_res, &key);
-        struct stage_data tmp_data;
-        bpf_core_read(&tmp_data, sizeof(tmp_data), curr_data);
-        if (tmp_data.major == major && tmp_data.first_minor == first_minor) {
+        int curr_major = 0;
+        int curr_first_minor = 0;
+        bpf_core_read(&curr_major, sizeof(curr_major), &curr_data->major);
+        bpf_core_read(&curr_first_minor, sizeof(curr_first_minor), &curr_data->first_minor);
+        if (curr_major == major && curr_first_minor == first_minor) {
             return key;
         }
         key++;
@@ -235,9 +301,11 @@ int find_matching_key_wbt(int major, int first_minor) {
     int key = 0;
     for (size_t i = 0; i < MAP_SIZE; i++) {
         struct stage_data *curr_data = bpf_map_lookup_elem(&wbt_res, &key);
-        struct stage_data tmp_data;
-        bpf_core_read(&tmp_data, sizeof(tmp_data), curr_data);
-        if (tmp_data.major == major && tmp_data.first_minor == first_minor) {
+        int curr_major = 0;
+        int curr_first_minor = 0;
+        bpf_core_read(&curr_major, sizeof(curr_major), &curr_data->major);
+        bpf_core_read(&curr_first_minor, sizeof(curr_first_minor), &curr_data->first_minor);
+        if (curr_major == major && curr_first_minor == first_minor) {
             return key;
         }
         key++;
@@ -249,9 +317,11 @@ int find_matching_key_get_tag(int major, int first_minor) {
     int key = 0;
     for (size_t i = 0; i < MAP_SIZE; i++) {
         struct stage_data *curr_data = bpf_map_lookup_elem(&tag_res, &key);
-        struct stage_data tmp_data;
-        bpf_core_read(&tmp_data, sizeof(tmp_data), curr_data);
-        if (tmp_data.major == major && tmp_data.first_minor == first_minor) {
+        int curr_major = 0;
+        int curr_first_minor = 0;
+        bpf_core_read(&curr_major, sizeof(curr_major), &curr_data->major);
+        bpf_core_read(&curr_first_minor, sizeof(curr_first_minor), &curr_data->first_minor);
+        if (curr_major == major && curr_first_minor == first_minor) {
             return key;
         }
         key++;
@@ -411,6 +481,7 @@ int kprobe_blk_mq_end_request_batch(struct pt_regs *regs) {
             curr_data->duration += duration; 
             update_curr_data_in_finish(curr_data, &params, duration);
         }
+        update_lat_hist(&blk_hist, key, cmd_flags, duration);
 
         struct time_range_io_count *curr_data_time_range;
         curr_data_time_range = bpf_map_lookup_elem(&blk_res_2, &curr_start_range);
@@ -510,6 +581,7 @@ int kprobe_blk_mq_free_request(struct pt_regs *regs)
         curr_data->duration += duration; 
         update_curr_data_in_finish(curr_data, &params, duration);
     }
+    update_lat_hist(&blk_hist, key, cmd_flags, duration);
 
     struct time_range_io_count *curr_data_time_range;
     curr_data_time_range = bpf_map_lookup_elem(&blk_res_2, &curr_start_range);
@@ -680,6 +752,7 @@ int kprobe_bio_endio(struct pt_regs *regs)
         curr_data->duration += duration; 
         update_curr_data_in_finish(curr_data, &params, duration);
     }
+    update_lat_hist(&bio_hist, key, cmd_flags, duration);
 
     struct time_range_io_count *curr_data_time_range;
     curr_data_time_range = bpf_map_lookup_elem(&bio_res_2, &curr_start_range);
@@ -12,6 +12,9 @@
 #include <stdlib.h> 
 #include <string.h> 
 #include <stdarg.h>
+#include <stdint.h>
+#include <stdbool.h>
+#include <errno.h>
 #include <dirent.h>
 #include <bpf/bpf.h>
 #include <sys/resource.h>
@@ -29,12 +32,18 @@
 #define WBT_RES    (bpf_map__fd(skel->maps.wbt_res))
 #define TAG_MAP    (bpf_map__fd(skel->maps.tag_map))
 #define TAG_RES    (bpf_map__fd(skel->maps.tag_res))
+#define BLK_HIST    (bpf_map__fd(skel->maps.blk_hist))
+#define BIO_HIST    (bpf_map__fd(skel->maps.bio_hist))
+// the wbt and gettag stages have no latency histogram
+#define NO_HIST    (-1)
 #define BLK_RES_2    (bpf_map__fd(skel->maps.blk_res_2))
 #define BIO_RES_2    (bpf_map__fd(skel->maps.bio_res_2))
 #define WBT_RES_2    (bpf_map__fd(skel->maps.wbt_res_2))
 #define TAG_RES_2    (bpf_map__fd(skel->maps.tag_res_2))
 
 #define MAX_LINE_LENGTH 1024
+#define DEFAULT_INTERVAL_MS 1000
+#define MIN_INTERVAL_MS 10
 #define MAX_SECTION_NAME_LENGTH 256
 #define CONFIG_FILE "/etc/sysSentry/collector.conf"
 
@@ -43,6 +52,27 @@ typedef struct {
     int minor;
 } DeviceInfo;
 
+/*
+ * binary output record, little-endian and packed, 224 bytes per record:
+ * stage id, io type char, flags, major, minor, io_dump, finish_count, duration,
+ * then the LAT_HIST_SLOTS counters of the latency histogram of the io type,
+ * all 0 unless flags has RECORD_FLAG_LAT_HIST
+ * must stay in sync with EBPF_RECORD in sentryCollector/collect_io.py
+ */
+struct ebpf_record {
+    uint8_t stage;
+    uint8_t io_type;
+    uint16_t flags;
+    uint32_t major;
+    uint32_t minor;
+    uint32_t io_dump;
+    uint64_t finish_count;
+    uint64_t duration;
+    uint64_t lat_hist[LAT_HIST_SLOTS];
+} __attribute__((packed));
+_Static_assert(sizeof(struct ebpf_record) == 224, "ebpf_record must be 224 bytes");
+#define RECORD_FLAG_LAT_HIST 1
+
 typedef enum {
     LOG_LEVEL_NONE,
     LOG_LEVEL_DEBUG,
@@ -54,22 +84,39 @@ typedef enum {
 LogLevel currentLogLevel = LOG_LEVEL_INFO;
 
 static volatile bool exiting;
+static bool binary_output;
+// output interval, the collect period of sentryCollector when it is shorter than 1s
+static long interval_ms = DEFAULT_INTERVAL_MS;
 
 const char argp_program_doc[] = 
 "Show block device I/O pattern.\n"
 "\n"
-"USAGE: ebpf_collector [--help]\n"
+"USAGE: ebpf_collector [--help] [--binary] [--interval MS]\n"
 "\n"
 "EXAMPLES:\n"
-"    ebpf_collector              # show block I/O pattern\n";
+"    ebpf_collector              # show block I/O pattern\n"
+"    ebpf_collector --binary     # output fixed-size binary records\n"
+"    ebpf_collector --interval 100  # output every 100ms\n";
 
 static const struct argp_option opts[] = {
+    { "binary", 'b', NULL, 0, "Output fixed-size binary records instead of text lines" },
+    { "interval", 'i', "MS", 0, "Output interval in milliseconds, 1000 by default" },
     { NULL, 'h', NULL, OPTION_HIDDEN, "Show the full help" }, 
     {},
 };
 
 static error_t parse_arg(int key, char *arg, struct argp_state *state) {
     switch (key) { 
+    case 'b':
+        binary_output = true;
+        break;
+    case 'i':
+        errno = 0;
+        interval_ms = strtol(arg, NULL, 10);
+        if (errno || interval_ms < MIN_INTERVAL_MS || interval_ms > DEFAULT_INTERVAL_MS) {
+            argp_error(state, "invalid interval %s, %d-%d ms", arg, MIN_INTERVAL_MS, DEFAULT_INTERVAL_MS);
+        }
+        break;
     case 'h': 
         argp_state_help(state, stderr, ARGP_HELP_STD_HELP); 
         break;
@@ -83,7 +130,8 @@ void logMessage(LogLevel level, const char *format, ...){
     if (level >= currentLogLevel) {
         va_list args;
         va_start(args, format);
-        vprintf(format, args);
+        // keep the binary record stream on stdout clean
+        vfprintf(binary_output ? stderr : stdout, format, args);
         va_end(args);
     }
 }
@@ -172,9 +220,62 @@ static void update_io_dump(int fd, int *io_dump, int map_size, char *stage) {
     }
 }
 
-static int print_map_res(int fd, char *stage, int map_size, int *io_dump)
+static void print_binary_record(int stage_id, char io_type, struct stage_data *counter, struct lat_hist *hist,
+                                int io_dump)
+{
+    struct ebpf_record record = {0};
+
+    record.stage = (uint8_t)stage_id;
+    record.io_type = (uint8_t)io_type;
+    record.major = (uint32_t)counter->major;
+    record.minor = (uint32_t)counter->first_minor;
+    record.io_dump = (uint32_t)io_dump;
+    record.finish_count = counter->finish_count;
+    record.duration = counter->duration;
+    if (hist) {
+        record.flags = RECORD_FLAG_LAT_HIST;
+        memcpy(record.lat_hist, hist->slots, sizeof(record.lat_hist));
+    }
+    fwrite(&record, sizeof(record), 1, stdout);
+}
+
+// io type of the latency histogram of an io type char, see lat_hist_type in ebpf_collector.bpf.c
+static int lat_hist_type(char io_type)
+{
+    switch (io_type) {
+    case 'R':
+        return 0;
+    case 'W':
+        return 1;
+    case 'F':
+        return 2;
+    case 'D':
+        return 3;
+    default:
+        return -1;
+    }
+}
+
+// hist of the io type of the key, NULL if the stage or the io type has no histogram
+static struct lat_hist *lookup_lat_hist(int hist_fd, int key, char io_type, struct lat_hist *hist, char *stage)
+{
+    int type = lat_hist_type(io_type);
+    if (hist_fd == NO_HIST || type < 0) {
+        return NULL;
+    }
+    int hist_key = key * LAT_HIST_TYPES + type;
+    int err = bpf_map_lookup_elem(hist_fd, &hist_key, hist);
+    if (err < 0) {
+        logMessage(LOG_LEVEL_ERROR, "failed to lookup %s lat_hist: %d\n", stage, err);
+        return NULL;
+    }
+    return hist;
+}
+
+static int print_map_res(int fd, int hist_fd, char *stage, int stage_id, int map_size, int *io_dump)
 {
     struct stage_data counter; 
+    struct lat_hist hist;
     int key = 0;
 
     logMessage(LOG_LEVEL_DEBUG, "print_map_res map_size: %d\n", map_size);
@@ -194,24 +295,42 @@ static int print_map_res(int fd, char *stage, int map_size, int *io_dump)
             logMessage(LOG_LEVEL_DEBUG, "io_type not value.\n");
             io_type = '\0';
         }
+        struct lat_hist *curr_hist = lookup_lat_hist(hist_fd, key, io_type, &hist, stage);
+        if (binary_output) {
+            if (io_type) {
+                print_binary_record(stage_id, io_type, &counter, curr_hist, io_dump[key]);
+            }
+            continue;
+        }
         int major = counter.major;
         int first_minor = counter.first_minor;
         dev_t dev = makedev(major, first_minor);    
         char *device_name = find_device_name(dev);
         logMessage(LOG_LEVEL_DEBUG, "device_name: %s, stage: %s, io_type: %c\n", device_name, stage, io_type);
         if (device_name && io_type) {
-            printf("%-7s %10llu %10llu %d %c %s\n",
+            // a line without the histogram field if there is no histogram
+            char lat_hist[LAT_HIST_SLOTS * 21 + 1] = {0};
+            int offset = 0;
+            for (int slot = 0; curr_hist && slot < LAT_HIST_SLOTS; slot++) {
+                offset += snprintf(lat_hist + offset, sizeof(lat_hist) - offset, slot ? ",%llu" : " %llu",
+                                   curr_hist->slots[slot]);
+            }
+            printf("%-7s %10llu %10llu %d %c %s%s\n",
                 stage, 
                 counter.finish_count, 
                 counter.duration,
                 io_dump[key],
                 io_type,
-                device_name
+                device_name,
+                lat_hist
             );
             free(device_name);
             fflush(stdout);
         }
     }
+    if (binary_output) {
+        fflush(stdout);
+    }
 
     return 0; 
 }
@@ -460,15 +579,21 @@ int main(int argc, char **argv) {
         return 1;
     }
 
+    // absolute deadlines, the output time does not shift the next interval
+    struct timespec deadline;
+    clock_gettime(CLOCK_MONOTONIC, &deadline);
     for (;;) { 
-       
-        sleep(1); 
+        deadline.tv_nsec += (interval_ms % 1000) * 1000000L;
+        deadline.tv_sec += interval_ms / 1000 + deadline.tv_nsec / 1000000000L;
+        deadline.tv_nsec %= 1000000000L;
+        while (clock_nanosleep(CLOCK_MONOTONIC, TIMER_ABSTIME, &deadline, NULL) == EINTR && !exiting) {
+        }
 
-        err = ring_buffer__poll(rb, 100);
+        err = ring_buffer__poll(rb, 0);
 
         int io_dump_blk[MAP_SIZE] = {0}; 
         update_io_dump(BLK_RES_2, io_dump_blk, device_count,"rq_driver"); 
-        err = print_map_res(BLK_RES, "rq_driver", device_count, io_dump_blk); 
+        err = print_map_res(BLK_RES, BLK_HIST, "rq_driver", STAGE_RQ_DRIVER, device_count, io_dump_blk); 
         if (err) {
             logMessage(LOG_LEVEL_ERROR, "print_map_res rq_driver error.\n");
             break; 
@@ -476,7 +601,7 @@ int main(int argc, char **argv) {
 
         int io_dump_bio[MAP_SIZE] = {0}; 
         update_io_dump(BIO_RES_2, io_dump_bio, device_count,"bio");
-        err = print_map_res(BIO_RES, "bio", device_count, io_dump_bio); 
+        err = print_map_res(BIO_RES, BIO_HIST, "bio", STAGE_BIO, device_count, io_dump_bio); 
         if (err) {
             logMessage(LOG_LEVEL_ERROR, "print_map_res bio error.\n");
             break; 
@@ -484,7 +609,7 @@ int main(int argc, char **argv) {
 
         int io_dump_tag[MAP_SIZE] = {0}; 
         update_io_dump(TAG_RES_2, io_dump_tag, device_count,"gettag");        
-        err = print_map_res(TAG_RES, "gettag", device_count, io_dump_tag); 
+        err = print_map_res(TAG_RES, NO_HIST, "gettag", STAGE_GET_TAG, device_count, io_dump_tag); 
         if (err) {
             logMessage(LOG_LEVEL_ERROR, "print_map_res gettag error.\n");
             break; 
@@ -492,7 +617,7 @@ int main(int argc, char **argv) {
 
         int io_dump_wbt[MAP_SIZE] = {0}; 
         update_io_dump(WBT_RES_2, io_dump_wbt, device_count,"wbt");        
-        err = print_map_res(WBT_RES, "wbt", device_count, io_dump_wbt); 
+        err = print_map_res(WBT_RES, NO_HIST, "wbt", STAGE_WBT, device_count, io_dump_wbt); 
         if (err) {
             logMessage(LOG_LEVEL_ERROR, "print_map_res wbt error.\n");
             break; 
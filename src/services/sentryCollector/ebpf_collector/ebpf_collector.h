@@ -16,6 +16,10 @@ typedef unsigned int u32;
 #define DURATION_THRESHOLD 500000000
 
 #define RWBS_LEN    8
+/* log2 latency histogram, slot 0 is < 1us, slot i is [2^(i-1), 2^i) us, the last slot has no upper bound */
+#define LAT_HIST_SLOTS 24
+/* the histograms of a disk, one per io type: read, write, flush, discard */
+#define LAT_HIST_TYPES 4
 
 #define REQ_OP_BITS 8
 #define REQ_OP_MASK ((1 << REQ_OP_BITS) - 1)
@@ -85,6 +89,12 @@ struct stage_data {
     char io_type[RWBS_LEN];
 };
 
+// latency histogram of an io type of a stage_data, kept in its own map
+// at key * LAT_HIST_TYPES + the io type, see lat_hist_type
+struct lat_hist {
+    u64 slots[LAT_HIST_SLOTS];
+};
+
 struct io_counter { 
     u64 duration; 
     u64 start_time; 